@@ -1,30 +1,93 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify, flash
+from flask import Flask, render_template, request, redirect, url_for, jsonify, flash, session, g
+from flask import has_request_context
+from flask import before_render_template, template_rendered
 import os
 from datetime import datetime
 import pandas as pd
+import numpy as np
 import io
-from flask import send_file
+import cProfile
+import pstats
+import time
+import base64
+import json
+import threading
+from flask import send_file, Response
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.utils import secure_filename
+
+from cache import ResponseCache
+from events import DashboardFeed
+from metrics import Registry
+from upload_stream import TeeReader, UploadArchiver
+
+from processing.allocation import AllocationPlan, parse_request
+from processing.batch import BATCH_EXTENSIONS, process_batch
+from processing.dataset import Dataset
+from processing.geo import parse_bbox, parse_nearest, parse_polygon, summarize
+from processing.history import DIFF_LIMIT, TRACKED_FIELDS, DatasetHistory
+from processing.jobs import JobQueue
+from processing.persistence import DatasetLog
+from processing.processor import calculate_resources, process_csv
+from processing.rollups import RANKED_FIELDS
+from processing.scenarios import DEFAULT_MODEL, MAX_SCENARIOS, evaluate_scenarios, parse_model, severity_values
+from processing.storage import latest_processed, load_processed, save_processed
+from processing.store import SORT_COLUMNS, District, DistrictStore
+
+
+class DistrictJSONProvider(DefaultJSONProvider):
+    """JSON provider that knows how to serialize District row views"""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, District):
+            return o.to_dict()
+        return DefaultJSONProvider.default(o)
 
 
 app = Flask(__name__)
 app.secret_key = 'dev-secret-key'
+app.json = DistrictJSONProvider(app)
 
 # ---------------- CONFIG ----------------
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
 PROCESSED_FOLDER = os.path.join(BASE_DIR, 'processing')
+DATA_FOLDER = os.environ.get('DATA_FOLDER', os.path.join(BASE_DIR, 'data'))
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(PROCESSED_FOLDER, exist_ok=True)
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['PROCESSED_FOLDER'] = PROCESSED_FOLDER
+app.config['DATA_FOLDER'] = DATA_FOLDER
+
+# Uploads bigger than PARALLEL_MIN_BYTES are processed on PROCESS_WORKERS cores
+app.config['PROCESS_WORKERS'] = int(os.environ.get('PROCESS_WORKERS', os.cpu_count() or 1))
+app.config['PARALLEL_MIN_BYTES'] = 64 * 1024 * 1024
+
+# ?profile=1 returns a cProfile report of that request instead of the page, off by default
+app.config['PROFILE_REQUESTS'] = os.environ.get('PROFILE_REQUESTS') == '1'
+
+# Raw uploads sent to /api/upload/stream are archived as 'gzip', 'plain' or not at all ('off')
+app.config['UPLOAD_ARCHIVE'] = os.environ.get('UPLOAD_ARCHIVE', 'plain')
+
+# Rendered pages are cached per dataset version, up to RENDER_CACHE_BYTES (0 turns it off)
+app.config['RENDER_CACHE_BYTES'] = int(os.environ.get('RENDER_CACHE_BYTES', 64 * 1024 * 1024))
+
+# Seconds between keep-alive comments on an idle /api/events stream
+app.config['EVENTS_HEARTBEAT_SECONDS'] = 15
+
+# Open /api/events streams per process, and seconds before one is closed so the
+# browser reconnects. Each stream holds a worker thread, see the README.
+app.config['EVENTS_MAX_STREAMS'] = int(os.environ.get('EVENTS_MAX_STREAMS', 32))
+app.config['EVENTS_MAX_SECONDS'] = 300
 
 
 # ---------------- DATA ----------------
-# Initial sample data
-districts_data = [
+# Initial sample data. The published dataset is only ever replaced whole, see processing/dataset.py
+active_dataset = Dataset(DistrictStore([
     {
         'id': 1,
         'name': 'Rajanpur',
@@ -47,253 +110,583 @@ districts_data = [
         'severity': 'Critical',
         'families': 8000
     },
-]
+]), version=1, next_id=3)
 
-# Global variable to track next ID
-next_id = 3
+# Held while a new dataset is built and published, readers never take it
+publish_lock = threading.RLock()
 
-# ---------------- CSV PROCESSING FUNCTIONS ----------------
+# Cached responses are keyed on the dataset version
+api_cache = ResponseCache(max_bytes=64 * 1024 * 1024)
+page_cache = ResponseCache(max_bytes=app.config['RENDER_CACHE_BYTES'])
 
-def validate_csv(file_path):
-    """Check if the CSV file has all required columns and valid data"""
-    try:
-        if not os.path.exists(file_path):
-            return False, "File does not exist"
+# Uploads are processed one at a time, in the order they arrive
+upload_jobs = JobQueue(max_workers=1)
+
+# Saved copy of the active dataset, shared by every worker process
+dataset_log = DatasetLog(DATA_FOLDER)
+
+# Every uploaded version of the districts, for trend and diff queries
+dataset_history = DatasetHistory(os.path.join(DATA_FOLDER, 'history'))
+
+# Request latencies, processing phase timings and row counters for /metrics
+app_metrics = Registry()
+
+# Latest stock allocation made with /api/allocation, kept per process
+allocation_plan = None
+
+# Dashboard views of recent dataset versions, pushed to open /api/events streams
+dashboard_feed = DashboardFeed()
+
+
+def current_dataset():
+    """The dataset this request started with, or the latest one outside a request"""
+    if has_request_context() and 'dataset' in g:
+        return g.dataset
+    return active_dataset
+
+
+def sync_dataset():
+    """Load the saved dataset if another process (or a restart) has a newer one"""
+    if not dataset_log.changed():
+        return
+    
+    with publish_lock:
+        # Another thread may have loaded it while this one waited
+        if dataset_log.changed():
+            loaded = dataset_log.load()
+            if loaded:
+                store, next_id = loaded
+                set_active_store(store, next_id)
+
+
+def set_active_store(store, next_id=None, changed=None):
+    """Publish a new dataset holding this store, with its rollups and the next version number
+
+    The store must not be changed afterwards. Readers that already took the
+    previous dataset keep using it until their request ends. changed lists the
+    row positions a merge wrote, so the rollups are updated from those rows only.
+    """
+    global active_dataset
+    
+    with publish_lock:
+        active_dataset = active_dataset.successor(store, next_id, changed)
+        dashboard_feed.publish(active_dataset.version, dashboard_view(active_dataset))
+
+
+def dashboard_view(dataset):
+    """Numbers and top-district rows the index page shows, as sent to /api/events"""
+    rollups = dataset.rollups
+    totals = rollups.totals
+    
+    order = {}
+    rows = {}
+    for field in ('relief', 'population'):
+        top = rollups.top(field)
+        order[field] = [d.id for d in top]
+        for d in top:
+            rows[d.id] = {key: d[key] for key in ('id', 'name', 'population', 'houses', 'casualties', 'relief')}
+    
+    return {
+        'summary': {
+            'population': totals['population'],
+            'houses': totals['houses'],
+            'casualties': totals['casualties'],
+            'relief': totals['relief'],
+            'districts': len(dataset.store)
+        },
+        'by_severity': {
+            level: {'count': group['count'], 'population': group['population']}
+            for level, group in rollups.by_severity.items()
+        },
+        'order': order,
+        'rows': rows
+    }
+
+
+dashboard_feed.publish(active_dataset.version, dashboard_view(active_dataset))
+
+
+# ---------------- DISTRICT BUILDING ----------------
+# Validation and resource calculation live in processing/processor.py
+
+# Share of the affected population counted as casualties, by severity
+CASUALTY_RATES = {
+    'Low': 0.0001,
+    'Medium': 0.0005,
+    'High': 0.001,
+    'Critical': 0.002
+}
+
+
+def districts_frame(processed_data, ids):
+    """Turn processed CSV columns into the district fields used by DistrictStore"""
+    population = processed_data['Affected_Population'].to_numpy(dtype=np.int64)
+    families = processed_data['Displaced_Families'].to_numpy(dtype=np.int64)
+    
+    # Calculate casualties based on severity (unknown levels get none)
+    casualty_rate = severity_values(processed_data['Severity_Level'], CASUALTY_RATES, 0)
+    
+    if 'Province' in processed_data.columns:  # Optional field
+        province = processed_data['Province']
+    else:
+        province = 'N/A'
+    
+    if 'Latitude' in processed_data.columns:  # Optional, checked together with Longitude
+        latitude = processed_data['Latitude'].to_numpy(dtype=float)
+        longitude = processed_data['Longitude'].to_numpy(dtype=float)
+    else:
+        latitude = longitude = np.nan
+    
+    return pd.DataFrame({
+        'id': ids,
+        'name': processed_data['District'].to_numpy(),
+        'province': province,
+        'population': population,
+        'houses': families,
+        'casualties': (population * casualty_rate).astype(np.int64),
+        'date': datetime.now().strftime('%Y-%m-%d'),
+        'severity': processed_data['Severity_Level'],
+        'families': families,
+        'food_packs': processed_data['Food_Packs'].to_numpy(),
+        'tents': processed_data['Tents'].to_numpy(),
+        'medical_supplies': processed_data['Medical_Supplies'].to_numpy(),
+        'water_bottles': processed_data['Water_Bottles'].to_numpy(),
+        'blankets': processed_data['Blankets'].to_numpy(),
+        'latitude': latitude,
+        'longitude': longitude
+    })
+
+
+def update_districts_from_csv(processed_data, source=None):
+    """Publish a dataset with the districts from a processed CSV in place of the current one"""
+    with publish_lock:
+        # Build the new store first, then swap it in
+        next_id = active_dataset.next_id
+        ids = np.arange(next_id, next_id + len(processed_data))
+        new_store = DistrictStore.from_frame(districts_frame(processed_data.reset_index(drop=True), ids))
+        next_id += len(processed_data)
         
-        data = pd.read_csv(file_path)
+        set_active_store(new_store, next_id)
+        dataset_log.record_replace(new_store, next_id, source)
+        with app_metrics.span('history'):
+            dataset_history.record(new_store, 'replace', source)
+    return True
+
+
+def merge_districts_from_csv(data, source=None):
+    """Upsert districts from a correction CSV into the current districts, keeping their ids
+
+    Rows are matched on District, plus Province when the file has that column.
+    Only new or changed rows get their resources calculated.
+    Returns (added, updated) counts, or (None, error message).
+    """
+    with publish_lock:
+        # Work on a copy so readers keep seeing the old districts until the swap
+        new_store = active_dataset.store.copy()
+        next_id = active_dataset.next_id
         
-        if data.empty:
-            return False, "CSV file is empty"
+        has_province = 'Province' in data.columns
+        keys = ['District', 'Province'] if has_province else ['District']
+        data = data.drop_duplicates(subset=keys, keep='last').reset_index(drop=True)
         
-        # Check for required columns
-        required_columns = ['District', 'Affected_Population', 'Severity_Level', 'Displaced_Families']
-        missing_columns = [col for col in required_columns if col not in data.columns]
+        positions = new_store.lookup(data['District'], data['Province'] if has_province else None)
         
-        if missing_columns:
-            return False, f"Missing columns: {', '.join(missing_columns)}"
+        if (positions == -2).any():
+            name = data['District'][positions == -2].iloc[0]
+            return None, f"District '{name}' exists in several provinces, add a Province column"
         
-        # Validate numeric columns
-        try:
-            data['Affected_Population'] = pd.to_numeric(data['Affected_Population'], errors='coerce')
-            if data['Affected_Population'].isna().any():
-                return False, "Affected_Population must contain valid numbers only"
-        except Exception as e:
-            return False, f"Error in Affected_Population column: {str(e)}"
+        known = positions >= 0
         
-        try:
-            data['Displaced_Families'] = pd.to_numeric(data['Displaced_Families'], errors='coerce')
-            if data['Displaced_Families'].isna().any():
-                return False, "Displaced_Families must contain valid numbers only"
-        except Exception as e:
-            return False, f"Error in Displaced_Families column: {str(e)}"
+        # Keep the stored province and location when the correction file does not have them
+        if not has_province:
+            data['Province'] = 'N/A'
+            data.loc[known, 'Province'] = new_store.take('province', positions[known])
         
-        # Validate severity levels
-        valid_levels = ['Low', 'Medium', 'High', 'Critical']
-        invalid_levels = []
-        for idx, level in enumerate(data['Severity_Level']):
-            if pd.isna(level) or level not in valid_levels:
-                invalid_levels.append(f"Row {idx + 2}: '{level}'")
+        has_location = 'Latitude' in data.columns
+        if not has_location:
+            for column, field in [('Latitude', 'latitude'), ('Longitude', 'longitude')]:
+                data[column] = np.nan
+                data.loc[known, column] = new_store.take(field, positions[known])
         
-        if invalid_levels:
-            return False, f"Invalid Severity_Level values. Must be Low, Medium, High, or Critical"
+        # A known district only needs work when one of its inputs changed
+        changed = ~known
+        changed[known] = (
+            (data['Affected_Population'].to_numpy()[known] != new_store.take('population', positions[known]))
+            | (data['Displaced_Families'].to_numpy()[known] != new_store.take('families', positions[known]))
+            | (data['Severity_Level'].to_numpy()[known] != new_store.take('severity', positions[known]))
+        )
+        if has_location:
+            for column, field in [('Latitude', 'latitude'), ('Longitude', 'longitude')]:
+                new = data[column].to_numpy(dtype=float)[known]
+                old = new_store.take(field, positions[known])
+                changed[known] |= (new != old) & ~(np.isnan(new) & np.isnan(old))
         
-        return True, "CSV is valid"
-    
-    except Exception as e:
-        return False, f"Error reading file: {str(e)}"
+        data = calculate_resources(data[changed].reset_index(drop=True))
+        
+        ids = np.zeros(len(data), dtype=np.int64)
+        existing = known[changed]
+        ids[existing] = new_store.take('id', positions[changed][existing])
+        ids[~existing] = np.arange(next_id, next_id + (~existing).sum())
+        next_id += int((~existing).sum())
+        
+        records = districts_frame(data, ids).to_dict('records')
+        for record in records:
+            new_store.insert(record)
+        
+        changed = [new_store.position(record['id']) for record in records]
+        set_active_store(new_store, next_id, changed)
+        if records:
+            dataset_log.record_merge(new_store, records, next_id, source)
+            with app_metrics.span('history'):
+                dataset_history.record(new_store, 'merge', source, changed)
+        return int((~existing).sum()), int(existing.sum())
 
 
-def calculate_resources(data):
-    """Calculate food packs, tents, medical supplies, water, and blankets needed"""
+def activate_processed(path):
+    """Make a saved processed dataset the active one, without re-parsing any CSV
     
-    data['Affected_Population'] = pd.to_numeric(data['Affected_Population'], errors='coerce').fillna(0).astype(int)
-    data['Displaced_Families'] = pd.to_numeric(data['Displaced_Families'], errors='coerce').fillna(0).astype(int)
+    Every worker process calls this at start with the same ACTIVE_DATASET, so
+    the file is only published when the saved dataset is older than it. When
+    the file is already active, or an upload was saved after it was written,
+    the saved dataset is loaded instead.
+    """
+    if path == 'latest':
+        path = latest_processed(app.config['PROCESSED_FOLDER'])
+        if path is None:
+            return False, "No processed datasets found"
     
-    data['Food_Packs'] = 0
-    data['Tents'] = 0
-    data['Medical_Supplies'] = 0
-    data['Water_Bottles'] = 0
-    data['Blankets'] = 0
+    source = os.path.basename(path)
+    if not os.path.exists(path):
+        return False, "File does not exist"
+    written = datetime.fromtimestamp(os.path.getmtime(path)).isoformat(timespec='seconds')
     
-    for i in range(len(data)):
-        population = data.loc[i, 'Affected_Population']
-        families = data.loc[i, 'Displaced_Families']
-        severity = data.loc[i, 'Severity_Level']
+    with dataset_log.lock():
+        sync_dataset()
+        last = dataset_log.last_upload()
+        if last and (last['source'] == source or last['time'] >= written):
+            return True, f"{len(active_dataset.store)} saved districts loaded, they are not older than {source}"
         
-        # Basic calculations
-        food = population * 3
-        tents = families * 1
-        medical = population * 0.15
-        water = population * 5
-        blankets = population * 1.5
-        
-        # Severity multipliers
-        severity_multipliers = {
-            'Low': 1.0,
-            'Medium': 1.5,
-            'High': 2.0,
-            'Critical': 2.5
-        }
-        
-        multiplier = severity_multipliers.get(severity, 1.0)
+        processed_data, message = load_processed(path)
+        if processed_data is None:
+            return False, message
         
-        data.loc[i, 'Food_Packs'] = int(food * multiplier)
-        data.loc[i, 'Tents'] = int(tents * multiplier)
-        data.loc[i, 'Medical_Supplies'] = int(medical * multiplier)
-        data.loc[i, 'Water_Bottles'] = int(water * multiplier)
-        data.loc[i, 'Blankets'] = int(blankets * multiplier)
-    
-    return data
+        update_districts_from_csv(processed_data, source=source)
+    return True, f"{len(processed_data)} districts loaded from {source}"
 
 
-def process_csv(file_path):
-    """Read CSV, validate it, and calculate resources"""
+def run_upload(job, source, filename, merge):
+    """Job: process an upload and swap in the new districts
     
-    is_valid, message = validate_csv(file_path)
+    source is the path of a saved upload, or a readable stream of the CSV when
+    it is ingested straight from the request.
+    """
+    job.update(phase='processing')
+    progress = lambda rows: job.update(rows_processed=rows)
+    mode = 'merge' if merge else 'replace'
+    start = time.perf_counter()
     
-    if not is_valid:
-        return None, message
+    # Big saved files are spread over several processes
+    workers = app.config['PROCESS_WORKERS']
+    if not isinstance(source, str) or os.path.getsize(source) < app.config['PARALLEL_MIN_BYTES']:
+        workers = 1
+    
+    processed_data, message = process_csv(
+        source, calculate=not merge, progress=progress, timer=app_metrics.span, workers=workers
+    )
     
-    data = pd.read_csv(file_path)
-    processed_data = calculate_resources(data)
+    if processed_data is None:
+        app_metrics.inc('flood_uploads_total', help_text='Uploads processed', mode=mode, status='failed')
+        return None, f'Error processing CSV: {message}'
     
-    return processed_data, "Success"
+    return apply_upload(job, processed_data, filename, merge, start)
 
 
-def update_districts_from_csv(processed_data):
-    """Update global districts_data from processed CSV"""
-    global districts_data, next_id
+def run_batch_upload(job, files, filename, merge):
+    """Job: process several files, workbooks and zip bundles as one upload
     
-    # Clear existing data
-    districts_data = []
+    files is a list of (saved path, original name). Sources that fail are left
+    out and listed in the result's per-source reports.
+    """
+    job.update(phase='processing')
+    progress = lambda rows: job.update(rows_processed=rows)
+    mode = 'merge' if merge else 'replace'
+    start = time.perf_counter()
     
-    # Convert processed data to districts format
-    for idx, row in processed_data.iterrows():
-        # Calculate casualties based on severity
-        severity_casualties = {
-            'Low': int(row['Affected_Population'] * 0.0001),
-            'Medium': int(row['Affected_Population'] * 0.0005),
-            'High': int(row['Affected_Population'] * 0.001),
-            'Critical': int(row['Affected_Population'] * 0.002)
-        }
+    with app_metrics.span('batch_process'):
+        processed_data, reports = process_batch(
+            files, calculate=not merge, progress=progress, workers=app.config['PROCESS_WORKERS']
+        )
+    
+    failed = [report for report in reports if report['error']]
+    errors = '; '.join(f"{report['source']}: {report['error']}" for report in failed[:5])
+    
+    if processed_data is None:
+        app_metrics.inc('flood_uploads_total', help_text='Uploads processed', mode=mode, status='failed')
+        return None, f'Error processing batch: {errors}'
+    
+    result, message = apply_upload(job, processed_data, filename, merge, start)
+    if result is None:
+        return None, message
+    
+    result['sources'] = reports
+    if failed:
+        message += f' {len(failed)} of {len(reports)} sources were skipped: {errors}'
+    return result, message
+
+
+def apply_upload(job, processed_data, filename, merge, start):
+    """Merge or replace with processed upload data, returns (result, message)"""
+    mode = 'merge' if merge else 'replace'
+    
+    if merge:
+        job.update(phase='merging')
         
-        casualties = severity_casualties.get(row['Severity_Level'], 0)
+        # Apply on top of the newest saved data, one upload at a time across processes
+        with dataset_log.lock(), app_metrics.span('merge'):
+            sync_dataset()
+            added, updated = merge_districts_from_csv(processed_data, source=filename)
         
-        district = {
-            'id': next_id,
-            'name': row['District'],
-            'province': row.get('Province', 'N/A'),  # Optional field
-            'population': int(row['Affected_Population']),
-            'houses': int(row['Displaced_Families']),
-            'casualties': casualties,
-            'date': datetime.now().strftime('%Y-%m-%d'),
-            'severity': row['Severity_Level'],
-            'families': int(row['Displaced_Families']),
-            'food_packs': int(row['Food_Packs']),
-            'tents': int(row['Tents']),
-            'medical_supplies': int(row['Medical_Supplies']),
-            'water_bottles': int(row['Water_Bottles']),
-            'blankets': int(row['Blankets'])
-        }
+        if added is None:
+            app_metrics.inc('flood_uploads_total', help_text='Uploads processed', mode=mode, status='failed')
+            return None, f'Error processing CSV: {updated}'
         
-        districts_data.append(district)
-        next_id += 1
+        record_upload(mode, len(processed_data), time.perf_counter() - start)
+        return {'added': added, 'updated': updated}, \
+            f'Corrections merged successfully! {added} districts added, {updated} updated.'
     
-    return True
+    # Save processed data in a columnar format that loads without re-parsing
+    job.update(phase='saving')
+    processed_name = f"processed_{os.path.splitext(filename)[0]}"
+    with app_metrics.span('save'):
+        save_processed(processed_data, os.path.join(app.config['PROCESSED_FOLDER'], processed_name))
+    
+    # Update global districts data
+    job.update(phase='loading')
+    with dataset_log.lock(), app_metrics.span('load'):
+        sync_dataset()
+        update_districts_from_csv(processed_data, source=filename)
+    
+    record_upload(mode, len(processed_data), time.perf_counter() - start)
+    return {'districts': len(processed_data)}, \
+        f'File uploaded and processed successfully! {len(processed_data)} districts loaded.'
+
+
+def record_upload(mode, rows, seconds):
+    """Count a finished upload and its throughput"""
+    app_metrics.inc('flood_uploads_total', help_text='Uploads processed', mode=mode, status='done')
+    app_metrics.inc('flood_rows_processed_total', rows, 'CSV rows processed by uploads', mode=mode)
+    app_metrics.observe('flood_upload_seconds', seconds, 'Time to process an upload end to end', mode=mode)
+    app_metrics.set('flood_last_upload_rows_per_second', round(rows / seconds, 1) if seconds else 0,
+                    'Throughput of the most recent upload', mode=mode)
+
+
+# Serve a previously processed dataset straight away, e.g. ACTIVE_DATASET=latest
+if os.environ.get('ACTIVE_DATASET'):
+    loaded, message = activate_processed(os.environ['ACTIVE_DATASET'])
+    if loaded:
+        app.logger.info(message)
+    else:
+        app.logger.warning(f"ACTIVE_DATASET={os.environ['ACTIVE_DATASET']} not loaded: {message}")
 
 
 # ---------------- ROUTES ----------------
 
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    
+    if app.config['PROFILE_REQUESTS'] and request.args.get('profile') == '1':
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+@app.before_request
+def load_latest_dataset():
+    sync_dataset()
+    # Everything this request reads comes from one dataset, even if an upload is published meanwhile
+    g.dataset = active_dataset
+
+
+@app.after_request
+def record_request(response):
+    """Per-route latency histogram and request counter, plus the optional profile"""
+    endpoint = request.endpoint or 'unknown'
+    app_metrics.observe('flood_request_seconds', time.perf_counter() - g.request_start,
+                        'Request latency by route', endpoint=endpoint, method=request.method)
+    app_metrics.inc('flood_requests_total', help_text='Requests by route and status',
+                    endpoint=endpoint, method=request.method, status=str(response.status_code))
+    
+    profiler = g.pop('profiler', None)
+    if profiler:
+        profiler.disable()
+        report = io.StringIO()
+        pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(40)
+        response = app.response_class(report.getvalue(), mimetype='text/plain')
+    
+    return response
+
+
+def start_render_timer(sender, template, context, **extra):
+    g.setdefault('render_starts', []).append(time.perf_counter())
+
+
+def record_render_time(sender, template, context, **extra):
+    starts = g.get('render_starts')
+    if starts:
+        app_metrics.observe('flood_phase_seconds', time.perf_counter() - starts.pop(),
+                            'Time spent in each processing phase', phase='render', template=template.name)
+
+
+before_render_template.connect(start_render_timer, app)
+template_rendered.connect(record_render_time, app)
+
+
+def cached_page(build):
+    """HTML response rendered once per dataset version and URL
+
+    Pages are rendered from the cache until the next upload publishes a
+    new dataset version. Requests with pending flash messages are rendered fresh,
+    since those messages show only once.
+    """
+    if not app.config['RENDER_CACHE_BYTES'] or session.get('_flashes'):
+        return build()
+
+    key = request.full_path
+    entry = page_cache.get(current_dataset().version, key, lambda: build().encode('utf-8'))
+    return send_cached(entry, 'text/html')
+
+
 @app.route('/')
 def index():
-    districts = []
-    total_population = 0
-    total_houses = 0
-    total_casualties = 0
-    total_relief = 0
-
-    for d in districts_data:
-        relief = d['houses'] * 50000
-
-        districts.append({
-            'id': d['id'],
-            'name': d['name'],
-            'population': d['population'],
-            'houses': d['houses'],
-            'casualties': d['casualties'],
-            'relief': relief,
-            'date': d['date'],
-            'severity': d.get('severity', 'N/A')
-        })
-
-        total_population += d['population']
-        total_houses += d['houses']
-        total_casualties += d['casualties']
-        total_relief += relief
-
-    summary = {
-        'population': total_population,
-        'houses': total_houses,
-        'casualties': total_casualties,
-        'relief': total_relief
-    }
+    return cached_page(render_index)
+
+
+def render_index():
+    dataset = current_dataset()
+    rollups = dataset.rollups
+    dashboard = dashboard_view(dataset)
 
     return render_template(
         'index.html',
-        summary=summary,
-        districts=districts
+        summary=dashboard['summary'],
+        by_severity=rollups.by_severity,
+        districts=rollups.top('relief'),
+        top_population=rollups.top('population'),
+        dashboard=dashboard,
+        event_id=dashboard_feed.event_id(dataset.version)
     )
 
 
+# ---------------- DISTRICT PAGES ----------------
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(sort, descending, after):
+    """Opaque keyset cursor: the sort and the (value, id) of the last row returned"""
+    payload = json.dumps({'s': sort, 'd': descending, 'v': after[0], 'i': after[1]})
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor, sort, descending):
+    """(value, id) from a cursor, or None when it is invalid or for another sort"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if data['s'] != sort or data['d'] != descending:
+            return None
+        return int(data['v']), int(data['i'])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def page_query(args):
+    """Read sort/filter/cursor query parameters, returns (query, message)"""
+    sort = args.get('sort', 'id')
+    if sort not in SORT_COLUMNS:
+        return None, f"Invalid sort, expected one of: {', '.join(SORT_COLUMNS)}"
+
+    order = args.get('order', 'desc' if sort != 'id' else 'asc')
+    if order not in ('asc', 'desc'):
+        return None, "Invalid order, expected asc or desc"
+
+    try:
+        limit = int(args.get('limit', PAGE_SIZE))
+    except ValueError:
+        return None, "Invalid limit"
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return None, f"Limit must be between 1 and {MAX_PAGE_SIZE}"
+
+    for field in ('date_from', 'date_to'):
+        value = args.get(field)
+        if value:
+            try:
+                datetime.strptime(value, '%Y-%m-%d')
+            except ValueError:
+                return None, f"Invalid {field}, expected YYYY-MM-DD"
+
+    query = {
+        'sort': sort,
+        'descending': order == 'desc',
+        'severities': sorted(set(filter(None, args.getlist('severity')))),
+        'provinces': sorted(set(filter(None, args.getlist('province')))),
+        'date_from': args.get('date_from') or None,
+        'date_to': args.get('date_to') or None,
+        'after': None,
+        'limit': limit
+    }
+
+    cursor = args.get('cursor')
+    if cursor:
+        query['after'] = decode_cursor(cursor, sort, query['descending'])
+        if query['after'] is None:
+            return None, "Invalid cursor"
+
+    return query, "Success"
+
+
+def district_page(query):
+    """One page of districts plus the cursor for the next page"""
+    rows, total, after = current_dataset().store.page(**query)
+    next_cursor = encode_cursor(query['sort'], query['descending'], after) if after else None
+    return rows, total, next_cursor
+
+
 @app.route('/districts')
 def districts():
-    districts = []
-    for d in districts_data:
-        relief = d['houses'] * 50000
-        districts.append({
-            'id': d['id'],
-            'name': d['name'],
-            'population': d['population'],
-            'houses': d['houses'],
-            'casualties': d['casualties'],
-            'relief': relief,
-            'date': d['date'],
-            'severity': d.get('severity', 'N/A')
-        })
-    
-    return render_template('districts.html', districts=districts)
+    query, message = page_query(request.args)
+    if query is None:
+        flash(message, 'error')
+        return redirect(url_for('districts'))
+
+    return cached_page(lambda: render_districts(query))
+
+
+def render_districts(query):
+    rows, total, next_cursor = district_page(query)
+
+    return render_template(
+        'districts.html',
+        districts=rows,
+        total=total,
+        next_cursor=next_cursor,
+        query=query,
+        severities=current_dataset().store.severities(),
+        provinces=current_dataset().store.provinces()
+    )
 
 
 @app.route('/district/<int:district_id>')
 def district_detail(district_id):
-    district_found = None
-    for d in districts_data:
-        if d['id'] == district_id:
-            district_found = d
-            break
+    district = current_dataset().store.get(district_id)
     
-    if not district_found:
+    if not district:
         flash('District not found', 'error')
         return redirect(url_for('districts'))
     
-    relief = district_found['houses'] * 50000
-    district = {
-        'id': district_found['id'],
-        'name': district_found['name'],
-        'population': district_found['population'],
-        'houses': district_found['houses'],
-        'casualties': district_found['casualties'],
-        'relief': relief,
-        'date': district_found['date'],
-        'severity': district_found.get('severity', 'N/A'),
-        'food_packs': district_found.get('food_packs', 0),
-        'tents': district_found.get('tents', 0),
-        'medical_supplies': district_found.get('medical_supplies', 0),
-        'water_bottles': district_found.get('water_bottles', 0),
-        'blankets': district_found.get('blankets', 0)
-    }
+    plan = current_allocation()
+    allocation = plan.for_district(district_id) if plan else None
     
-    return render_template('district-detail.html', district=district)
+    return render_template('district-detail.html', district=district, allocation=allocation, plan=plan)
 
 @app.route('/download-sample-csv')
 def download_sample_csv():
@@ -328,103 +721,493 @@ Shikarpur,80000,Medium,2700,Sindh"""
 @app.route('/upload', methods=['GET', 'POST'])
 def upload_page():
     if request.method == 'POST':
-        if 'file' not in request.files or request.files['file'].filename == '':
+        files = [file for file in request.files.getlist('file') if file.filename]
+        if not files:
             flash('No file selected', 'error')
             return redirect(request.url)
-
-        file = request.files['file']
         
-        if not file.filename.endswith('.csv'):
-            flash('Please upload a CSV file', 'error')
+        names = [secure_filename(file.filename) for file in files]
+        if not all(name.lower().endswith(BATCH_EXTENSIONS) for name in names):
+            flash('Please upload CSV, Excel (.xlsx) or zip files', 'error')
             return redirect(request.url)
         
-        # Save uploaded file
-        filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{file.filename}"
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        # Save uploaded files, numbered so two files with the same name don't overwrite each other
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        saved = [f'{stamp}_{names[0]}'] if len(names) == 1 else [f'{stamp}_{i}_{name}' for i, name in enumerate(names, 1)]
+        paths = [os.path.join(app.config['UPLOAD_FOLDER'], filename) for filename in saved]
+        with app_metrics.span('upload_save'):
+            for file, path in zip(files, paths):
+                file.save(path)
 
-        # Process the CSV
-        processed_data, message = process_csv(filepath)
+        merge = request.form.get('mode') == 'merge'
         
-        if processed_data is None:
-            flash(f'Error processing CSV: {message}', 'error')
-            return redirect(request.url)
+        # Process in the background so big files don't time out the request.
+        # A single CSV takes the streaming path, anything else goes through the batch pool.
+        if len(files) == 1 and names[0].lower().endswith('.csv'):
+            job = upload_jobs.submit(names[0], run_upload, paths[0], os.path.basename(paths[0]), merge)
+        else:
+            filename = os.path.basename(paths[0]) if len(files) == 1 else f'{stamp}_batch_of_{len(files)}'
+            job = upload_jobs.submit(', '.join(names), run_batch_upload, list(zip(paths, names)), filename, merge)
         
-        # Save processed data
-        processed_filename = f"processed_{filename}"
-        processed_filepath = os.path.join(app.config['PROCESSED_FOLDER'], processed_filename)
-        processed_data.to_csv(processed_filepath, index=False)
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify({'job_id': job.id, 'status_url': url_for('get_job', job_id=job.id)}), 202
         
-        # Update global districts data
-        update_districts_from_csv(processed_data)
-        
-        flash(f'File uploaded and processed successfully! {len(processed_data)} districts loaded.', 'success')
-        return redirect(url_for('index'))
-
-    # Calculate summary for upload page
-    total_population = sum(d['population'] for d in districts_data)
-    total_houses = sum(d['houses'] for d in districts_data)
-    total_casualties = sum(d['casualties'] for d in districts_data)
-    total_relief = sum(d['houses'] * 50000 for d in districts_data)
-    
-    top_districts = []
-    for d in districts_data[:10]:  # Show top 10
-        relief = d['houses'] * 50000
-        top_districts.append({
-            'id': d['id'],
-            'name': d['name'],
-            'population': d['population'],
-            'houses': d['houses'],
-            'relief': relief
-        })
+        flash('File uploaded, processing has started.', 'success')
+        return redirect(url_for('upload_page', job=job.id))
+
+    # Job progress changes while the dataset doesn't, so that view isn't cached
+    job = upload_jobs.get(request.args.get('job'))
+    if job:
+        return render_upload(job)
+
+    return cached_page(render_upload)
+
+
+def render_upload(job=None):
+    # Summary and top districts come from the precomputed rollups
+    rollups = current_dataset().rollups
+    totals = rollups.totals
+    
+    top_districts = rollups.top('relief')
 
     return render_template(
         'upload.html',
-        total_population=total_population,
-        total_houses=total_houses,
-        total_casualties=total_casualties,
-        total_relief=total_relief,
-        top_districts=top_districts
+        total_population=totals['population'],
+        total_houses=totals['houses'],
+        total_casualties=totals['casualties'],
+        total_relief=totals['relief'],
+        top_districts=top_districts,
+        job=job
     )
 
 
 # ---------------- API ----------------
+def cached_json(key, build):
+    """JSON response built once per dataset version, with ETag/304 and gzip support"""
+    entry = api_cache.get(current_dataset().version, key, lambda: app.json.dumps(build()).encode('utf-8'))
+    return send_cached(entry, 'application/json')
+
+
+def send_cached(entry, mimetype):
+    """Response for a CachedBody: gzip when accepted, 304 when that variant's ETag matches"""
+    gzipped = bool(request.accept_encodings['gzip'])
+    etag = entry.gzip_etag if gzipped else entry.etag
+    
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(entry.gzip_body if gzipped else entry.body, mimetype=mimetype)
+        if gzipped:
+            response.headers['Content-Encoding'] = 'gzip'
+    
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
 @app.route('/api/districts')
 def get_districts():
-    return jsonify(districts_data)
+    """API endpoint for districts
+
+    Without query parameters every district is returned. With any of sort, order,
+    severity, province, date_from, date_to, limit or cursor a page is returned
+    together with the cursor for the next one.
+    """
+    if not request.args:
+        return cached_json('districts', current_dataset().store.all)
+
+    query, message = page_query(request.args)
+    if query is None:
+        return jsonify({'error': message}), 400
+
+    return cached_json(request.full_path, lambda: districts_page_data(query))
+
+
+def districts_page_data(query):
+    rows, total, next_cursor = district_page(query)
+
+    return {
+        'districts': rows,
+        'total': total,
+        'limit': query['limit'],
+        'next_cursor': next_cursor
+    }
+
+
+@app.route('/api/upload/stream', methods=['POST'])
+def upload_stream():
+    """API endpoint that processes a CSV sent as the raw request body
+
+    The CSV is parsed while it arrives, without saving it first, and the raw
+    file is archived to the uploads folder on a background thread. Use
+    ?name=<file name>.csv and ?mode=merge for corrections. Responds with the
+    finished job once the new districts are live.
+    """
+    name = secure_filename(request.args.get('name', 'upload.csv'))
+    if not name.endswith('.csv'):
+        return jsonify({'error': 'Please upload a CSV file'}), 400
+    
+    merge = request.args.get('mode') == 'merge'
+    filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{name}"
+    
+    source = request.stream
+    archiver = None
+    if app.config['UPLOAD_ARCHIVE'] != 'off':
+        archiver = UploadArchiver(
+            os.path.join(app.config['UPLOAD_FOLDER'], filename),
+            compress=app.config['UPLOAD_ARCHIVE'] == 'gzip'
+        )
+        source = TeeReader(source, archiver)
+    
+    job = upload_jobs.run(name, run_upload, source, filename, merge)
+    
+    # Failed uploads are not archived, the writer finishes on its own thread
+    if archiver:
+        archiver.close(keep=job.status == 'done')
+    
+    return jsonify(job.to_dict()), 200 if job.status == 'done' else 400
+
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    """API endpoint for the progress of a background upload"""
+    job = upload_jobs.get(job_id)
+    
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    return jsonify(job.to_dict())
+
+
+@app.route('/api/events')
+def dashboard_events():
+    """Server-sent events with the dashboard changes of every new dataset version
+
+    The browser passes the version its page shows as ?since= (or Last-Event-ID
+    when it reconnects) and gets only what changed after it. Each open stream
+    holds one worker thread, so there are at most EVENTS_MAX_STREAMS per
+    process; past that the answer is 503 and the page polls with ?poll=1,
+    which returns the change as JSON (204 when there is none) without waiting.
+    """
+    since = dashboard_feed.parse_event_id(request.headers.get('Last-Event-ID') or request.args.get('since'))
+    heartbeat = app.config['EVENTS_HEARTBEAT_SECONDS']
+    
+    if request.args.get('poll') == '1':
+        delta = dashboard_feed.poll(since)
+        return jsonify(delta) if delta else ('', 204)
+    
+    if not dashboard_feed.join(app.config['EVENTS_MAX_STREAMS']):
+        response = jsonify({'error': 'Too many open event streams, poll with ?poll=1'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(max(int(heartbeat), 1))
+        return response
+    
+    events = dashboard_feed.stream(since, heartbeat, idle=sync_dataset, lifetime=app.config['EVENTS_MAX_SECONDS'])
+    response = Response(events, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Let nginx pass events on as they come
+    })
+    # Runs when the server closes the response, also if the browser left before the first event
+    response.call_on_close(dashboard_feed.leave)
+    return response
 
 
 @app.route('/api/summary')
 def get_summary():
     """API endpoint for summary statistics"""
-    if not districts_data:
+    if not len(current_dataset().store):
         return jsonify({'error': 'No data available'}), 404
     
-    total_population = sum(d['population'] for d in districts_data)
-    total_families = sum(d.get('families', d['houses']) for d in districts_data)
-    total_food = sum(d.get('food_packs', 0) for d in districts_data)
-    total_tents = sum(d.get('tents', 0) for d in districts_data)
-    total_medical = sum(d.get('medical_supplies', 0) for d in districts_data)
-    total_water = sum(d.get('water_bottles', 0) for d in districts_data)
-    total_blankets = sum(d.get('blankets', 0) for d in districts_data)
-    
-    critical_count = len([d for d in districts_data if d.get('severity') == 'Critical'])
-    high_count = len([d for d in districts_data if d.get('severity') == 'High'])
-    
-    summary = {
-        'total_population': total_population,
-        'total_families': total_families,
-        'total_food_packs': total_food,
-        'total_tents': total_tents,
-        'total_medical_supplies': total_medical,
-        'total_water_bottles': total_water,
-        'total_blankets': total_blankets,
-        'districts_count': len(districts_data),
-        'critical_districts': critical_count,
-        'high_severity_districts': high_count
+    return cached_json('summary', summary_data)
+
+
+def summary_data():
+    """Summary statistics served by /api/summary"""
+    dataset = current_dataset()
+    rollups = dataset.rollups
+    totals = rollups.totals
+    
+    return {
+        'total_population': totals['population'],
+        'total_families': totals['families'],
+        'total_food_packs': totals['food_packs'],
+        'total_tents': totals['tents'],
+        'total_medical_supplies': totals['medical_supplies'],
+        'total_water_bottles': totals['water_bottles'],
+        'total_blankets': totals['blankets'],
+        'districts_count': len(dataset.store),
+        'critical_districts': rollups.severity_count('Critical'),
+        'high_severity_districts': rollups.severity_count('High')
     }
+
+
+@app.route('/api/scenarios', methods=['POST'])
+def run_scenarios():
+    """API endpoint that evaluates what-if resource scenarios against the loaded districts
+
+    Expects {"scenarios": [{"name": ..., "ratios": {...}, "multipliers": {...}}, ...]}
+    where anything left out keeps the default value. Returns the total of each
+    resource per scenario, next to the baseline totals of the loaded data.
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict) or not isinstance(payload.get('scenarios'), list):
+        return jsonify({'error': 'Expected a JSON object with a list of scenarios'}), 400
+    
+    specs = payload['scenarios']
+    if not 1 <= len(specs) <= MAX_SCENARIOS:
+        return jsonify({'error': f'Send between 1 and {MAX_SCENARIOS} scenarios'}), 400
+    
+    models = []
+    for i, spec in enumerate(specs, start=1):
+        model, message = parse_model(spec, f'Scenario {i}')
+        if model is None:
+            return jsonify({'error': message}), 400
+        models.append(model)
+    
+    store = current_dataset().store
+    totals = evaluate_scenarios(store, models)
+    resources = DEFAULT_MODEL.resources
+    baseline = store.totals()
+    
+    return jsonify({
+        'districts': len(store),
+        'baseline': {name: baseline[name] for name in resources},
+        'scenarios': [
+            dict(model.to_dict(), totals=dict(zip(resources, row.tolist())))
+            for model, row in zip(models, totals)
+        ]
+    })
+
+
+def current_allocation():
+    """The latest allocation plan if it was made for the districts loaded now"""
+    plan = allocation_plan
+    if plan is None or plan.store is not current_dataset().store:
+        return None
+    return plan
+
+
+@app.route('/api/allocation', methods=['GET', 'POST'])
+def allocation():
+    """API endpoint that splits warehouse stock across the loaded districts
+
+    POST {"stock": {"tents": 50000, ...}, "strategy": "water_filling" | "proportional",
+    "weights": {"Critical": 4, ...}} makes a new plan, GET returns the latest one.
+    """
+    global allocation_plan
+    
+    if request.method == 'GET':
+        plan = current_allocation()
+        if not plan:
+            return jsonify({'error': 'No allocation for the current data'}), 404
+        return jsonify(plan.summary())
+    
+    options, message = parse_request(request.get_json(silent=True))
+    if options is None:
+        return jsonify({'error': message}), 400
+    
+    store = current_dataset().store
+    if not len(store):
+        return jsonify({'error': 'No data available'}), 404
+    
+    allocation_plan = AllocationPlan(store, **options)
+    return jsonify(allocation_plan.summary())
+
+
+@app.route('/api/allocation/<int:district_id>')
+def district_allocation(district_id):
+    """API endpoint for one district's share of the latest allocation"""
+    plan = current_allocation()
+    if not plan:
+        return jsonify({'error': 'No allocation for the current data'}), 404
+    
+    allocation = plan.for_district(district_id)
+    if allocation is None:
+        return jsonify({'error': 'District not found'}), 404
+    
+    return jsonify({'district_id': district_id, 'strategy': plan.strategy, 'resources': allocation})
+
+
+@app.route('/api/rollups')
+def get_rollups():
+    """API endpoint for all precomputed rollups"""
+    return cached_json('rollups', current_dataset().rollups.to_dict)
+
+
+@app.route('/api/rollups/top/<field>')
+def get_top_districts(field):
+    """API endpoint for the top districts by one field, ?n= up to the precomputed size"""
+    if field not in RANKED_FIELDS:
+        return jsonify({'error': f"Unknown field, expected one of: {', '.join(RANKED_FIELDS)}"}), 404
+    
+    rollups = current_dataset().rollups
+    n = request.args.get('n', rollups.top_n, type=int)
+    if not 1 <= n <= rollups.top_n:
+        return jsonify({'error': f'n must be between 1 and {rollups.top_n}'}), 400
+    
+    return cached_json(f'top:{field}:{n}', lambda: rollups.top(field, n))
+
+
+@app.route('/api/rollups/severity')
+def get_severity_rollups():
+    """API endpoint for district counts and totals per severity level"""
+    return cached_json('rollups:severity', lambda: current_dataset().rollups.by_severity)
+
+
+@app.route('/api/rollups/province')
+def get_province_rollups():
+    """API endpoint for district counts and totals per province"""
+    return cached_json('rollups:province', lambda: current_dataset().rollups.by_province)
+
+
+NO_LOCATIONS = 'No district locations loaded, upload a CSV with Latitude and Longitude columns'
+
+
+@app.route('/api/geo/nearest')
+def geo_nearest():
+    """API endpoint for the k districts closest to a point such as a warehouse
+
+    ?lat=&lon=&k= (default 10). Districts come nearest first with distance_km,
+    together with the resource totals they need.
+    """
+    query, message = parse_nearest(request.args)
+    if query is None:
+        return jsonify({'error': message}), 400
+    
+    if not current_dataset().geo.size:
+        return jsonify({'error': NO_LOCATIONS}), 404
+    
+    return cached_json(request.full_path, lambda: nearest_data(**query))
+
+
+def nearest_data(lat, lon, k):
+    dataset = current_dataset()
+    positions, distances = dataset.geo.nearest(lat, lon, k)
+    return dict(summarize(dataset.store, positions, k, distances), point={'lat': lat, 'lon': lon})
+
+
+@app.route('/api/geo/bbox')
+def geo_bbox():
+    """API endpoint for the districts inside a box, ?south=&west=&north=&east=&limit=
+
+    Returns how many districts are inside and what they need in total, listing
+    up to limit of them (the most relief first).
+    """
+    query, message = parse_bbox(request.args)
+    if query is None:
+        return jsonify({'error': message}), 400
+    
+    if not current_dataset().geo.size:
+        return jsonify({'error': NO_LOCATIONS}), 404
+    
+    limit = query.pop('limit')
+    return cached_json(request.full_path, lambda: region_data(current_dataset().geo.bbox(**query), limit))
+
+
+@app.route('/api/geo/polygon', methods=['POST'])
+def geo_polygon():
+    """API endpoint for the districts inside a flood polygon
+
+    Expects {"polygon": <GeoJSON Polygon>, "limit": 100}, coordinates as
+    [longitude, latitude] with holes after the outer ring.
+    """
+    query, message = parse_polygon(request.get_json(silent=True))
+    if query is None:
+        return jsonify({'error': message}), 400
+    
+    dataset = current_dataset()
+    if not dataset.geo.size:
+        return jsonify({'error': NO_LOCATIONS}), 404
+    
+    return jsonify(region_data(dataset.geo.polygon(query['rings']), query['limit']))
+
+
+def region_data(positions, limit):
+    """Summary of the districts of a bbox or polygon query"""
+    return summarize(current_dataset().store, positions, limit)
+
+
+@app.route('/api/history')
+def get_history():
+    """API endpoint listing every uploaded version of the districts"""
+    dataset_history.refresh()
+    return jsonify({'versions': [version.to_dict() for version in dataset_history.versions]})
+
+
+@app.route('/api/history/districts/<name>')
+def get_district_history(name):
+    """API endpoint for one district's values across the uploaded versions
+
+    ?field= (repeatable, population by default), ?last=<versions> and/or
+    ?since=<ISO date> limit the range, ?province= picks between districts
+    with the same name.
+    """
+    fields = request.args.getlist('field') or ['population']
+    unknown = [field for field in fields if field not in TRACKED_FIELDS]
+    if unknown:
+        return jsonify({'error': f"Unknown fields {', '.join(unknown)}, expected: {', '.join(TRACKED_FIELDS)}"}), 400
+    
+    last = request.args.get('last', type=int)
+    if last is not None and last < 1:
+        return jsonify({'error': 'last must be at least 1'}), 400
+    
+    since = request.args.get('since')
+    try:
+        if since is not None:
+            datetime.fromisoformat(since)
+    except ValueError:
+        return jsonify({'error': 'since must be an ISO date, e.g. 2024-08-15'}), 400
+    
+    keys = dataset_history.keys(name, request.args.get('province'))
+    if not keys:
+        return jsonify({'error': 'District not found in the history'}), 404
+    if len(keys) > 1:
+        return jsonify({'error': f"District '{name}' exists in several provinces, add ?province="}), 400
+    
+    return jsonify({
+        'district': dataset_history.district(keys[0]),
+        'fields': fields,
+        'points': dataset_history.timeline(keys[0], fields, last, since)
+    })
+
+
+@app.route('/api/history/diff')
+def get_history_diff():
+    """API endpoint for the districts added, removed and changed between two versions
+
+    ?from=<version>&to=<version>, the last two versions by default. ?limit= caps
+    the districts listed per group, the counts always cover all of them.
+    """
+    dataset_history.refresh()
+    count = len(dataset_history)
+    second = request.args.get('to', count, type=int)
+    first = request.args.get('from', second - 1, type=int)
+    if not (1 <= first <= count and 1 <= second <= count):
+        return jsonify({'error': f'Unknown version, there are {count} versions'}), 404
+    
+    limit = request.args.get('limit', DIFF_LIMIT, type=int)
+    if not 0 <= limit <= 10 * DIFF_LIMIT:
+        return jsonify({'error': f'limit must be between 0 and {10 * DIFF_LIMIT}'}), 400
+    
+    # Versions never change once written, so neither does their diff
+    return cached_json(f'history:diff:{first}:{second}:{limit}',
+                       lambda: dataset_history.diff(first, second, limit))
+
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus text exposition of request, pipeline and cache metrics"""
+    dataset = current_dataset()
+    app_metrics.set('flood_districts', len(dataset.store), 'Districts currently loaded')
+    app_metrics.set('flood_dataset_version', dataset.version, 'Version of the loaded dataset in this process')
+    app_metrics.set('flood_event_streams', dashboard_feed.listeners, 'Open /api/events dashboard streams')
+    for name, cache in [('api', api_cache), ('page', page_cache)]:
+        stats = cache.stats()
+        app_metrics.set('flood_cache_bytes', stats['bytes'], 'Bytes held by a response cache', cache=name)
+        app_metrics.set('flood_cache_hits', stats['hits'], 'Response cache hits since start', cache=name)
+        app_metrics.set('flood_cache_misses', stats['misses'], 'Response cache misses since start', cache=name)
     
-    return jsonify(summary)
+    return app.response_class(app_metrics.render(), mimetype='text/plain; version=0.0.4')
 
 
 # ---------------- ERROR HANDLERS ----------------
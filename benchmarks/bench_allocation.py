@@ -0,0 +1,43 @@
+"""Time the stock allocation (weighted water-filling) on large inputs
+
+Its properties are checked in tests/test_allocation.py.
+
+Run from the repository root:
+    python benchmarks/bench_allocation.py --rows 100000 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from processing.allocation import water_fill
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'districts':>10} {'water-filling':>14} {'proportional':>13}")
+    for rows in args.rows:
+        need = rng.integers(0, 100000, rows)
+        weights = rng.choice([1.0, 1.5, 2.0, 2.5], rows)
+        stock = int(need.sum() // 3)
+
+        times = []
+        for district_weights in (weights, weights * need):
+            start = time.perf_counter()
+            allocation = water_fill(need, district_weights, stock)
+            times.append(time.perf_counter() - start)
+            assert allocation.sum() == stock and (allocation <= need).all()
+
+        print(f"{rows:>10,} {times[0]:>13.3f}s {times[1]:>12.3f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""How batch ingest of a multi-sheet workbook and a zip of CSVs scales with worker processes
+
+Writes a workbook with one sheet per province and a zip of per-district CSVs,
+then times process_batch with each worker count. Every run must give the same
+data as the single-process run.
+
+Run from the repository root:
+    python benchmarks/bench_batch.py
+    python benchmarks/bench_batch.py --sheets 8 --rows 20000 --workers 1 2 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import zipfile
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import make_flood_frame
+from processing.batch import process_batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sheets', type=int, default=4, help='workbook sheets, and CSVs in the zip')
+    parser.add_argument('--rows', type=int, default=10000, help='rows per sheet and per CSV')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        workbook_path = os.path.join(folder, 'provinces.xlsx')
+        bundle_path = os.path.join(folder, 'districts.zip')
+
+        with pd.ExcelWriter(workbook_path, engine='openpyxl') as writer:
+            for i in range(args.sheets):
+                make_flood_frame(args.rows, seed=i).to_excel(writer, sheet_name=f'Sheet {i + 1}', index=False)
+        with zipfile.ZipFile(bundle_path, 'w', zipfile.ZIP_DEFLATED) as bundle:
+            for i in range(args.sheets):
+                bundle.writestr(f'district_{i + 1}.csv', make_flood_frame(args.rows, seed=100 + i).to_csv(index=False))
+
+        files = [(workbook_path, 'provinces.xlsx'), (bundle_path, 'districts.zip')]
+        print(f"{2 * args.sheets} sources of {args.rows:,} rows")
+        print(f"{'workers':>8} {'seconds':>9} {'speedup':>8}")
+
+        expected = baseline = None
+        for workers in args.workers:
+            start = time.perf_counter()
+            data, reports = process_batch(files, workers=workers)
+            seconds = time.perf_counter() - start
+
+            assert data is not None and not any(report['error'] for report in reports), reports
+            if expected is None:
+                expected, baseline = data, seconds
+            else:
+                pd.testing.assert_frame_equal(data, expected)
+
+            print(f"{workers:>8} {seconds:>8.2f}s {baseline / seconds:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
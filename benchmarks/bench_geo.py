@@ -0,0 +1,123 @@
+"""Spatial queries: grid index build time, nearest / bbox / polygon latency vs a full scan
+
+Every answer from the grid index is checked against a brute-force scan over
+all districts with a location.
+
+Run from the repository root:
+    python benchmarks/bench_geo.py
+    python benchmarks/bench_geo.py --rows 10000 50000 200000 --queries 500
+"""
+import argparse
+import math
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import make_flood_frame
+from processing.geo import GridIndex, haversine_km
+from processing.processor import calculate_resources
+from processing.store import DistrictStore
+
+
+def make_store(data):
+    return DistrictStore.from_frame(data.rename(columns={
+        'District': 'name', 'Province': 'province', 'Affected_Population': 'population',
+        'Displaced_Families': 'families', 'Severity_Level': 'severity', 'Food_Packs': 'food_packs',
+        'Tents': 'tents', 'Medical_Supplies': 'medical_supplies', 'Water_Bottles': 'water_bottles',
+        'Blankets': 'blankets', 'Latitude': 'latitude', 'Longitude': 'longitude'
+    }).assign(id=np.arange(1, len(data) + 1), houses=0, casualties=0, date='N/A'))
+
+
+def scan_nearest(lats, lons, lat, lon, k):
+    distances = haversine_km(lat, lon, lats, lons)
+    best = np.lexsort((np.arange(len(lats)), distances))[:k]
+    return best, distances[best]
+
+
+def scan_polygon(lats, lons, ring):
+    """Even-odd test of every point against every edge"""
+    inside = np.zeros(len(lats), dtype=bool)
+    x1, y1 = ring[:, 0], ring[:, 1]
+    x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+    for i in range(len(ring)):
+        if y1[i] == y2[i]:
+            continue
+        crosses = (lats >= min(y1[i], y2[i])) & (lats < max(y1[i], y2[i]))
+        at = x1[i] + (lats - y1[i]) * (x2[i] - x1[i]) / (y2[i] - y1[i])
+        inside ^= crosses & (lons < at)
+    return np.flatnonzero(inside)
+
+
+def make_ring(rng, points):
+    """A star-shaped polygon around a random centre, as (lon, lat) rows"""
+    lat, lon = rng.uniform([25, 62], [36, 76])
+    angles = np.sort(rng.uniform(0, 2 * math.pi, points))
+    radii = rng.uniform(0.3, 2.0, points)
+    return np.column_stack([lon + radii * np.cos(angles), lat + radii * np.sin(angles)])
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 50000])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'rows':>9} {'build':>8} {'query':<8} {'index':>9} {'scan':>9}")
+
+    for rows in args.rows:
+        data = make_flood_frame(rows, locations=True)
+        # A few districts without a location must be left out of every answer
+        data.loc[data.index[::97], ['Latitude', 'Longitude']] = np.nan
+        store = make_store(calculate_resources(data))
+
+        index, build = timed(GridIndex, store)
+        located = np.flatnonzero(np.isfinite(store.column('latitude')))
+        lats, lons = store.column('latitude')[located], store.column('longitude')[located]
+
+        times = {'nearest': ([], []), 'bbox': ([], []), 'polygon': ([], [])}
+        for _ in range(args.queries):
+            lat, lon = rng.uniform([23, 60], [38, 78])
+
+            (positions, distances), took = timed(index.nearest, lat, lon, args.k)
+            (best, scanned), scan = timed(scan_nearest, lats, lons, lat, lon, args.k)
+            assert np.array_equal(positions, located[best]) and np.allclose(distances, scanned), (lat, lon)
+            times['nearest'][0].append(took)
+            times['nearest'][1].append(scan)
+
+            size = rng.uniform(0.1, 3, 2)
+            box = (lat - size[0], lon - size[1], lat + size[0], lon + size[1])
+            positions, took = timed(index.bbox, *box)
+            inside, scan = timed(lambda: located[(lats >= box[0]) & (lats <= box[2])
+                                                 & (lons >= box[1]) & (lons <= box[3])])
+            assert np.array_equal(positions, inside), box
+            times['bbox'][0].append(took)
+            times['bbox'][1].append(scan)
+
+            ring = make_ring(rng, 200)
+            positions, took = timed(index.polygon, [ring])
+            inside, scan = timed(scan_polygon, lats, lons, ring)
+            assert np.array_equal(positions, located[inside])
+            times['polygon'][0].append(took)
+            times['polygon'][1].append(scan)
+
+        for i, (name, (indexed, scanned)) in enumerate(times.items()):
+            prefix = f"{rows:>9,} {build * 1e3:>6.1f}ms" if not i else ' ' * 18
+            print(f"{prefix} {name:<8} {statistics.median(indexed) * 1e6:>7.0f}us "
+                  f"{statistics.median(scanned) * 1e6:>7.0f}us")
+
+
+if __name__ == '__main__':
+    main()
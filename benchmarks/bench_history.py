@@ -0,0 +1,99 @@
+"""Cost of the dataset history: recording versions, disk use, trend and diff queries
+
+Simulates a series of uploads of the same districts where a share of them
+changes every time, records each one in a DatasetHistory, and checks that
+every trend query returns the values that were uploaded.
+
+Run from the repository root:
+    python benchmarks/bench_history.py
+    python benchmarks/bench_history.py --rows 1000000 --versions 30 --changed 0.05
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import make_flood_frame
+from processing.history import DatasetHistory
+from processing.processor import calculate_resources
+from processing.store import DistrictStore
+
+
+def make_store(data):
+    return DistrictStore.from_frame(data.rename(columns={
+        'District': 'name', 'Province': 'province', 'Affected_Population': 'population',
+        'Displaced_Families': 'families', 'Severity_Level': 'severity', 'Food_Packs': 'food_packs',
+        'Tents': 'tents', 'Medical_Supplies': 'medical_supplies', 'Water_Bottles': 'water_bottles',
+        'Blankets': 'blankets'
+    }).assign(id=np.arange(1, len(data) + 1), houses=0, casualties=0, date='N/A'))
+
+
+def folder_bytes(folder):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(folder) for name in names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--versions', type=int, default=20)
+    parser.add_argument('--changed', type=float, default=0.05, help='share of districts changed per upload')
+    parser.add_argument('--queries', type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    data = make_flood_frame(args.rows)
+    data['District'] = [f'District {i}' for i in range(args.rows)]
+    populations = []
+
+    with tempfile.TemporaryDirectory() as folder:
+        history = DatasetHistory(folder)
+        record_times = []
+        snapshot_bytes = 0
+
+        for _ in range(args.versions):
+            changed = rng.random(args.rows) < args.changed
+            data.loc[changed, 'Affected_Population'] += rng.integers(1, 1000, int(changed.sum()))
+            populations.append(data['Affected_Population'].to_numpy().copy())
+
+            store = make_store(calculate_resources(data.copy()))
+            snapshot_bytes += sum(store.column(field).nbytes for field in ['population', 'families', 'houses',
+                                                                             'casualties', 'food_packs', 'tents',
+                                                                             'medical_supplies', 'water_bottles',
+                                                                             'blankets'])
+
+            start = time.perf_counter()
+            history.record(store)
+            record_times.append(time.perf_counter() - start)
+
+        print(f"{args.versions} versions of {args.rows:,} districts, {args.changed:.0%} changed per upload")
+        print(f"record: first {record_times[0]:.3f}s, then median {statistics.median(record_times[1:]):.3f}s")
+        print(f"disk: {folder_bytes(folder) / 1e6:.1f} MB vs {snapshot_bytes / 1e6:.1f} MB of full numeric columns")
+
+        # Trend of one district over the last 14 versions, checked against what was uploaded
+        last = min(14, args.versions)
+        names = rng.integers(0, args.rows, args.queries)
+        times = []
+        for row in names:
+            key = history.keys(f'District {row}', data['Province'].iloc[row])[0]
+            start = time.perf_counter()
+            points = history.timeline(key, ['population'], last=last)
+            times.append(time.perf_counter() - start)
+
+            assert [point['population'] for point in points] == [int(values[row]) for values in populations[-last:]]
+
+        print(f"trend over {last} versions: median {statistics.median(times) * 1e6:.0f}us, "
+              f"max {max(times) * 1e6:.0f}us")
+
+        start = time.perf_counter()
+        diff = history.diff(1, args.versions)
+        print(f"diff 1 -> {args.versions}: {time.perf_counter() - start:.3f}s, {diff['counts']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""End-to-end upload time: multipart form + background job vs streaming ingest
+
+The form upload is saved to disk, then read back by the job. The streaming
+endpoint parses the request body as it arrives and archives it on a thread
+(archive off, plain or gzip). Every variant must load the same districts.
+
+Run from the repository root:
+    python benchmarks/bench_ingest.py --rows 100000 500000
+"""
+import argparse
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The app persists uploads, keep that out of the repository
+SCRATCH = tempfile.mkdtemp()
+os.environ['DATA_FOLDER'] = os.path.join(SCRATCH, 'data')
+
+import app as flood_app  # noqa: E402
+from benchmarks.synthetic import make_flood_frame  # noqa: E402
+
+
+def form_upload(client, body):
+    response = client.post('/upload', data={'file': (io.BytesIO(body), 'bench.csv')},
+                           headers={'Accept': 'application/json'})
+    flood_app.upload_jobs.get(response.json['job_id']).wait()
+
+
+def stream_upload(client, body):
+    response = client.post('/api/upload/stream?name=bench.csv', data=body, content_type='text/csv')
+    assert response.status_code == 200, response.json
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 500000])
+    args = parser.parse_args()
+
+    for name in ('uploads', 'processed'):
+        os.makedirs(os.path.join(SCRATCH, name))
+    flood_app.app.config['UPLOAD_FOLDER'] = os.path.join(SCRATCH, 'uploads')
+    flood_app.app.config['PROCESSED_FOLDER'] = os.path.join(SCRATCH, 'processed')
+    client = flood_app.app.test_client()
+
+    variants = [
+        ('multipart form', None, form_upload),
+        ('stream, archive off', 'off', stream_upload),
+        ('stream, archive plain', 'plain', stream_upload),
+        ('stream, archive gzip', 'gzip', stream_upload),
+    ]
+
+    try:
+        print(f"{'rows':>10} {'variant':<24} {'seconds':>9}")
+        for rows in args.rows:
+            body = make_flood_frame(rows).to_csv(index=False).encode()
+            expected = None
+
+            for name, archive, upload in variants:
+                if archive:
+                    flood_app.app.config['UPLOAD_ARCHIVE'] = archive
+
+                start = time.perf_counter()
+                upload(client, body)
+                elapsed = time.perf_counter() - start
+
+                # Every variant must end with the same districts loaded
+                totals = flood_app.active_dataset.store.totals()
+                expected = expected or totals
+                assert totals == expected and len(flood_app.active_dataset.store) == rows, name
+
+                print(f"{rows:>10,} {name:<24} {elapsed:>8.3f}s")
+    finally:
+        shutil.rmtree(SCRATCH, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Bytes per district: list of dicts (old districts_data) vs the columnar DistrictStore
+
+Run from the repository root:
+    python benchmarks/bench_memory.py --rows 10000 100000
+"""
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+from benchmarks.synthetic import make_flood_frame
+from processing.store import DistrictStore
+
+
+def legacy_districts(processed_data, next_id=1):
+    """Build districts_data the way update_districts_from_csv used to"""
+    districts_data = []
+    for idx, row in processed_data.iterrows():
+        severity_casualties = {
+            'Low': int(row['Affected_Population'] * 0.0001),
+            'Medium': int(row['Affected_Population'] * 0.0005),
+            'High': int(row['Affected_Population'] * 0.001),
+            'Critical': int(row['Affected_Population'] * 0.002)
+        }
+        districts_data.append({
+            'id': next_id,
+            'name': row['District'],
+            'province': row.get('Province', 'N/A'),
+            'population': int(row['Affected_Population']),
+            'houses': int(row['Displaced_Families']),
+            'casualties': severity_casualties.get(row['Severity_Level'], 0),
+            'date': datetime.now().strftime('%Y-%m-%d'),
+            'severity': row['Severity_Level'],
+            'families': int(row['Displaced_Families']),
+            'food_packs': int(row['Food_Packs']),
+            'tents': int(row['Tents']),
+            'medical_supplies': int(row['Medical_Supplies']),
+            'water_bottles': int(row['Water_Bottles']),
+            'blankets': int(row['Blankets'])
+        })
+        next_id += 1
+    return districts_data
+
+
+def measure(build):
+    """Bytes still allocated by whatever build() returns"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'dicts B/row':>12} {'store B/row':>12} {'ratio':>7}")
+    for rows in args.rows:
+        processed = app.calculate_resources(make_flood_frame(rows))
+        frame = app.districts_frame(processed, 1)
+
+        _, dict_bytes = measure(lambda: legacy_districts(processed))
+        _, store_bytes = measure(lambda: DistrictStore.from_frame(frame))
+
+        print(f"{rows:>10,} {dict_bytes / rows:>12.0f} {store_bytes / rows:>12.0f} "
+              f"{dict_bytes / store_bytes:>6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
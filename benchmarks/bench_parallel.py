@@ -0,0 +1,58 @@
+"""How process_csv_parallel scales with the number of worker processes
+
+Writes a synthetic flood CSV (2M rows by default) to a temporary folder and
+times the single-process stream_csv against the process pool.
+
+Run from the repository root:
+    python benchmarks/bench_parallel.py
+    python benchmarks/bench_parallel.py --rows 5000000 --workers 1 2 4 8
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import make_flood_frame
+from processing.processor import stream_csv, process_csv_parallel
+
+
+def default_workers():
+    cores = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= cores:
+        counts.append(counts[-1] * 2)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2000000)
+    parser.add_argument('--workers', type=int, nargs='+', default=default_workers())
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        file_path = os.path.join(folder, 'flood_data.csv')
+        make_flood_frame(args.rows).to_csv(file_path, index=False)
+        size_mb = os.path.getsize(file_path) / 1024 / 1024
+        print(f"{args.rows:,} rows, {size_mb:.0f} MB, {os.cpu_count()} cores\n")
+
+        start = time.perf_counter()
+        expected, _ = stream_csv(file_path)
+        baseline = time.perf_counter() - start
+        print(f"{'stream_csv':>12} {baseline:>8.2f}s")
+
+        for workers in args.workers:
+            start = time.perf_counter()
+            result, message = process_csv_parallel(file_path, workers=workers)
+            elapsed = time.perf_counter() - start
+
+            assert result is not None, message
+            assert result.equals(expected), 'parallel result differs from stream_csv'
+            print(f"{workers:>4} workers {elapsed:>8.2f}s {baseline / elapsed:>6.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Requests/sec for the HTML pages with the render cache off and on
+
+Requests go through Flask's test client, so this measures the app itself
+(routing, rendering, caching) without network or WSGI server overhead.
+
+Run from the repository root:
+    python benchmarks/bench_render.py --rows 1000 10000 --seconds 2
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The app persists uploads, keep that out of the repository
+DATA_FOLDER = tempfile.mkdtemp()
+os.environ['DATA_FOLDER'] = DATA_FOLDER
+
+import app as flood_app  # noqa: E402
+from benchmarks.synthetic import make_flood_frame  # noqa: E402
+
+PAGES = ['/', '/districts', '/districts?sort=relief&severity=Critical', '/upload']
+
+
+def requests_per_second(client, url, seconds):
+    """Requests/sec for repeated GETs of url, plus the last response body"""
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        response = client.get(url)
+        assert response.status_code == 200
+        count += 1
+    return count / (time.perf_counter() - start), response.data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--seconds', type=float, default=2.0)
+    args = parser.parse_args()
+
+    budget = flood_app.app.config['RENDER_CACHE_BYTES']
+    client = flood_app.app.test_client()
+
+    try:
+        print(f"{'rows':>8} {'page':<42} {'uncached':>10} {'cached':>10} {'speedup':>8}")
+        for rows in args.rows:
+            data = flood_app.calculate_resources(make_flood_frame(rows))
+            flood_app.set_active_store(flood_app.DistrictStore.from_frame(
+                flood_app.districts_frame(data, np.arange(1, rows + 1))
+            ))
+
+            for url in PAGES:
+                flood_app.app.config['RENDER_CACHE_BYTES'] = 0
+                before, fresh = requests_per_second(client, url, args.seconds)
+
+                flood_app.app.config['RENDER_CACHE_BYTES'] = budget
+                after, cached = requests_per_second(client, url, args.seconds)
+
+                # The cache must serve exactly what a fresh render produces
+                assert cached == fresh, url
+
+                print(f"{rows:>8,} {url:<42} {before:>9.1f}/s {after:>9.1f}/s {after / before:>7.1f}x")
+    finally:
+        shutil.rmtree(DATA_FOLDER, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
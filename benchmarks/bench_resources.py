@@ -0,0 +1,94 @@
+"""Compare the vectorized calculate_resources with the old per-row loop
+
+Run from the repository root:
+    python benchmarks/bench_resources.py
+    python benchmarks/bench_resources.py --rows 1000 100000 --legacy-limit 0
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import make_flood_frame
+from processing.processor import calculate_resources
+from processing.scenarios import RESOURCE_RATIOS
+
+
+def legacy_calculate_resources(data):
+    """The original row-by-row implementation, kept here as the reference"""
+    data['Affected_Population'] = pd.to_numeric(data['Affected_Population'], errors='coerce').fillna(0).astype(int)
+    data['Displaced_Families'] = pd.to_numeric(data['Displaced_Families'], errors='coerce').fillna(0).astype(int)
+
+    data['Food_Packs'] = 0
+    data['Tents'] = 0
+    data['Medical_Supplies'] = 0
+    data['Water_Bottles'] = 0
+    data['Blankets'] = 0
+
+    for i in range(len(data)):
+        population = data.loc[i, 'Affected_Population']
+        families = data.loc[i, 'Displaced_Families']
+        severity = data.loc[i, 'Severity_Level']
+
+        food = population * 3
+        tents = families * 1
+        medical = population * 0.15
+        water = population * 5
+        blankets = population * 1.5
+
+        severity_multipliers = {
+            'Low': 1.0,
+            'Medium': 1.5,
+            'High': 2.0,
+            'Critical': 2.5
+        }
+
+        multiplier = severity_multipliers.get(severity, 1.0)
+
+        data.loc[i, 'Food_Packs'] = int(food * multiplier)
+        data.loc[i, 'Tents'] = int(tents * multiplier)
+        data.loc[i, 'Medical_Supplies'] = int(medical * multiplier)
+        data.loc[i, 'Water_Bottles'] = int(water * multiplier)
+        data.loc[i, 'Blankets'] = int(blankets * multiplier)
+
+    return data
+
+
+def timed(func, data):
+    start = time.perf_counter()
+    result = func(data)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 100000, 1000000])
+    parser.add_argument('--legacy-limit', type=int, default=100000,
+                        help='skip the slow per-row loop above this many rows')
+    args = parser.parse_args()
+
+    columns = [column for column, _, _ in RESOURCE_RATIOS]
+
+    print(f"{'rows':>10} {'vectorized':>12} {'legacy':>12} {'speedup':>9}")
+    for rows in args.rows:
+        data = make_flood_frame(rows)
+        fast, fast_time = timed(calculate_resources, data.copy())
+
+        if rows > args.legacy_limit:
+            print(f"{rows:>10,} {fast_time:>11.4f}s {'skipped':>12} {'-':>9}")
+            continue
+
+        slow, slow_time = timed(legacy_calculate_resources, data.copy())
+
+        # Results must match the old loop exactly, value for value
+        pd.testing.assert_frame_equal(fast[columns], slow[columns])
+
+        print(f"{rows:>10,} {fast_time:>11.4f}s {slow_time:>11.4f}s {slow_time / fast_time:>8.0f}x")
+
+
+if __name__ == '__main__':
+    main()
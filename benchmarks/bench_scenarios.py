@@ -0,0 +1,79 @@
+"""Time for evaluating many resource scenarios: one pass per scenario vs one batched pass
+
+Run from the repository root:
+    python benchmarks/bench_scenarios.py --rows 100000 --scenarios 1 10 50
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import make_flood_frame
+from processing.processor import calculate_resources
+from processing.scenarios import DEFAULT_MODEL, SEVERITY_MULTIPLIERS, evaluate_scenarios, parse_model
+from processing.store import DistrictStore
+
+
+def random_models(count, seed=0):
+    """Scenarios with every ratio and multiplier scaled by a random factor"""
+    rng = np.random.default_rng(seed)
+    models = []
+    for i in range(count):
+        spec = {
+            'ratios': {name: round(float(ratio * rng.uniform(0.5, 1.5)), 3)
+                       for name, ratio in DEFAULT_MODEL.to_dict()['ratios'].items()},
+            'multipliers': {level: round(float(value * rng.uniform(0.8, 1.2)), 2)
+                            for level, value in SEVERITY_MULTIPLIERS.items()}
+        }
+        model, message = parse_model(spec, f'Scenario {i + 1}')
+        assert model is not None, message
+        models.append(model)
+    return models
+
+
+def one_by_one(data, models):
+    """Reference: recalculate the DataFrame once per scenario and sum the columns"""
+    columns = [column for column, _, _ in DEFAULT_MODEL.ratios]
+    return np.array([
+        calculate_resources(data.copy(), model)[columns].sum().to_numpy()
+        for model in models
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--scenarios', type=int, nargs='+', default=[1, 10, 50])
+    args = parser.parse_args()
+
+    data = calculate_resources(make_flood_frame(args.rows))
+    store = DistrictStore.from_frame(data.rename(columns={
+        'District': 'name', 'Affected_Population': 'population', 'Displaced_Families': 'families',
+        'Severity_Level': 'severity', 'Food_Packs': 'food_packs', 'Tents': 'tents',
+        'Medical_Supplies': 'medical_supplies', 'Water_Bottles': 'water_bottles', 'Blankets': 'blankets'
+    }).assign(id=np.arange(1, args.rows + 1), houses=0, casualties=0, province='N/A', date='N/A'))
+
+    print(f"{'scenarios':>10} {'one by one':>11} {'batched':>9} {'speedup':>8}")
+    for count in args.scenarios:
+        models = random_models(count)
+
+        start = time.perf_counter()
+        expected = one_by_one(data, models)
+        loop_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        totals = evaluate_scenarios(store, models)
+        batch_time = time.perf_counter() - start
+
+        # Batched totals must match calculating every scenario on its own
+        assert np.array_equal(totals, expected), count
+
+        print(f"{count:>10} {loop_time:>10.3f}s {batch_time:>8.3f}s {loop_time / batch_time:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
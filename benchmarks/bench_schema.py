@@ -0,0 +1,96 @@
+"""Parse time and memory of the declared CSV schema against inferred dtypes
+
+"inferred" is how uploads used to be read: pd.read_csv guesses every dtype,
+text stays as Python strings and the counts are int64. "schema" is
+stream_csv(calculate=False), which parses with CSV_DTYPES, checks severity on
+the category codes and narrows the counts to int32. "pyarrow" is the same
+with Arrow's reader and only runs when pyarrow is installed. Both results are
+checked to hold the same values.
+
+Run from the repository root:
+    python benchmarks/bench_schema.py
+    python benchmarks/bench_schema.py --rows 100000 1000000 --repeat 5
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import make_flood_frame
+from processing.processor import CHUNK_SIZE, HAS_PYARROW, VALID_SEVERITY_LEVELS, stream_csv
+
+
+def inferred_read(csv_path):
+    """The old reader: inferred dtypes, to_numeric on the counts and isin on the strings"""
+    chunks = []
+    for chunk in pd.read_csv(csv_path, chunksize=CHUNK_SIZE):
+        for column in ['Affected_Population', 'Displaced_Families']:
+            chunk[column] = pd.to_numeric(chunk[column], errors='coerce')
+        assert chunk['Severity_Level'].isin(VALID_SEVERITY_LEVELS).all()
+        chunks.append(chunk)
+    return pd.concat(chunks, ignore_index=True)
+
+
+def schema_read(engine):
+    def read(csv_path):
+        data, message = stream_csv(csv_path, calculate=False, engine=engine)
+        assert data is not None, message
+        return data
+    return read
+
+
+def measure(read, csv_path, repeat):
+    """(best seconds, peak traced MB, result MB, result) of read(csv_path)"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        read(csv_path)
+        times.append(time.perf_counter() - start)
+
+    # Separate run for memory, tracing slows the parser down
+    tracemalloc.start()
+    data = read(csv_path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return min(times), peak / 1e6, data.memory_usage(deep=True).sum() / 1e6, data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    readers = [('inferred', inferred_read), ('schema', schema_read('c'))]
+    if HAS_PYARROW:
+        readers.append(('pyarrow', schema_read('pyarrow')))
+
+    with tempfile.TemporaryDirectory() as folder:
+        print(f"{'rows':>10} {'reader':>9} {'parse':>9} {'peak MB':>9} {'frame MB':>9}")
+        for rows in args.rows:
+            csv_path = os.path.join(folder, f'flood_{rows}.csv')
+            make_flood_frame(rows).to_csv(csv_path, index=False)
+
+            expected = None
+            for name, read in readers:
+                seconds, peak, size, data = measure(read, csv_path, args.repeat)
+                print(f"{rows:>10,} {name:>9} {seconds:>8.3f}s {peak:>9.1f} {size:>9.1f}")
+
+                # Same values whatever the dtypes
+                values = data.astype({'Severity_Level': object, 'Province': object,
+                                      'Affected_Population': 'int64', 'Displaced_Families': 'int64'})
+                if expected is None:
+                    expected = values
+                else:
+                    pd.testing.assert_frame_equal(values, expected)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Write/read times for processed datasets: CSV vs the columnar formats
+
+Run from the repository root:
+    python benchmarks/bench_storage.py --rows 100000 1000000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import make_flood_frame
+from processing.processor import calculate_resources
+from processing.storage import HAS_PYARROW, save_columns, load_columns
+
+
+def disk_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def formats():
+    """(name, suffix, write, read) for every format to compare"""
+    yield 'csv', '.csv', lambda data, path: data.to_csv(path, index=False), pd.read_csv
+    yield 'npy columns', '.columns', save_columns, load_columns
+    if HAS_PYARROW:
+        yield 'parquet', '.parquet', lambda data, path: data.to_parquet(path, index=False), \
+            lambda path: pd.read_parquet(path, memory_map=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp()
+    try:
+        print(f"{'rows':>10} {'format':>12} {'write':>9} {'read':>9} {'size MB':>9}")
+        for rows in args.rows:
+            data = calculate_resources(make_flood_frame(rows))
+
+            for name, suffix, write, read in formats():
+                path = os.path.join(folder, f'processed_{rows}{suffix}')
+                _, write_time = timed(write, data, path)
+                loaded, read_time = timed(read, path)
+                assert len(loaded) == rows
+
+                print(f"{rows:>10,} {name:>12} {write_time:>8.3f}s {read_time:>8.3f}s "
+                      f"{disk_size(path) / 1024 / 1024:>9.1f}")
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Compare two benchmark result files written by benchmarks/run.py
+
+Exits with status 1 when any case got slower than the threshold, so it can
+gate a CI job. Cases that moved by less than --min-delta seconds are never
+counted, sub-millisecond timings are too noisy for that.
+
+Run from the repository root:
+    python benchmarks/compare.py baseline.json results.json --threshold 0.2
+"""
+import argparse
+import json
+import sys
+
+
+def load_results(path):
+    with open(path) as f:
+        data = json.load(f)
+    return {(result['name'], result['rows']): result['seconds'] for result in data['results']}
+
+
+def compare(baseline, current, threshold=0.2, min_delta=0.001):
+    """[(name, rows, old seconds, new seconds, ratio, regressed)] for cases in both runs"""
+    rows = []
+    for key in sorted(baseline.keys() & current.keys(), key=lambda key: (key[1], key[0])):
+        old, new = baseline[key], current[key]
+        ratio = new / old if old else float('inf')
+        rows.append((key[0], key[1], old, new, ratio, ratio > 1 + threshold and new - old > min_delta))
+    return rows
+
+
+def print_comparison(rows):
+    print(f"{'case':<36} {'rows':>10} {'before':>10} {'after':>10} {'change':>8}")
+    for name, count, old, new, ratio, regressed in rows:
+        flag = '  SLOWER' if regressed else ''
+        print(f"{name:<36} {count:>10,} {old:>9.4f}s {new:>9.4f}s {(ratio - 1) * 100:>+7.1f}%{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='fractional slowdown that counts as a regression (default 0.2)')
+    parser.add_argument('--min-delta', type=float, default=0.001,
+                        help='smallest slowdown in seconds that counts (default 0.001)')
+    args = parser.parse_args()
+
+    rows = compare(load_results(args.baseline), load_results(args.current), args.threshold, args.min_delta)
+    print_comparison(rows)
+
+    regressions = [row for row in rows if row[-1]]
+    if regressions:
+        print(f"\n{len(regressions)} case(s) slower by more than {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""Benchmark suite for the ingest pipeline and the HTTP routes
+
+Times validate_csv, process_csv, calculate_resources,
+update_districts_from_csv and a one-row merge_districts_from_csv on synthetic
+data, then the main routes through
+Flask's test client (cold = caches emptied first, warm = served from cache).
+Each case reports the median of --repeat runs. Results are written as JSON;
+pass --compare to check them against an earlier file.
+
+Run from the repository root:
+    python benchmarks/run.py --rows 10000 100000 --output results.json
+    python benchmarks/run.py --severity-mix Low=4,Medium=3,High=2,Critical=1 --no-province
+    python benchmarks/run.py --compare baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The app persists uploads, keep that out of the repository
+DATA_FOLDER = tempfile.mkdtemp()
+os.environ['DATA_FOLDER'] = DATA_FOLDER
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+import app as flood_app  # noqa: E402
+from processing.processor import calculate_resources, process_csv, validate_csv  # noqa: E402
+from benchmarks.compare import compare, load_results, print_comparison  # noqa: E402
+from benchmarks.synthetic import make_flood_frame, parse_severity_mix  # noqa: E402
+
+ROUTES = ['/', '/districts', '/api/districts', '/api/summary']
+
+
+def median_time(func, repeat, setup=None):
+    """Median wall time of func() over repeat runs, setup() runs untimed before each"""
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def clear_caches():
+    flood_app.api_cache.clear()
+    flood_app.page_cache.clear()
+
+
+def pipeline_cases(csv_path, frame):
+    """(name, func) for the ingest functions"""
+    processed, _ = process_csv(csv_path)
+    inputs = ['District', 'Province', 'Affected_Population', 'Displaced_Families', 'Severity_Level']
+    correction = processed.head(1)[[column for column in inputs if column in processed.columns]].copy()
+
+    def merge_one_row():
+        # A different population every time, so the row really changes
+        correction['Affected_Population'] += 1
+        flood_app.merge_districts_from_csv(correction.copy())
+
+    yield 'validate_csv', lambda: validate_csv(csv_path)
+    yield 'process_csv', lambda: process_csv(csv_path)
+    yield 'calculate_resources', lambda: calculate_resources(frame.copy())
+    yield 'update_districts_from_csv', lambda: flood_app.update_districts_from_csv(processed)
+    # Runs against the dataset the last update loaded
+    yield 'merge_districts_from_csv (1 row)', merge_one_row
+
+
+def run_suite(rows, repeat, severity_mix, province, folder):
+    client = flood_app.app.test_client()
+    results = []
+
+    def record(name, seconds):
+        results.append({'name': name, 'rows': rows, 'seconds': seconds})
+        print(f"{name:<36} {rows:>10,} {seconds:>9.4f}s")
+
+    frame = make_flood_frame(rows, severity_mix=severity_mix, province=province)
+    csv_path = os.path.join(folder, f'flood_{rows}.csv')
+    frame.to_csv(csv_path, index=False)
+
+    for name, func in pipeline_cases(csv_path, frame):
+        record(name, median_time(func, repeat))
+
+    # Routes run against the dataset the last update_districts_from_csv loaded
+    for url in ROUTES:
+        def get(url=url):
+            assert client.get(url).status_code == 200
+
+        record(f'GET {url} (cold)', median_time(get, repeat, setup=clear_caches))
+        get()
+        record(f'GET {url} (warm)', median_time(get, repeat))
+
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, cwd=os.path.dirname(__file__)).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--severity-mix', type=parse_severity_mix, default=None,
+                        help='e.g. Low=4,Medium=3,High=2,Critical=1 (uniform by default)')
+    parser.add_argument('--no-province', dest='province', action='store_false',
+                        help='leave out the optional Province column')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', metavar='BASELINE', help='earlier results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2)
+    parser.add_argument('--min-delta', type=float, default=0.001)
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp()
+    try:
+        print(f"{'case':<36} {'rows':>10} {'median':>10}")
+        results = []
+        for rows in args.rows:
+            results += run_suite(rows, args.repeat, args.severity_mix, args.province, folder)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+        shutil.rmtree(DATA_FOLDER, ignore_errors=True)
+
+    output = {
+        'meta': {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'repeat': args.repeat,
+            'severity_mix': args.severity_mix,
+            'province': args.province
+        },
+        'results': results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        print()
+        rows = compare(load_results(args.compare), load_results(args.output), args.threshold, args.min_delta)
+        print_comparison(rows)
+        if any(row[-1] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Synthetic flood data for the benchmarks"""
+import numpy as np
+import pandas as pd
+
+SEVERITY_LEVELS = ['Low', 'Medium', 'High', 'Critical']
+PROVINCES = ['Punjab', 'Sindh', 'Balochistan', 'Khyber Pakhtunkhwa', 'Gilgit-Baltistan']
+
+
+def parse_severity_mix(text):
+    """Read a mix like "Low=4,Medium=3,High=2,Critical=1" into probabilities per level"""
+    weights = dict.fromkeys(SEVERITY_LEVELS, 0.0)
+    for part in text.split(','):
+        level, _, weight = part.partition('=')
+        if level.strip() not in weights:
+            raise ValueError(f"Unknown severity level: {level.strip()}")
+        weights[level.strip()] = float(weight)
+
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError("Severity mix needs at least one positive weight")
+    return {level: weight / total for level, weight in weights.items()}
+
+
+def make_flood_frame(rows, seed=0, severity_mix=None, province=True, locations=False):
+    """Build a DataFrame shaped like an uploaded flood CSV
+
+    severity_mix maps severity levels to probabilities (uniform by default),
+    province=False leaves out the optional Province column and locations=True
+    adds Latitude/Longitude, clustered around towns within Pakistan's bounds.
+    """
+    rng = np.random.default_rng(seed)
+    population = rng.integers(1000, 500000, size=rows)
+
+    probabilities = None
+    if severity_mix:
+        probabilities = [severity_mix.get(level, 0.0) for level in SEVERITY_LEVELS]
+
+    data = pd.DataFrame({
+        'District': [f'District {i}' for i in range(rows)],
+        'Affected_Population': population,
+        'Severity_Level': rng.choice(SEVERITY_LEVELS, size=rows, p=probabilities),
+        'Displaced_Families': population // rng.integers(20, 40, size=rows),
+    })
+
+    if province:
+        data['Province'] = rng.choice(PROVINCES, size=rows)
+    if locations:
+        towns = rng.uniform([24.0, 61.0], [37.0, 77.0], size=(max(rows // 50, 1), 2))
+        points = towns[rng.integers(0, len(towns), size=rows)] + rng.normal(0, 0.2, size=(rows, 2))
+        data['Latitude'] = points[:, 0].round(5)
+        data['Longitude'] = points[:, 1].round(5)
+    return data
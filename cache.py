@@ -0,0 +1,95 @@
+"""Response cache for the JSON API and rendered pages, keyed by dataset version
+
+Bodies are built once per dataset version and kept together with a gzip copy
+and strong ETags (a hash of the body, plus a "-gz" suffix for the gzip copy, as
+the two variants differ byte for byte), so repeated requests cost a dict lookup.
+Entries are evicted least recently used first once they go over a byte budget.
+"""
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class CachedBody:
+    """One cached response body with its gzip variant and their ETags"""
+
+    __slots__ = ('body', 'gzip_body', 'etag', 'gzip_etag')
+
+    def __init__(self, body):
+        self.body = body
+        self.gzip_body = gzip.compress(body, compresslevel=6)
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.gzip_etag = f'{self.etag}-gz'
+
+    @property
+    def size(self):
+        return len(self.body) + len(self.gzip_body)
+
+
+class ResponseCache:
+    """Caches bodies for the newest dataset version, dropping them all when it changes
+
+    With max_bytes set, the least recently used bodies are evicted to stay under
+    it. A single body bigger than the budget is returned but not kept.
+    """
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._version = None
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, version, key, build):
+        """Return the CachedBody for key, calling build() for the bytes on a miss"""
+        with self._lock:
+            if self._version is None or version > self._version:
+                self._version = version
+                self._entries = OrderedDict()
+                self._bytes = 0
+
+            # A request still reading an older dataset gets its body built, but not cached
+            entry = self._entries.get(key) if version == self._version else None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        entry = CachedBody(build())
+
+        with self._lock:
+            if version == self._version and key not in self._entries:
+                self._add(key, entry)
+
+        return entry
+
+    def _add(self, key, entry):
+        if self.max_bytes is not None and entry.size > self.max_bytes:
+            return
+
+        self._entries[key] = entry
+        self._bytes += entry.size
+
+        while self.max_bytes is not None and self._bytes > self.max_bytes:
+            _, old = self._entries.popitem(last=False)
+            self._bytes -= old.size
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+    def clear(self):
+        with self._lock:
+            self._version = None
+            self._entries = OrderedDict()
+            self._bytes = 0
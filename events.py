@@ -0,0 +1,129 @@
+"""Dashboard updates pushed to browsers as server-sent events
+
+Every published dataset version gets a small dashboard view: the summary
+numbers, the severity breakdown and the rows of the top-district lists. An
+open /api/events stream waits for the next version and sends only what
+changed since the version the browser already shows: the summary, the list
+orders as ids, and the rows that are new or different. A browser that is too
+far behind, or that was served by another process, gets the whole view.
+
+Event ids are "<feed>.<version>". Versions count per process, so the random
+feed part tells a reconnecting browser's Last-Event-ID apart from another
+process's numbers.
+
+An open stream holds a server thread (or greenlet) while it waits, so streams
+are counted against a limit per process and end after a set lifetime, after
+which the browser reconnects from its last event id.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Versions whose views are kept to diff against
+KEEP_VIEWS = 16
+
+
+class DashboardFeed:
+    """Views of the latest dataset versions, and the deltas between them"""
+
+    def __init__(self, keep=KEEP_VIEWS):
+        self.keep = keep
+        self.feed_id = os.urandom(4).hex()
+        self.version = 0
+        self.listeners = 0
+        self._views = OrderedDict()
+        self._changed = threading.Condition()
+
+    def join(self, limit):
+        """Take one of limit stream slots, False when every one is taken"""
+        with self._changed:
+            if self.listeners >= limit:
+                return False
+            self.listeners += 1
+            return True
+
+    def leave(self):
+        """Give back a slot taken with join()"""
+        with self._changed:
+            self.listeners -= 1
+
+    def publish(self, version, view):
+        """Add the view of a new version and wake every waiting stream"""
+        with self._changed:
+            self._views[version] = view
+            while len(self._views) > self.keep:
+                self._views.popitem(last=False)
+            self.version = max(self.version, version)
+            self._changed.notify_all()
+
+    def event_id(self, version):
+        return f"{self.feed_id}.{version}"
+
+    def parse_event_id(self, text):
+        """Version of an event id from this feed, or None"""
+        feed_id, _, version = (text or '').partition('.')
+        if feed_id != self.feed_id or not version.isdigit():
+            return None
+        return int(version)
+
+    def wait(self, version, timeout):
+        """Block until a version newer than this one is published, returns the latest version"""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version > version, timeout)
+            return self.version
+
+    def delta(self, since, version):
+        """What changed from version since (None for nothing yet) to version"""
+        with self._changed:
+            old = self._views.get(since)
+            new = self._views[version]
+
+        if old is None:
+            return dict(new, version=self.event_id(version), full=True, rows=list(new['rows'].values()))
+
+        rows = [row for key, row in new['rows'].items() if old['rows'].get(key) != row]
+        return {
+            'version': self.event_id(version),
+            'full': False,
+            'summary': new['summary'],
+            'by_severity': new['by_severity'],
+            'order': new['order'],
+            'rows': rows
+        }
+
+    def poll(self, since):
+        """What changed after version since, or None when nothing did, without waiting"""
+        with self._changed:
+            version = self.version
+        if since is not None and since == version:
+            return None
+        return self.delta(since if since is not None and since < version else None, version)
+
+    def stream(self, since, heartbeat, idle=None, lifetime=None):
+        """Server-sent events from version since onwards, as text
+
+        A comment line is sent every heartbeat seconds without news, so proxies
+        keep the connection open and a closed browser is noticed. idle, if given,
+        is called at each heartbeat (e.g. to pick up uploads made by other processes).
+        The stream ends after lifetime seconds, if given.
+        """
+        with self._changed:
+            if since is not None and since > self.version:
+                since = None
+
+        deadline = None if lifetime is None else time.monotonic() + lifetime
+        yield f"retry: {int(heartbeat * 1000)}\n\n"
+        while deadline is None or time.monotonic() < deadline:
+            wait = heartbeat if deadline is None else min(heartbeat, max(deadline - time.monotonic(), 0))
+            version = self.wait(since or 0, wait)
+            if since is not None and version <= since:
+                if idle:
+                    idle()
+                yield ": keep-alive\n\n"
+                continue
+
+            data = json.dumps(self.delta(since, version), separators=(',', ':'))
+            yield f"id: {self.event_id(version)}\nevent: dataset\ndata: {data}\n\n"
+            since = version
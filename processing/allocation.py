@@ -0,0 +1,165 @@
+"""Split limited warehouse stock across districts
+
+Each resource is allocated on its own with weighted water-filling: every
+district receives weight * level, capped at its need, with the level chosen so
+the whole stock is handed out (or every need is met). With the severity
+weight alone this gives every district of a severity the same amount until
+small needs are covered ("water_filling"). Multiplying the weight by the need
+gives every district the same share of its need ("proportional").
+
+Finding the level takes one sort, so a resource costs O(n log n). Amounts are
+then rounded down and the leftover units go to the largest remainders, so a
+district never gets more than its need and the total never exceeds the stock.
+"""
+from datetime import datetime
+
+import numpy as np
+
+from processing.scenarios import DEFAULT_MODEL, SEVERITY_MULTIPLIERS
+
+STRATEGIES = ['water_filling', 'proportional']
+
+# Default priority of each severity level, unknown levels count as 1.0
+SEVERITY_WEIGHTS = dict(SEVERITY_MULTIPLIERS)
+
+
+def water_fill(need, weights, stock):
+    """Whole-unit allocation with sum <= stock and 0 <= allocation <= need
+
+    need and weights are arrays of the same length, weights > 0 for districts
+    that should receive anything. Returns an int64 array.
+    """
+    need = np.asarray(need, dtype=np.int64)
+    weights = np.asarray(weights, dtype=float)
+    stock = int(stock)
+
+    eligible = (need > 0) & (weights > 0)
+    if stock <= 0 or not eligible.any():
+        return np.zeros(len(need), dtype=np.int64)
+
+    if need[eligible].sum() <= stock:
+        return np.where(eligible, need, 0)
+
+    # Level at which each district is saturated, in increasing order
+    positions = np.flatnonzero(eligible)
+    levels = need[positions] / weights[positions]
+    order = np.argsort(levels, kind='stable')
+    levels = levels[order]
+    sorted_need = need[positions][order].astype(float)
+    sorted_weights = weights[positions][order]
+
+    # filled[j]: stock used when the level reaches levels[j]
+    saturated_need = np.cumsum(sorted_need) - sorted_need
+    open_weights = np.cumsum(sorted_weights[::-1])[::-1]
+    filled = saturated_need + levels * open_weights
+
+    # First district that can't be saturated, everything before it is
+    j = int(np.searchsorted(filled, stock, side='left'))
+    level = (stock - saturated_need[j]) / open_weights[j]
+
+    amounts = np.zeros(len(need), dtype=float)
+    amounts[positions] = np.minimum(need[positions], weights[positions] * level)
+
+    # Round down, then hand the leftover units to the largest remainders
+    allocation = np.minimum(np.floor(amounts).astype(np.int64), need)
+    leftover = stock - int(allocation.sum())
+    if leftover > 0:
+        remainders = np.where(allocation < need, amounts - allocation, -1.0)
+        leftover = min(leftover, int((remainders > 0).sum()))
+        if leftover:
+            top = np.argpartition(-remainders, leftover - 1)[:leftover]
+            allocation[top] += 1
+
+    return allocation
+
+
+def parse_request(payload):
+    """Read stock/strategy/weights from an allocation request, returns (options, message)"""
+    if not isinstance(payload, dict) or not isinstance(payload.get('stock'), dict):
+        return None, "Expected a JSON object with stock per resource"
+
+    resources = DEFAULT_MODEL.resources
+    stock = payload['stock']
+    unknown = [key for key in stock if key not in resources]
+    if unknown:
+        return None, f"Unknown resources: {', '.join(unknown)}"
+    if not stock:
+        return None, "Give stock for at least one resource"
+
+    for key, value in stock.items():
+        if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+            return None, f"Stock of {key} must be a whole number of at least 0"
+
+    strategy = payload.get('strategy', 'water_filling')
+    if strategy not in STRATEGIES:
+        return None, f"Unknown strategy, expected one of: {', '.join(STRATEGIES)}"
+
+    weights = payload.get('weights', {})
+    if not isinstance(weights, dict) or any(level not in SEVERITY_WEIGHTS for level in weights):
+        return None, f"Weights must map severity levels ({', '.join(SEVERITY_WEIGHTS)}) to numbers"
+    for level, value in weights.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 <= value <= 1000:
+            return None, f"Weight of {level} must be a number between 0 and 1000"
+
+    return {
+        'stock': {key: stock[key] for key in resources if key in stock},
+        'strategy': strategy,
+        'weights': dict(SEVERITY_WEIGHTS, **weights)
+    }, "Success"
+
+
+class AllocationPlan:
+    """Allocation of each stocked resource to every district of one store"""
+
+    def __init__(self, store, stock, strategy='water_filling', weights=SEVERITY_WEIGHTS):
+        self.store = store
+        self.stock = dict(stock)
+        self.strategy = strategy
+        self.weights = dict(weights)
+        self.created = datetime.now().isoformat(timespec='seconds')
+
+        codes, categories = store.codes('severity')
+        severity_weight = np.array([self.weights.get(level, 1.0) for level in categories], dtype=float)
+        district_weights = severity_weight[codes]
+
+        self.allocated = {}
+        for resource, amount in self.stock.items():
+            need = store.column(resource)
+            weights = district_weights * need if strategy == 'proportional' else district_weights
+            self.allocated[resource] = water_fill(need, weights, amount)
+
+    def summary(self):
+        resources = {}
+        for resource, allocation in self.allocated.items():
+            need = self.store.column(resource)
+            total_need = int(need.sum())
+            total = int(allocation.sum())
+            resources[resource] = {
+                'stock': self.stock[resource],
+                'need': total_need,
+                'allocated': total,
+                'coverage': round(total / total_need, 4) if total_need else 1.0,
+                'districts_fully_covered': int(((allocation == need) & (need > 0)).sum())
+            }
+
+        return {
+            'strategy': self.strategy,
+            'weights': self.weights,
+            'created': self.created,
+            'districts': len(self.store),
+            'resources': resources
+        }
+
+    def for_district(self, district_id):
+        """{resource: {'need', 'allocated'}} for one district, or None if it isn't in the plan"""
+        pos = self.store.position(district_id)
+        if pos < 0:
+            return None
+
+        return {
+            resource: {
+                'need': int(self.store.column(resource)[pos]),
+                'allocated': int(allocation[pos])
+            }
+            for resource, allocation in self.allocated.items()
+        }
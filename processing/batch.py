@@ -0,0 +1,158 @@
+"""Batch ingest of several files, Excel workbooks and zip bundles at once
+
+Every uploaded file is split into sources: a CSV is one source, every sheet
+of an .xlsx workbook is one, and every CSV or workbook sheet inside a .zip is
+one. Sources are read and checked in a process pool (Excel parsing is pure
+Python, so threads would not help) with the same stream_csv pipeline as a
+single CSV upload, then joined into one dataset in upload order. A source
+that fails is reported and left out; the others are still loaded.
+"""
+import io
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import openpyxl
+import pandas as pd
+
+from processing.processor import CSV_DTYPES, join_chunks, stream_csv
+
+# File types the batch upload accepts
+BATCH_EXTENSIONS = ('.csv', '.xlsx', '.zip')
+
+# Sources per upload, a zip with more members than this is rejected
+MAX_SOURCES = 500
+
+
+class Source:
+    """One table inside an uploaded file: a CSV, or a workbook sheet, maybe inside a zip"""
+
+    __slots__ = ('label', 'path', 'member', 'sheet')
+
+    def __init__(self, label, path, member=None, sheet=None):
+        self.label = label
+        self.path = path
+        self.member = member
+        self.sheet = sheet
+
+    def open(self):
+        """A path or file-like object of the CSV or workbook this source is in"""
+        if self.member is None:
+            return self.path
+        with zipfile.ZipFile(self.path) as bundle:
+            return io.BytesIO(bundle.read(self.member))
+
+    def read(self):
+        """The source as something stream_csv accepts"""
+        handle = self.open()
+        if self.sheet is None:
+            return handle
+        return pd.read_excel(handle, sheet_name=self.sheet, engine='openpyxl', dtype=CSV_DTYPES)
+
+
+def sheet_names(handle):
+    workbook = openpyxl.load_workbook(handle, read_only=True)
+    try:
+        return workbook.sheetnames
+    finally:
+        workbook.close()
+
+
+def list_sources(path, name):
+    """Sources of one uploaded file, raises for files that can't be opened"""
+    extension = os.path.splitext(name)[1].lower()
+
+    if extension == '.csv':
+        return [Source(name, path)]
+
+    if extension == '.xlsx':
+        return [Source(f'{name} [{sheet}]', path, sheet=sheet) for sheet in sheet_names(path)]
+
+    sources = []
+    with zipfile.ZipFile(path) as bundle:
+        for member in bundle.namelist():
+            # Skip folders and the metadata macOS adds to zips
+            base = os.path.basename(member)
+            if member.endswith('/') or member.startswith('__MACOSX/') or base.startswith('.'):
+                continue
+
+            member_extension = os.path.splitext(member)[1].lower()
+            if member_extension == '.csv':
+                sources.append(Source(f'{name}/{member}', path, member))
+            elif member_extension == '.xlsx':
+                handle = io.BytesIO(bundle.read(member))
+                sources.extend(Source(f'{name}/{member} [{sheet}]', path, member, sheet)
+                               for sheet in sheet_names(handle))
+
+    if not sources:
+        raise ValueError("no CSV or .xlsx files inside")
+    return sources
+
+
+def process_source(source, calculate=True):
+    """Read and check (and calculate) one source in a worker, returns (data, message)"""
+    try:
+        table = source.read()
+    except Exception as e:
+        return None, f"Could not read the file: {str(e)}"
+
+    return stream_csv(table, calculate=calculate)
+
+
+def process_batch(files, calculate=True, progress=None, workers=1):
+    """Validate (and calculate) every source of the uploaded files, joined into one DataFrame
+
+    files is a list of (path, name) pairs. Returns (data, reports) where data is
+    None when no source could be loaded, and reports has one entry per source
+    (or per file that could not be opened): {'source', 'rows', 'error'}.
+    progress, if given, is called with the number of rows done after each source.
+    """
+    # Sources, and the reports of files that could not be opened, in upload order
+    entries = []
+    for path, name in files:
+        try:
+            entries.extend(list_sources(path, name))
+        except Exception as e:
+            entries.append({'source': name, 'rows': 0, 'error': f"Could not open {name}: {str(e)}"})
+
+    sources = [entry for entry in entries if isinstance(entry, Source)]
+    if len(sources) > MAX_SOURCES:
+        return None, [{'source': 'upload', 'rows': 0,
+                       'error': f"Too many files and sheets ({len(sources)}), the limit is {MAX_SOURCES}"}]
+
+    workers = min(workers, len(sources))
+    if workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        results = pool.map(process_source, sources, repeat(calculate))
+    else:
+        pool = None
+        results = map(process_source, sources, repeat(calculate))
+
+    reports = []
+    frames = []
+    rows_done = 0
+    try:
+        # Results come back in upload order
+        for source in entries:
+            if not isinstance(source, Source):
+                reports.append(source)
+                continue
+
+            data, message = next(results)
+            if data is None:
+                reports.append({'source': source.label, 'rows': 0, 'error': message})
+                continue
+
+            reports.append({'source': source.label, 'rows': len(data), 'error': None})
+            frames.append(data)
+            rows_done += len(data)
+            if progress:
+                progress(rows_done)
+    finally:
+        if pool:
+            pool.shutdown()
+
+    if not frames:
+        return None, reports
+    return join_chunks(frames), reports
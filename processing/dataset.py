@@ -0,0 +1,45 @@
+"""Immutable, versioned snapshots of the loaded districts
+
+A Dataset bundles everything a request reads about the districts: the
+DistrictStore, its rollups and spatial index, the version the response caches are keyed on and
+the next free district id. It is never changed once published. Writers build
+the next Dataset off to the side (a merge works on DistrictStore.copy()) and
+publish it by rebinding one reference, which is atomic. Readers take the
+current Dataset without a lock and see one consistent version for as long as
+they hold it, however many uploads are published meanwhile (read-copy-update).
+
+A merge also says which row positions it changed, and the successor then
+updates the rollups and the grid index from those rows instead of building
+them over the whole store.
+"""
+import numpy as np
+
+from processing.geo import GridIndex
+from processing.rollups import Rollups
+
+
+class Dataset:
+    """One published version of the districts"""
+
+    __slots__ = ('store', 'rollups', 'geo', 'version', 'next_id')
+
+    def __init__(self, store, version=1, next_id=1, rollups=None, geo=None):
+        self.store = store
+        self.rollups = Rollups(store) if rollups is None else rollups
+        self.geo = GridIndex(store) if geo is None else geo
+        self.version = version
+        self.next_id = next_id
+
+    def successor(self, store, next_id=None, changed=None):
+        """The next version, holding a store that must not be changed after this
+
+        changed, when given, are the only row positions where store differs from
+        this version's store (a merge into its copy()).
+        """
+        next_id = self.next_id if next_id is None else next_id
+        if changed is None:
+            return Dataset(store, self.version + 1, next_id)
+
+        changed = np.unique(np.asarray(changed, dtype=np.int64))
+        return Dataset(store, self.version + 1, next_id,
+                       self.rollups.successor(store, changed), self.geo.successor(store, changed))
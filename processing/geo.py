@@ -0,0 +1,378 @@
+"""Grid index over district locations for nearest and region queries
+
+Districts with a latitude and longitude are bucketed into a regular grid over
+their bounding box, about CELL_TARGET districts per cell, and kept sorted by
+cell. A run of cells in one grid row is then one slice of that order, so a
+query reads the few slices around it instead of every district. Distances are
+great-circle kilometres. Longitudes are plain degrees, nothing wraps at 180.
+"""
+import copy
+import math
+
+import numpy as np
+
+from processing.store import RELIEF_PER_HOUSE, SEVERITY_LEVELS, TOTAL_FIELDS, District
+
+# Mean earth radius
+EARTH_RADIUS_KM = 6371.0088
+
+# Districts per grid cell the index aims for
+CELL_TARGET = 4
+
+# Largest k for nearest queries, and the most districts listed in one response
+MAX_NEAREST = 1000
+MAX_LISTED = 1000
+DEFAULT_LISTED = 100
+
+# Vertices per polygon, counting every ring
+MAX_POLYGON_POINTS = 10000
+
+
+def haversine_km(lat, lon, lats, lons):
+    """Great-circle distance from one point to arrays of points"""
+    lat1, lats2 = math.radians(lat), np.radians(lats)
+    half_dlat = (lats2 - lat1) / 2
+    half_dlon = np.radians(lons - lon) / 2
+    a = np.sin(half_dlat) ** 2 + math.cos(lat1) * np.cos(lats2) * np.sin(half_dlon) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1)))
+
+
+def spans(starts, stops):
+    """Concatenated aranges for several [start, stop) ranges"""
+    lengths = stops - starts
+    total = int(lengths.sum())
+    if not total:
+        return np.zeros(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return offsets + np.arange(total)
+
+
+class GridIndex:
+    """Spatial index of the districts of one store that have a location"""
+
+    def __init__(self, store):
+        self.store = store
+
+        lats, lons = store.column('latitude'), store.column('longitude')
+        positions = np.flatnonzero(np.isfinite(lats) & np.isfinite(lons))
+        self.size = len(positions)
+        # Districts the grid was sized for, see successor()
+        self._built_size = self.size
+
+        lats, lons = lats[positions], lons[positions]
+        if self.size:
+            self.south, self.north = float(lats.min()), float(lats.max())
+            self.west, self.east = float(lons.min()), float(lons.max())
+        else:
+            self.south = self.north = self.west = self.east = 0.0
+
+        # Roughly square cells, about CELL_TARGET districts each
+        cells = max(self.size // CELL_TARGET, 1)
+        height = max(self.north - self.south, 1e-9)
+        width = max(self.east - self.west, 1e-9)
+        side = math.sqrt(height * width / cells)
+        self.rows = max(min(int(height / side), cells), 1)
+        self.cols = max(min(int(width / side), cells), 1)
+        self.cell_height = height / self.rows
+        self.cell_width = width / self.cols
+
+        rows, cols = self._cells(lats, lons)
+        cell_ids = rows * self.cols + cols
+        order = np.argsort(cell_ids, kind='stable')
+
+        # Store positions, coordinates and the start of every cell, all in cell order
+        self._positions = positions[order]
+        self._lats = lats[order]
+        self._lons = lons[order]
+        self._starts = np.searchsorted(cell_ids[order], np.arange(self.rows * self.cols + 1))
+
+    def successor(self, store, changed):
+        """Index of store, which differs from this index's store only at the row positions changed
+
+        The changed districts are taken out of their old cells and put into their
+        new ones on the same grid, which costs a few array moves instead of a
+        sort. The grid is built again when a district moves outside its bounding
+        box or the number of located districts is off by half from the size it
+        was made for.
+        """
+        old = self.store
+        changed = np.asarray(changed, dtype=np.int64)
+
+        lats, lons = store.column('latitude')[changed], store.column('longitude')[changed]
+        located = np.isfinite(lats) & np.isfinite(lons)
+        added, lats, lons = changed[located], lats[located], lons[located]
+
+        updated = changed[changed < len(old)]
+        old_lats, old_lons = old.column('latitude')[updated], old.column('longitude')[updated]
+        was_located = np.isfinite(old_lats) & np.isfinite(old_lons)
+        updated = updated[was_located]
+
+        size = self.size - len(updated) + len(added)
+        if (not self.size or size > 2 * self._built_size or size < self._built_size / 2 or len(added) and (
+                lats.min() < self.south or lats.max() > self.north
+                or lons.min() < self.west or lons.max() > self.east)):
+            return GridIndex(store)
+
+        # Offsets of the old entries, searched for in the cells they were in
+        rows, cols = self._cells(old_lats[was_located], old_lons[was_located])
+        old_cells = rows * self.cols + cols
+        removed = np.array([
+            self._starts[cell] + np.flatnonzero(self._positions[self._starts[cell]:self._starts[cell + 1]] == pos)[0]
+            for cell, pos in zip(old_cells, updated)
+        ], dtype=np.int64)
+
+        cells = self.rows * self.cols
+        starts = self._starts - np.concatenate([[0], np.cumsum(np.bincount(old_cells, minlength=cells))])
+        positions = np.delete(self._positions, removed)
+        index_lats = np.delete(self._lats, removed)
+        index_lons = np.delete(self._lons, removed)
+
+        # New entries go at the end of their cells, in cell order since empty
+        # cells in between share one insertion point
+        rows, cols = self._cells(lats, lons)
+        new_cells = rows * self.cols + cols
+        order = np.argsort(new_cells, kind='stable')
+        added, lats, lons, new_cells = added[order], lats[order], lons[order], new_cells[order]
+        at = starts[new_cells + 1]
+
+        index = copy.copy(self)
+        index.store = store
+        index.size = size
+        index._positions = np.insert(positions, at, added)
+        index._lats = np.insert(index_lats, at, lats)
+        index._lons = np.insert(index_lons, at, lons)
+        index._starts = starts + np.concatenate([[0], np.cumsum(np.bincount(new_cells, minlength=cells))])
+        return index
+
+    def _cells(self, lats, lons):
+        rows = np.clip(((lats - self.south) / self.cell_height).astype(np.int64), 0, self.rows - 1)
+        cols = np.clip(((lons - self.west) / self.cell_width).astype(np.int64), 0, self.cols - 1)
+        return rows, cols
+
+    def _box(self, row_from, row_to, col_from, col_to):
+        """Offsets into the cell order of every district in a block of cells (inclusive)"""
+        first = np.arange(row_from, row_to + 1) * self.cols
+        return spans(self._starts[first + col_from], self._starts[first + col_to + 1])
+
+    def nearest(self, lat, lon, k):
+        """Store positions of the k districts closest to a point and their distances in km
+
+        Rings of cells around the point are read until the k-th closest district
+        found is nearer than anything outside the block read so far.
+        """
+        k = min(k, self.size)
+        if not k:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        rows, cols = self._cells(np.array([lat]), np.array([lon]))
+        row, col = int(rows[0]), int(cols[0])
+
+        radius = 1
+        while True:
+            row_from, row_to = max(row - radius, 0), min(row + radius, self.rows - 1)
+            col_from, col_to = max(col - radius, 0), min(col + radius, self.cols - 1)
+            everything = row_from == 0 and col_from == 0 and row_to == self.rows - 1 and col_to == self.cols - 1
+
+            found = self._box(row_from, row_to, col_from, col_to)
+            if len(found) >= k:
+                distances = haversine_km(lat, lon, self._lats[found], self._lons[found])
+                kth = np.partition(distances, k - 1)[k - 1]
+                if everything or kth <= self._outside_km(lat, lon, row_from, row_to, col_from, col_to):
+                    positions = self._positions[found]
+                    best = np.lexsort((positions, distances))[:k]
+                    return positions[best], distances[best]
+
+            radius *= 2
+
+    def _outside_km(self, lat, lon, row_from, row_to, col_from, col_to):
+        """Lower bound on the distance from a point inside a block of cells to any district outside it"""
+        bounds = [math.inf]
+        if row_from > 0:
+            bounds.append(math.radians(lat - (self.south + row_from * self.cell_height)) * EARTH_RADIUS_KM)
+        if row_to < self.rows - 1:
+            bounds.append(math.radians(self.south + (row_to + 1) * self.cell_height - lat) * EARTH_RADIUS_KM)
+
+        # Closest approach to a meridian dlon degrees away
+        cos_lat = math.cos(math.radians(lat))
+        for dlon, side in [(lon - (self.west + col_from * self.cell_width), col_from > 0),
+                           (self.west + (col_to + 1) * self.cell_width - lon, col_to < self.cols - 1)]:
+            if side:
+                dlon = math.radians(min(max(dlon, 0), 90))
+                bounds.append(math.asin(min(cos_lat * math.sin(dlon), 1)) * EARTH_RADIUS_KM)
+
+        return max(min(bounds), 0)
+
+    def bbox(self, south, west, north, east):
+        """Store positions of districts inside a box (edges included), in store order"""
+        if not self.size or south > self.north or north < self.south or west > self.east or east < self.west:
+            return np.zeros(0, dtype=np.int64)
+
+        rows, cols = self._cells(np.array([south, north]), np.array([west, east]))
+        found = self._box(rows[0], rows[1], cols[0], cols[1])
+
+        lats, lons = self._lats[found], self._lons[found]
+        inside = (lats >= south) & (lats <= north) & (lons >= west) & (lons <= east)
+        return np.sort(self._positions[found[inside]])
+
+    def polygon(self, rings):
+        """Store positions of districts inside a polygon, in store order
+
+        rings are (n, 2) arrays of (longitude, latitude) as in GeoJSON: the outer
+        boundary first, then any holes. A point is inside when a ray from it
+        crosses the rings an odd number of times.
+        """
+        outer = rings[0]
+        found = self._box_candidates(outer)
+        if not len(found):
+            return found
+
+        # Sorted by latitude, the districts an edge can cross are one slice
+        by_lat = np.argsort(self._lats[found], kind='stable')
+        found = found[by_lat]
+        lats, lons = self._lats[found], self._lons[found]
+        inside = np.zeros(len(found), dtype=bool)
+
+        for ring in rings:
+            x1, y1 = ring[:, 0], ring[:, 1]
+            x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+            low = np.searchsorted(lats, np.minimum(y1, y2))
+            high = np.searchsorted(lats, np.maximum(y1, y2))
+
+            for i in np.flatnonzero(high > low):
+                part = slice(low[i], high[i])
+                crossing = x1[i] + (lats[part] - y1[i]) * (x2[i] - x1[i]) / (y2[i] - y1[i])
+                inside[part] ^= lons[part] < crossing
+
+        return np.sort(self._positions[found[inside]])
+
+    def _box_candidates(self, ring):
+        """Offsets of districts inside the bounding box of a ring"""
+        west, south = ring.min(axis=0)
+        east, north = ring.max(axis=0)
+        if not self.size or south > self.north or north < self.south or west > self.east or east < self.west:
+            return np.zeros(0, dtype=np.int64)
+
+        rows, cols = self._cells(np.array([south, north]), np.array([west, east]))
+        return self._box(rows[0], rows[1], cols[0], cols[1])
+
+
+def summarize(store, positions, limit, distances=None):
+    """Count, resource totals and severity mix of the districts at positions, listing up to limit
+
+    Without distances the listed districts are the ones needing the most relief.
+    """
+    totals = {field: int(store.column(field)[positions].sum()) for field in TOTAL_FIELDS}
+    totals['relief'] = totals['houses'] * RELIEF_PER_HOUSE
+
+    codes, categories = store.codes('severity')
+    counts = np.bincount(codes[positions], minlength=len(categories))
+    by_severity = {level: int(counts[code]) for code, level in enumerate(SEVERITY_LEVELS) if counts[code]}
+
+    if distances is None:
+        listed = np.lexsort((store.column('id')[positions], -store.column('houses')[positions]))[:limit]
+    else:
+        listed = np.arange(min(limit, len(positions)))
+
+    districts = []
+    for i in listed:
+        record = District(store, int(positions[i])).to_dict()
+        if distances is not None:
+            record['distance_km'] = round(float(distances[i]), 3)
+        districts.append(record)
+
+    return {
+        'count': len(positions),
+        'totals': totals,
+        'by_severity': by_severity,
+        'districts': districts,
+        'truncated': len(positions) > len(districts)
+    }
+
+
+# ---------------- REQUEST PARSING ----------------
+
+def parse_number(args, name, limit):
+    """A float query parameter between -limit and limit, or None"""
+    try:
+        value = float(args.get(name, ''))
+    except ValueError:
+        return None
+    if not -limit <= value <= limit:
+        return None
+    return value
+
+
+def parse_limit(value, default, largest):
+    try:
+        limit = int(value if value is not None else default)
+    except (TypeError, ValueError):
+        return None
+    if not 1 <= limit <= largest:
+        return None
+    return limit
+
+
+def parse_nearest(args):
+    """Read lat/lon/k of a nearest query, returns (query, message)"""
+    lat, lon = parse_number(args, 'lat', 90), parse_number(args, 'lon', 180)
+    if lat is None or lon is None:
+        return None, "Give lat between -90 and 90 and lon between -180 and 180"
+
+    k = parse_limit(args.get('k'), 10, MAX_NEAREST)
+    if k is None:
+        return None, f"k must be between 1 and {MAX_NEAREST}"
+
+    return {'lat': lat, 'lon': lon, 'k': k}, "Success"
+
+
+def parse_bbox(args):
+    """Read south/west/north/east/limit of a box query, returns (query, message)"""
+    south, north = parse_number(args, 'south', 90), parse_number(args, 'north', 90)
+    west, east = parse_number(args, 'west', 180), parse_number(args, 'east', 180)
+    if None in (south, north, west, east):
+        return None, "Give south and north between -90 and 90, west and east between -180 and 180"
+    if south > north or west > east:
+        return None, "south must not be above north, nor west east of east"
+
+    limit = parse_limit(args.get('limit'), DEFAULT_LISTED, MAX_LISTED)
+    if limit is None:
+        return None, f"limit must be between 1 and {MAX_LISTED}"
+
+    return {'south': south, 'west': west, 'north': north, 'east': east, 'limit': limit}, "Success"
+
+
+def parse_polygon(payload):
+    """Read a GeoJSON Polygon and limit from a request body, returns (query, message)
+
+    Expects {"polygon": {"type": "Polygon", "coordinates": [[[lon, lat], ...], ...]}, "limit": 100}.
+    """
+    if not isinstance(payload, dict) or not isinstance(payload.get('polygon'), dict):
+        return None, "Expected a JSON object with a GeoJSON polygon"
+
+    polygon = payload['polygon']
+    coordinates = polygon.get('coordinates')
+    if polygon.get('type') != 'Polygon' or not isinstance(coordinates, list) or not coordinates:
+        return None, "polygon must be a GeoJSON Polygon with at least one ring"
+
+    rings = []
+    points = 0
+    for ring in coordinates:
+        try:
+            ring = np.array(ring, dtype=float)
+        except (TypeError, ValueError):
+            return None, "Every ring must be a list of [longitude, latitude] pairs"
+        if ring.ndim != 2 or ring.shape[1] != 2 or len(ring) < 3:
+            return None, "Every ring must be a list of at least 3 [longitude, latitude] pairs"
+        if not np.isfinite(ring).all() or (np.abs(ring) > [180, 90]).any():
+            return None, "Ring coordinates must be longitudes between -180 and 180 and latitudes between -90 and 90"
+        points += len(ring)
+        rings.append(ring)
+
+    if points > MAX_POLYGON_POINTS:
+        return None, f"Polygon has {points} points, the limit is {MAX_POLYGON_POINTS}"
+
+    limit = parse_limit(payload.get('limit'), DEFAULT_LISTED, MAX_LISTED)
+    if limit is None:
+        return None, f"limit must be between 1 and {MAX_LISTED}"
+
+    return {'rings': rings, 'limit': limit}, "Success"
@@ -0,0 +1,451 @@
+"""Append-only history of every uploaded dataset, for trend and diff queries
+
+Every upload adds a version. A version only stores what changed since the one
+before it: per field, the sorted keys of the districts whose value changed and
+their new values, plus the keys of the districts that are gone. Every
+CHECKPOINT_EVERY versions all values are stored instead, so reading a value
+never walks back more than that many versions. Districts are matched across
+uploads by name and province, since a replace upload gives them new ids (when
+a dataset holds the same name and province twice, the last row wins).
+
+Layout of the history folder:
+    versions.log        one JSON line per version, written last
+    <version>/          <field>_keys.npy, <field>_values.npy, removed.npy
+                        and keys.json with the districts seen for the first time
+
+A value at a version is one binary search per version walked, so a trend over
+the last few uploads takes microseconds.
+"""
+import json
+import os
+import threading
+from bisect import bisect_left
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from processing.store import SEVERITY_LEVELS, TOTAL_FIELDS
+
+# Fields kept for every version, severity as its fixed store code
+TRACKED_FIELDS = TOTAL_FIELDS + ['severity']
+
+# Every this many versions all values are stored, not just the changed ones
+CHECKPOINT_EVERY = 10
+
+# Districts listed per group in a diff
+DIFF_LIMIT = 100
+
+# Joins name and province into one string key for vectorized lookups
+KEY_SEPARATOR = '\x1f'
+
+# New keys kept in a dict before they are added to the key index (or an eighth of the index)
+RECENT_KEYS = 4096
+
+EMPTY = np.zeros(0, dtype=np.int32)
+
+
+def narrow(values):
+    """int32 copy of an int64 array when every value fits"""
+    info = np.iinfo(np.int32)
+    if not len(values) or (info.min <= values.min() and values.max() <= info.max):
+        return values.astype(np.int32)
+    return values
+
+
+def find(keys, key):
+    """Index of key in a sorted key array, or -1"""
+    # A key of the array's own type, a Python int would make numpy cast the whole array
+    i = int(keys.searchsorted(keys.dtype.type(key)))
+    return i if i < len(keys) and keys[i] == key else -1
+
+
+def decode(field, value):
+    if value is None:
+        return None
+    return SEVERITY_LEVELS[value] if field == 'severity' else int(value)
+
+
+class Version:
+    """One upload: its log entry and the changes it made"""
+
+    __slots__ = ('number', 'time', 'kind', 'source', 'districts', 'checkpoint', 'changes', 'removed', 'counts')
+
+    def __init__(self, entry, changes, removed):
+        self.number = entry['version']
+        self.time = entry['time']
+        self.kind = entry['kind']
+        self.source = entry['source']
+        self.districts = entry['districts']
+        self.checkpoint = entry['checkpoint']
+        self.counts = entry['changed']
+        self.changes = changes  # field -> (sorted keys, values)
+        self.removed = removed
+
+    def lookup(self, field, key):
+        """(found, value) for one district in this version's changes"""
+        keys, values = self.changes.get(field, (EMPTY, EMPTY))
+        i = find(keys, key)
+        if i >= 0:
+            return True, int(values[i])
+        if self.checkpoint or find(self.removed, key) >= 0:
+            return True, None
+        return False, None
+
+    def to_dict(self):
+        return {
+            'version': self.number,
+            'time': self.time,
+            'kind': self.kind,
+            'source': self.source,
+            'districts': self.districts,
+            'checkpoint': self.checkpoint,
+            'changed': self.counts
+        }
+
+
+class DatasetHistory:
+    """Versions of the district data, shared by all worker processes through the folder"""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.log_path = os.path.join(folder, 'versions.log')
+        os.makedirs(folder, exist_ok=True)
+
+        self.versions = []
+        self._times = []
+        self._lock = threading.RLock()
+        self._log_offset = 0
+
+        # Key k is the district (names[k], provinces[k]), keys before _written_keys are on disk
+        self._names = []
+        self._provinces = []
+        self._by_name = {}  # name -> its last key
+        self._shared_names = {}  # name -> every key, for names with more than one
+        self._key_index = pd.Index([], dtype=object)
+        self._recent_keys = {}  # string key -> key, for keys not in _key_index yet
+        self._written_keys = 0
+
+        # Values and presence of every key at the latest version (longer than the keys)
+        self._present = np.zeros(0, dtype=bool)
+        self._state = {field: np.zeros(0, dtype=np.int64) for field in TRACKED_FIELDS}
+
+    def __len__(self):
+        return len(self.versions)
+
+    # ---------------- READING ----------------
+
+    def refresh(self):
+        """Load versions written since the last call, by this or another process"""
+        with self._lock:
+            try:
+                size = os.path.getsize(self.log_path)
+            except FileNotFoundError:
+                return
+            if size <= self._log_offset:
+                return
+
+            with open(self.log_path, 'rb') as f:
+                f.seek(self._log_offset)
+                data = f.read(size - self._log_offset)
+
+            # A line without its newline is still being written
+            complete = data[:data.rfind(b'\n') + 1]
+            for line in complete.decode().splitlines():
+                self._load_version(json.loads(line))
+            self._log_offset += len(complete)
+
+    def _load_version(self, entry):
+        folder = os.path.join(self.folder, str(entry['version']))
+
+        with open(os.path.join(folder, 'keys.json')) as f:
+            self._add_keys(**json.load(f))
+        self._written_keys = len(self._names)
+
+        def array(name):
+            return np.load(os.path.join(folder, f'{name}.npy'), mmap_mode='r')
+
+        changes = {field: (array(f'{field}_keys'), array(f'{field}_values')) for field in entry['fields']}
+        self._append(Version(entry, changes, array('removed')))
+
+    def _add_keys(self, names, provinces, strings=None):
+        if strings is None:
+            strings = [f'{name}{KEY_SEPARATOR}{province}' for name, province in zip(names, provinces)]
+        start = len(self._names)
+
+        # Names this batch repeats, from earlier keys or within itself, with the keys they had
+        earlier = {name: self._shared_names.get(name) or [self._by_name[name]]
+                   for name in names if name in self._by_name}
+        repeated = len(set(names)) < len(names)
+
+        self._by_name.update(zip(names, range(start, start + len(names))))
+        self._names.extend(names)
+        self._provinces.extend(provinces)
+
+        if earlier or repeated:
+            batch = pd.Series(names, index=range(start, start + len(names)), dtype=object)
+            shared = batch[batch.duplicated(keep=False) | batch.isin(list(earlier))]
+            for name, keys in shared.groupby(shared).groups.items():
+                self._shared_names[name] = earlier.get(name, []) + list(keys)
+
+        # New keys are looked up in a dict until there are enough to be worth
+        # rebuilding the index with, so adding a few keys stays cheap
+        if len(self._recent_keys) + len(names) > max(RECENT_KEYS, len(self._key_index) // 8):
+            recent = list(self._recent_keys) + list(strings)
+            self._key_index = self._key_index.append(pd.Index(recent, dtype=object))
+            self._recent_keys = {}
+        else:
+            self._recent_keys.update(zip(strings, range(start, start + len(names))))
+
+        # Spare room, so a merge adding a few districts does not copy every array
+        grow = len(self._names) - len(self._present)
+        if grow > 0:
+            grow = max(grow, len(self._present))
+            self._present = np.concatenate([self._present, np.zeros(grow, dtype=bool)])
+            for field in TRACKED_FIELDS:
+                self._state[field] = np.concatenate([self._state[field], np.zeros(grow, dtype=np.int64)])
+
+    def _append(self, version):
+        apply_version(version, self._present, self._state)
+        self.versions.append(version)
+        self._times.append(version.time)
+
+    def keys(self, name, province=None):
+        """Keys of the districts with this name (and province when given)"""
+        self.refresh()
+        keys = self._shared_names.get(name) or ([self._by_name[name]] if name in self._by_name else [])
+        return [key for key in keys if province is None or self._provinces[key] == province]
+
+    def district(self, key):
+        return {'name': self._names[key], 'province': self._provinces[key]}
+
+    def start_index(self, last=None, since=None):
+        """Index of the first version in a range given by a count and/or a start time"""
+        start = 0
+        if since is not None:
+            start = bisect_left(self._times, since)
+        if last is not None:
+            start = max(start, len(self.versions) - last)
+        return start
+
+    def value_at(self, index, key, field):
+        """Value of a field for one district at self.versions[index], None when absent"""
+        for i in range(index, -1, -1):
+            found, value = self.versions[i].lookup(field, key)
+            if found:
+                return value
+        return None
+
+    def timeline(self, key, fields, last=None, since=None):
+        """[{'version', 'time', field: value, ...}] from the start of the range to the latest version"""
+        self.refresh()
+        start = self.start_index(last, since)
+        if start >= len(self.versions):
+            return []
+
+        values = {field: self.value_at(start, key, field) for field in fields}
+        points = []
+        for i in range(start, len(self.versions)):
+            version = self.versions[i]
+            if i > start:
+                for field in fields:
+                    found, value = version.lookup(field, key)
+                    if found:
+                        values[field] = value
+
+            point = {'version': version.number, 'time': version.time}
+            point.update((field, decode(field, value)) for field, value in values.items())
+            points.append(point)
+
+        return points
+
+    def state_at(self, number):
+        """(present, {field: values}) of every key at a version number, from its checkpoint on"""
+        index = number - 1
+        present = np.zeros(len(self._names), dtype=bool)
+        state = {field: np.zeros(len(self._names), dtype=np.int64) for field in TRACKED_FIELDS}
+
+        for i in range(index - index % CHECKPOINT_EVERY, index + 1):
+            apply_version(self.versions[i], present, state)
+        return present, state
+
+    def diff(self, first, second, limit=DIFF_LIMIT):
+        """Districts added, removed and changed between two version numbers"""
+        self.refresh()
+        old_present, old = self.state_at(first)
+        new_present, new = self.state_at(second)
+
+        both = old_present & new_present
+        changed_fields = {field: both & (old[field] != new[field]) for field in TRACKED_FIELDS}
+        changed = np.zeros(len(both), dtype=bool)
+        for mask in changed_fields.values():
+            changed |= mask
+
+        added = np.flatnonzero(new_present & ~old_present)
+        removed = np.flatnonzero(old_present & ~new_present)
+        changed = np.flatnonzero(changed)
+
+        def changes(key):
+            return {
+                field: {'from': decode(field, old[field][key]), 'to': decode(field, new[field][key])}
+                for field, mask in changed_fields.items() if mask[key]
+            }
+
+        return {
+            'from': self.versions[first - 1].to_dict(),
+            'to': self.versions[second - 1].to_dict(),
+            'counts': {'added': len(added), 'removed': len(removed), 'changed': len(changed)},
+            'added': [self.district(key) for key in added[:limit]],
+            'removed': [self.district(key) for key in removed[:limit]],
+            'changed': [dict(self.district(key), changes=changes(key)) for key in changed[:limit]]
+        }
+
+    # ---------------- WRITING ----------------
+
+    def record(self, store, kind='replace', source=None, changed=None):
+        """Add the store's districts as a new version, call with the dataset lock held
+
+        changed, for a merge, are the only row positions it wrote. Those rows are
+        then compared with the latest version instead of the whole store, unless
+        this version is a checkpoint, which stores every value.
+        """
+        with self._lock:
+            self.refresh()
+
+            number = len(self.versions) + 1
+            checkpoint = (number - 1) % CHECKPOINT_EVERY == 0
+
+            found = None
+            if changed is not None and not checkpoint:
+                found = self._changed_rows(store, np.asarray(changed, dtype=np.int64))
+            changes, removed, counts = found or self._all_rows(store, checkpoint)
+
+            entry = {
+                'version': number,
+                'time': datetime.now().isoformat(timespec='seconds'),
+                'kind': kind,
+                'source': source,
+                'districts': len(store),
+                'checkpoint': checkpoint,
+                'fields': list(changes),
+                'changed': counts
+            }
+            self._log_offset += self._write(entry, changes, removed)
+            self._written_keys = len(self._names)
+            self._append(Version(entry, changes, removed))
+
+            return self.versions[-1]
+
+    def _all_rows(self, store, checkpoint):
+        """(changes, removed, counts) of a version, comparing every district of the store"""
+        names = pd.Series(store.names(), dtype=object)
+        codes, categories = store.codes('province')
+        provinces = pd.Series(np.array(categories, dtype=object)[codes], dtype=object)
+        keys = self._lookup(names, provinces)
+
+        present = np.zeros(len(self._names), dtype=bool)
+        present[keys] = True
+        was_present = self._present[:len(self._names)]
+        is_new = present & ~was_present
+
+        changes = {}
+        counts = {'added': int(is_new.sum()), 'removed': 0}
+        removed = EMPTY
+        if not checkpoint:
+            removed = np.flatnonzero(was_present & ~present).astype(np.int32)
+            counts['removed'] = len(removed)
+
+        for field in TRACKED_FIELDS:
+            values = np.zeros(len(self._names), dtype=np.int64)
+            values[keys] = store.column(field) if field != 'severity' else store.codes(field)[0]
+
+            if checkpoint:
+                changed = np.flatnonzero(present)
+            else:
+                changed = np.flatnonzero(present & (is_new | (values != self._state[field][:len(values)])))
+                counts[field] = int(len(changed) - counts['added'])
+            if len(changed):
+                changes[field] = (changed.astype(np.int32), narrow(values[changed]))
+
+        return changes, removed, counts
+
+    def _changed_rows(self, store, rows):
+        """(changes, removed, counts) of a merge that only wrote these rows, or None
+
+        The other districts are as the latest version has them. When that version
+        does not hold the store the merge started from (its district count is off),
+        None says to compare every row instead.
+        """
+        names = pd.Series(store.take('name', rows), dtype=object)
+        provinces = pd.Series(store.take('province', rows), dtype=object)
+        keys = self._lookup(names, provinces)
+
+        is_new = ~self._present[keys]
+        if not self.versions or self.versions[-1].districts + int(is_new.sum()) != len(store):
+            return None
+
+        order = np.argsort(keys, kind='stable')
+        keys, rows, is_new = keys[order], rows[order], is_new[order]
+
+        changes = {}
+        counts = {'added': int(is_new.sum()), 'removed': 0}
+        for field in TRACKED_FIELDS:
+            values = store.column(field)[rows] if field != 'severity' else store.codes(field)[0][rows]
+            changed = is_new | (values != self._state[field][keys])
+            counts[field] = int(changed.sum() - counts['added'])
+            if changed.any():
+                changes[field] = (keys[changed].astype(np.int32), narrow(values[changed].astype(np.int64)))
+
+        return changes, EMPTY, counts
+
+    def _lookup(self, names, provinces):
+        """Key of every row, adding keys for districts seen for the first time"""
+        strings = names.astype(str) + KEY_SEPARATOR + provinces.astype(str)
+        keys = self._find_keys(strings)
+
+        new = keys < 0
+        if new.any():
+            new &= ~strings.duplicated().to_numpy()
+            self._add_keys(names[new].astype(str).tolist(), provinces[new].astype(str).tolist(),
+                           strings[new].tolist())
+            keys = self._find_keys(strings)
+
+        return keys
+
+    def _find_keys(self, strings):
+        keys = self._key_index.get_indexer(strings)
+        if self._recent_keys:
+            missing = keys < 0
+            keys[missing] = strings[missing].map(self._recent_keys).fillna(-1).to_numpy(dtype=np.int64)
+        return keys
+
+    def _write(self, entry, changes, removed):
+        """Save one version, returns the bytes added to versions.log"""
+        folder = os.path.join(self.folder, str(entry['version']))
+        os.makedirs(folder, exist_ok=True)
+
+        for field, (keys, values) in changes.items():
+            np.save(os.path.join(folder, f'{field}_keys.npy'), keys)
+            np.save(os.path.join(folder, f'{field}_values.npy'), values)
+        np.save(os.path.join(folder, 'removed.npy'), removed)
+
+        with open(os.path.join(folder, 'keys.json'), 'w') as f:
+            new_keys = slice(self._written_keys, None)
+            f.write(json.dumps({'names': self._names[new_keys], 'provinces': self._provinces[new_keys]}))
+
+        # The log line goes last, a version folder without one is an unfinished write
+        line = json.dumps(entry) + '\n'
+        with open(self.log_path, 'a') as f:
+            f.write(line)
+        return len(line.encode())
+
+
+def apply_version(version, present, state):
+    """Bring present/state (arrays over every key) from the previous version to this one"""
+    if version.checkpoint:
+        present[:] = False
+    present[version.removed] = False
+
+    for field, (keys, values) in version.changes.items():
+        state[field][keys] = values
+        present[keys] = True
@@ -0,0 +1,108 @@
+"""Background job queue used to process uploads outside the request thread"""
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Finished jobs kept around for status lookups
+MAX_FINISHED_JOBS = 100
+
+
+class Job:
+    """Status of one background job, updated by the worker as it goes"""
+
+    def __init__(self, name):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.status = 'queued'
+        self.phase = 'queued'
+        self.rows_processed = 0
+        self.message = ''
+        self.result = None
+        self.created = datetime.now().isoformat(timespec='seconds')
+        self.finished = None
+        self._done = threading.Event()
+
+    def update(self, phase=None, rows_processed=None):
+        """Report progress from inside the job"""
+        if phase is not None:
+            self.phase = phase
+        if rows_processed is not None:
+            self.rows_processed = rows_processed
+
+    def wait(self, timeout=None):
+        """Block until the job has finished, returns False on timeout"""
+        return self._done.wait(timeout)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'status': self.status,
+            'phase': self.phase,
+            'rows_processed': self.rows_processed,
+            'message': self.message,
+            'result': self.result,
+            'created': self.created,
+            'finished': self.finished
+        }
+
+
+class JobQueue:
+    """Runs jobs on a thread pool and keeps their status by id"""
+
+    def __init__(self, max_workers=1):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='upload-job')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, name, func, *args):
+        """Queue func(job, *args); it should return (result, message) or (None, error)"""
+        job = Job(name)
+
+        with self._lock:
+            self._jobs[job.id] = job
+            self._forget_old_jobs()
+
+        self._executor.submit(self._run, job, func, args)
+        return job
+
+    def run(self, name, func, *args):
+        """Run func(job, *args) in the calling thread, visible by id while it runs"""
+        job = Job(name)
+
+        with self._lock:
+            self._jobs[job.id] = job
+            self._forget_old_jobs()
+
+        self._run(job, func, args)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job, func, args):
+        job.status = 'running'
+        try:
+            result, message = func(job, *args)
+            job.result = result
+            job.message = message
+            job.status = 'failed' if result is None else 'done'
+        except Exception as e:
+            logger.exception(f"Job {job.id} ({job.name}) failed")
+            job.message = f"Unexpected error: {str(e)}"
+            job.status = 'failed'
+
+        job.phase = job.status
+        job.finished = datetime.now().isoformat(timespec='seconds')
+        job._done.set()
+
+    def _forget_old_jobs(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
@@ -0,0 +1,177 @@
+"""Persist the active dataset so every worker process starts warm
+
+Layout of the data folder:
+    LATEST                      name of the current snapshot
+    uploads.log                 one JSON line per upload, for auditing
+    snapshots/<name>/           DistrictStore.save() output
+    snapshots/<name>/merges.log merge uploads applied on top of that snapshot
+
+A replace upload writes a new snapshot. A merge upload only appends the
+changed records to the snapshot's merges.log, and after SNAPSHOT_EVERY merges
+a fresh snapshot is written so the log never gets long. Loading memory-maps
+the snapshot and replays its short merge log, so startup time does not grow
+with the size of the dataset.
+"""
+import json
+import os
+import shutil
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+from processing.store import DistrictStore
+
+try:
+    import fcntl
+except ImportError:  # Windows: single process only
+    fcntl = None
+
+# Merge uploads on top of one snapshot before a new snapshot is written
+SNAPSHOT_EVERY = 20
+
+# Older snapshots are deleted once there are more than this many
+KEEP_SNAPSHOTS = 3
+
+
+class DatasetLog:
+    """Snapshots plus an append log of uploads, shared by all worker processes"""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.snapshots_folder = os.path.join(folder, 'snapshots')
+        self.latest_path = os.path.join(folder, 'LATEST')
+        self.uploads_path = os.path.join(folder, 'uploads.log')
+        os.makedirs(self.snapshots_folder, exist_ok=True)
+
+        # What this process has loaded: (snapshot name, merges.log size)
+        self._loaded = (None, 0)
+
+    @contextmanager
+    def lock(self):
+        """Exclusive lock across processes while an upload is applied and saved"""
+        with open(os.path.join(self.folder, 'lock'), 'w') as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    # ---------------- READING ----------------
+
+    def _latest(self):
+        """(snapshot name, merges.log size) on disk right now"""
+        try:
+            with open(self.latest_path) as f:
+                name = f.read().strip()
+        except FileNotFoundError:
+            return None, 0
+
+        try:
+            size = os.path.getsize(self._merges_path(name))
+        except FileNotFoundError:
+            size = 0
+        return name, size
+
+    def _merges_path(self, name):
+        return os.path.join(self.snapshots_folder, name, 'merges.log')
+
+    def changed(self):
+        """True when another upload was saved since this process last loaded"""
+        return self._latest() != self._loaded
+
+    def last_upload(self):
+        """The newest uploads.log entry, or None when nothing was saved yet"""
+        if self._latest()[0] is None:
+            return None
+        try:
+            with open(self.uploads_path, 'rb') as f:
+                # Entries are short, the last one is in the file's tail
+                f.seek(max(os.path.getsize(self.uploads_path) - 4096, 0))
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return None
+        return json.loads(lines[-1]) if lines else None
+
+    def load(self):
+        """Load the latest snapshot and its merges, returns (store, next_id) or None"""
+        name, size = self._latest()
+        if name is None:
+            return None
+
+        store = DistrictStore.load(os.path.join(self.snapshots_folder, name))
+        with open(os.path.join(self.snapshots_folder, name, 'next_id')) as f:
+            next_id = int(f.read())
+
+        if size:
+            with open(self._merges_path(name), 'rb') as f:
+                for line in f.read(size).decode().splitlines():
+                    entry = json.loads(line)
+                    for record in entry['records']:
+                        store.insert(record)
+                    next_id = entry['next_id']
+
+        self._loaded = (name, size)
+        return store, next_id
+
+    # ---------------- WRITING ----------------
+
+    def record_replace(self, store, next_id, source=None, kind='replace'):
+        """Save a whole new dataset as the latest snapshot"""
+        name = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        folder = os.path.join(self.snapshots_folder, name)
+
+        store.save(folder)
+        with open(os.path.join(folder, 'next_id'), 'w') as f:
+            f.write(str(next_id))
+
+        # Point LATEST at the new snapshot in one atomic rename
+        tmp_path = f'{self.latest_path}.{name}'
+        with open(tmp_path, 'w') as f:
+            f.write(name)
+        os.replace(tmp_path, self.latest_path)
+
+        self._loaded = (name, 0)
+        self._log_upload(kind, source, len(store), name)
+        self._prune(name)
+
+    def record_merge(self, store, records, next_id, source=None):
+        """Append merged records to the latest snapshot's log"""
+        name, size = self._latest()
+
+        if name is None or self._merge_count(name) >= SNAPSHOT_EVERY:
+            self.record_replace(store, next_id, source, kind='merge')
+            return
+
+        line = json.dumps({'next_id': next_id, 'records': records}) + '\n'
+        with open(self._merges_path(name), 'a') as f:
+            f.write(line)
+
+        self._loaded = (name, size + len(line.encode()))
+        self._log_upload('merge', source, len(records), name)
+
+    def _prune(self, latest):
+        # Snapshot names start with a timestamp, so they sort oldest first. Names from
+        # the same second sort at random, so the latest one is always kept.
+        names = sorted(name for name in os.listdir(self.snapshots_folder) if name != latest)
+        for name in names[:-(KEEP_SNAPSHOTS - 1)]:
+            shutil.rmtree(os.path.join(self.snapshots_folder, name), ignore_errors=True)
+
+    def _merge_count(self, name):
+        try:
+            with open(self._merges_path(name)) as f:
+                return sum(1 for _ in f)
+        except FileNotFoundError:
+            return 0
+
+    def _log_upload(self, kind, source, rows, snapshot):
+        entry = {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'kind': kind,
+            'source': source,
+            'rows': rows,
+            'snapshot': snapshot
+        }
+        with open(self.uploads_path, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
@@ -1,136 +1,421 @@
 import pandas as pd
+import numpy as np
+import io
 import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import repeat
 
-# Function to check if CSV file is valid
-def validate_csv(file_path):
-    """Check if the CSV file has all required columns and valid data"""
-    try:
-        # Check if file exists
-        if not os.path.exists(file_path):
-            return False, "File does not exist"
-        
-        # Read the CSV file
-        data = pd.read_csv(file_path)
-        
-        # Check if file is empty
-        if data.empty:
-            return False, "CSV file is empty"
+# Run as a script (python processing/processor.py FILE) the repository root is not on the path
+if not __package__:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from processing.scenarios import DEFAULT_MODEL  # noqa: E402
+
+try:
+    import pyarrow
+    import pyarrow.csv
+    HAS_PYARROW = True
+    ARROW_ERRORS = (pyarrow.ArrowInvalid,)
+except ImportError:
+    HAS_PYARROW = False
+    ARROW_ERRORS = ()
+
+# Columns every uploaded CSV must have
+REQUIRED_COLUMNS = ['District', 'Affected_Population', 'Severity_Level', 'Displaced_Families']
+
+# Allowed values for Severity_Level
+VALID_SEVERITY_LEVELS = ['Low', 'Medium', 'High', 'Critical']
+
+# Optional coordinate columns and the largest absolute value each may hold.
+# Both or neither must be present, an empty cell means the district has no location.
+LOCATION_COLUMNS = {'Latitude': 90, 'Longitude': 180}
+
+# Count columns, stored as int32 when every value fits
+COUNT_COLUMNS = ['Affected_Population', 'Displaced_Families']
+INT32_RANGE = (np.iinfo(np.int32).min, np.iinfo(np.int32).max)
+
+# Text columns parsed straight into categoricals. Counts are left to the parser's
+# own integer detection, declaring them would turn one bad value into an error
+# without a row number.
+CSV_DTYPES = {'Severity_Level': 'category', 'Province': 'category'}
+
+# Every checked chunk uses these categories, so chunks join without going back to strings
+SEVERITY_DTYPE = pd.CategoricalDtype(VALID_SEVERITY_LEVELS)
+
+# Rows read from the CSV at a time, keeps memory use flat for big files
+CHUNK_SIZE = 50000
+
+# Size of the byte ranges handed to each worker process in parallel mode
+RANGE_BYTES = 32 * 1024 * 1024
+
+
+# Function to list the first few bad rows of a column
+def describe_rows(values, mask, first_row):
+    """Format up to three flagged rows as "Row N: 'value'" using file row numbers"""
+    positions = np.flatnonzero(np.asarray(mask))[:3]
+    return ', '.join(f"Row {first_row + pos}: '{values.iloc[pos]}'" for pos in positions)
+
+
+# Function to check one block of rows
+def check_chunk(chunk, first_row):
+    """Validate a chunk of the CSV in place, returns an error message or None
+
+    first_row is the file row number of the chunk's first line (the header is row 1).
+    """
+    # Check if all required columns exist
+    missing_columns = []
+    for column in REQUIRED_COLUMNS:
+        if column not in chunk.columns:
+            missing_columns.append(column)
+    
+    if missing_columns:
+        return f"Missing columns: {', '.join(missing_columns)}"
+    
+    # Check if Affected_Population and Displaced_Families have numbers only
+    for column in COUNT_COLUMNS:
+        if not pd.api.types.is_integer_dtype(chunk[column]):
+            try:
+                numbers = pd.to_numeric(chunk[column], errors='coerce')
+            except Exception as e:
+                return f"Error in {column} column: {str(e)}"
+            
+            if numbers.isna().any():
+                found = describe_rows(chunk[column], numbers.isna(), first_row)
+                return f"{column} must contain valid numbers only. Found: {found}"
+            
+            chunk[column] = numbers
         
-        # List of required columns
-        required_columns = ['District', 'Affected_Population', 'Severity_Level', 'Displaced_Families']
+        chunk[column] = narrow_counts(chunk[column])
+    
+    # Check if Severity_Level has valid values, once per category instead of once per row
+    severity = chunk['Severity_Level']
+    if not isinstance(severity.dtype, pd.CategoricalDtype):
+        severity = severity.astype("category")
+    
+    # Code -1 (an empty cell) picks the trailing False
+    known = np.append(severity.cat.categories.isin(VALID_SEVERITY_LEVELS), False)
+    invalid = ~known[severity.cat.codes.to_numpy()]
+    if invalid.any():
+        found = describe_rows(chunk['Severity_Level'], invalid, first_row)
+        return f"Invalid Severity_Level values. Must be Low, Medium, High, or Critical. Found: {found}"
+    
+    chunk['Severity_Level'] = severity.cat.set_categories(VALID_SEVERITY_LEVELS)
+    
+    # Check the optional Latitude and Longitude are in range
+    present = [column for column in LOCATION_COLUMNS if column in chunk.columns]
+    if len(present) == 1:
+        return "Latitude and Longitude must be given together"
+    
+    for column in present:
+        limit = LOCATION_COLUMNS[column]
+        numbers = chunk[column]
+        if not pd.api.types.is_float_dtype(numbers):
+            numbers = pd.to_numeric(numbers, errors='coerce').astype(float)
         
-        # Check if all required columns exist
-        missing_columns = []
-        for column in required_columns:
-            if column not in data.columns:
-                missing_columns.append(column)
+        invalid = (numbers.isna() & chunk[column].notna()) | (numbers.abs() > limit)
+        if invalid.any():
+            found = describe_rows(chunk[column], invalid, first_row)
+            return f"{column} must be a number between -{limit} and {limit}. Found: {found}"
         
-        if missing_columns:
-            return False, f"Missing columns: {', '.join(missing_columns)}"
+        chunk[column] = numbers
+    
+    return None
+
+
+# Function to store whole counts in 4 bytes instead of 8
+def narrow_counts(values):
+    """int32 copy of an integer Series when every value fits, otherwise the Series itself"""
+    if values.dtype == np.int32 or not pd.api.types.is_integer_dtype(values) or values.empty:
+        return values
+    if INT32_RANGE[0] <= values.min() and values.max() <= INT32_RANGE[1]:
+        return values.astype(np.int32)
+    return values
+
+
+# Function to join checked chunks into one DataFrame
+def join_chunks(chunks):
+    """Concatenate chunks, keeping Province categorical
+
+    Each chunk has its own Province categories, so pandas joins them as strings.
+    """
+    data = pd.concat(chunks, ignore_index=True)
+    if 'Province' in data.columns and not isinstance(data['Province'].dtype, pd.CategoricalDtype):
+        data['Province'] = data['Province'].astype("category")
+    return data
+
+
+# Function to check if CSV data is valid
+def validate_csv(source, chunksize=CHUNK_SIZE):
+    """Check if the CSV data has all required columns and valid data
+
+    source can be a file path, a file-like object or a DataFrame.
+    """
+    data, message = stream_csv(source, calculate=False, collect=False, chunksize=chunksize)
+    
+    if message != "Success":
+        return False, message
+    
+    return True, "CSV is valid"
+
+
+# Function to calculate required resources
+def calculate_resources(data, model=DEFAULT_MODEL):
+    """Calculate food packs, tents, medical supplies, water, and blankets needed"""
+    
+    # Ensure numeric columns are properly typed (checked chunks already are)
+    for column in COUNT_COLUMNS:
+        if not pd.api.types.is_integer_dtype(data[column]):
+            data[column] = pd.to_numeric(data[column], errors='coerce').fillna(0).astype(int)
+    
+    # Ratios and severity multipliers come from the resource model
+    return model.apply(data)
+
+
+# Function to tell a DataFrame or file-like object apart from a path
+def is_path(source):
+    return isinstance(source, (str, os.PathLike))
+
+
+# Function to read any supported source in chunks
+def read_chunks(source, chunksize, engine="c"):
+    """Chunks of a path, a file-like object or a DataFrame, as a context manager
+
+    DataFrame chunks are copies, so checking them never changes the caller's data.
+    engine="pyarrow" reads a file path with Arrow's multithreaded CSV reader.
+    """
+    if isinstance(source, pd.DataFrame):
+        return nullcontext(
+            source.iloc[start:start + chunksize].copy()
+            for start in range(0, len(source), chunksize)
+        )
+    
+    if engine == "pyarrow":
+        return nullcontext(arrow_chunks(source, chunksize))
+    
+    return pd.read_csv(source, chunksize=chunksize, dtype=CSV_DTYPES)
+
+
+# Function to read a CSV file with pyarrow
+def arrow_chunks(file_path, chunksize):
+    """DataFrames of about chunksize rows read by pyarrow.csv, text columns as categoricals
+
+    Arrow stops with ArrowInvalid at a value it can't convert, without a row
+    number; stream_csv then reads the file again with the pandas parser.
+    """
+    options = pyarrow.csv.ConvertOptions(
+        column_types={column: pyarrow.dictionary(pyarrow.int32(), pyarrow.string()) for column in CSV_DTYPES},
+        strings_can_be_null=True
+    )
+    # About 64 bytes per row
+    read_options = pyarrow.csv.ReadOptions(block_size=chunksize * 64)
+    
+    with pyarrow.csv.open_csv(file_path, read_options=read_options, convert_options=options) as reader:
+        for batch in reader:
+            yield batch.to_pandas()
+
+
+# Function to time how long pandas takes to parse each chunk
+def timed_chunks(reader, timer):
+    """Iterate a chunked reader, timing the parsing of each chunk as the 'parse' phase"""
+    chunks = iter(reader)
+    while True:
+        with timer("parse"):
+            chunk = next(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+# Function to read, check and calculate the CSV in a single pass
+def stream_csv(source, calculate=True, collect=True, chunksize=CHUNK_SIZE, progress=None, timer=None, engine=None):
+    """Read CSV data chunk by chunk, validating (and optionally calculating) each chunk as it arrives
+
+    source can be a file path, a file-like object or a DataFrame. The processed
+    chunks are joined together; with collect=False they are dropped once checked,
+    which is all validate_csv needs.
+    progress, if given, is called with the number of rows done after each chunk.
+    timer, if given, is called with a phase name ("parse", "validate", "calculate")
+    and must return a context manager that times that phase.
+    engine defaults to "pyarrow" for file paths when pyarrow is installed, "c" otherwise.
+    Returns (data, message) where data is None on failure.
+    """
+    timer = timer or (lambda phase: nullcontext())
+    if engine is None:
+        engine = "pyarrow" if HAS_PYARROW and is_path(source) else "c"
+    
+    try:
+        # Check if file exists
+        if is_path(source) and not os.path.exists(source):
+            return None, "File does not exist"
         
-        # Check if Affected_Population has numbers only
-        try:
-            data['Affected_Population'] = pd.to_numeric(data['Affected_Population'], errors='coerce')
-            if data['Affected_Population'].isna().any():
-                return False, "Affected_Population must contain valid numbers only"
-        except Exception as e:
-            return False, f"Error in Affected_Population column: {str(e)}"
+        processed_chunks = []
+        first_row = 2  # row 1 is the header
         
-        # Check if Displaced_Families has numbers only
-        try:
-            data['Displaced_Families'] = pd.to_numeric(data['Displaced_Families'], errors='coerce')
-            if data['Displaced_Families'].isna().any():
-                return False, "Displaced_Families must contain valid numbers only"
-        except Exception as e:
-            return False, f"Error in Displaced_Families column: {str(e)}"
+        with read_chunks(source, chunksize, engine) as reader:
+            for chunk in timed_chunks(reader, timer):
+                if chunk.empty:
+                    continue
+                
+                with timer("validate"):
+                    error = check_chunk(chunk, first_row)
+                if error:
+                    return None, error
+                
+                first_row += len(chunk)
+                
+                if calculate:
+                    with timer("calculate"):
+                        chunk = calculate_resources(chunk)
+                if collect:
+                    processed_chunks.append(chunk)
+                if progress:
+                    progress(first_row - 2)
         
-        # Check if Severity_Level has valid values
-        valid_levels = ['Low', 'Medium', 'High', 'Critical']
-        invalid_levels = []
-        for idx, level in enumerate(data['Severity_Level']):
-            if pd.isna(level) or level not in valid_levels:
-                invalid_levels.append(f"Row {idx + 2}: '{level}'")
+        # Check if file is empty
+        if first_row == 2:
+            return None, "CSV file is empty"
         
-        if invalid_levels:
-            return False, f"Invalid Severity_Level values. Must be Low, Medium, High, or Critical. Found: {', '.join(invalid_levels[:3])}"
+        if not collect:
+            return None, "Success"
         
-        return True, "CSV is valid"
+        return join_chunks(processed_chunks), "Success"
     
+    except ARROW_ERRORS:
+        # Read it again with pandas, which reports the bad rows by number
+        return stream_csv(source, calculate, collect, chunksize, progress, timer, engine="c")
     except pd.errors.EmptyDataError:
-        return False, "CSV file is empty or corrupted"
+        return None, "CSV file is empty or corrupted"
     except pd.errors.ParserError:
-        return False, "Error parsing CSV file. Please check the file format"
+        return None, "Error parsing CSV file. Please check the file format"
     except Exception as e:
-        return False, f"Error reading file: {str(e)}"
+        return None, f"Error reading file: {str(e)}"
 
 
-# Function to calculate required resources
-def calculate_resources(data):
-    """Calculate food packs, tents, medical supplies, water, and blankets needed"""
+# Function to split a CSV file into pieces for the worker processes
+def split_byte_ranges(file_path, parts):
+    """Split the rows of a CSV into at least `parts` byte ranges that end on line breaks
+
+    Returns (header line, [(start, end), ...]). Quoted values that contain line
+    breaks are not supported, a range could start in the middle of one.
+    """
+    size = os.path.getsize(file_path)
     
-    # Ensure numeric columns are properly typed
-    data['Affected_Population'] = pd.to_numeric(data['Affected_Population'], errors='coerce').fillna(0).astype(int)
-    data['Displaced_Families'] = pd.to_numeric(data['Displaced_Families'], errors='coerce').fillna(0).astype(int)
-    
-    # Create new columns for resources
-    data['Food_Packs'] = 0
-    data['Tents'] = 0
-    data['Medical_Supplies'] = 0
-    data['Water_Bottles'] = 0
-    data['Blankets'] = 0
-    
-    # Calculate resources for each district (row by row)
-    for i in range(len(data)):
-        population = data.loc[i, 'Affected_Population']
-        families = data.loc[i, 'Displaced_Families']
-        severity = data.loc[i, 'Severity_Level']
-        
-        # Basic calculations
-        food = population * 3  # 3 meals per person per day
-        tents = families * 1  # 1 tent per family
-        medical = population * 0.15  # 15% need medical help
-        water = population * 5  # 5 bottles per person per day
-        blankets = population * 1.5  # 1.5 blankets per person
-        
-        # Multiply based on severity level
-        severity_multipliers = {
-            'Low': 1.0,
-            'Medium': 1.5,
-            'High': 2.0,
-            'Critical': 2.5
-        }
-        
-        multiplier = severity_multipliers.get(severity, 1.0)
-        
-        # Apply multiplier and save to dataframe
-        data.loc[i, 'Food_Packs'] = int(food * multiplier)
-        data.loc[i, 'Tents'] = int(tents * multiplier)
-        data.loc[i, 'Medical_Supplies'] = int(medical * multiplier)
-        data.loc[i, 'Water_Bottles'] = int(water * multiplier)
-        data.loc[i, 'Blankets'] = int(blankets * multiplier)
+    with open(file_path, 'rb') as f:
+        header = f.readline()
+        data_start = f.tell()
+        
+        parts = max(parts, -(-(size - data_start) // RANGE_BYTES), 1)
+        bounds = [data_start]
+        
+        for i in range(1, parts):
+            f.seek(data_start + (size - data_start) * i // parts)
+            f.readline()  # move to the start of the next line
+            if bounds[-1] < f.tell() < size:
+                bounds.append(f.tell())
+        
+        bounds.append(size)
     
-    return data
+    return header, list(zip(bounds[:-1], bounds[1:]))
 
 
-# Main function to process the CSV file
-def process_csv(file_path):
-    """Read CSV, validate it, and calculate resources"""
+# Function to read one byte range as a DataFrame
+def read_byte_range(file_path, header, start, end):
+    """Parse the rows between two byte offsets, using the file's header line"""
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
     
-    # Step 1: Validate the CSV
-    is_valid, message = validate_csv(file_path)
+    return pd.read_csv(io.BytesIO(header + data), dtype=CSV_DTYPES)
+
+
+# Function run inside each worker process
+def process_byte_range(file_path, header, start, end, calculate=True):
+    """Check (and calculate) one byte range, returns (row count, data or None if invalid)"""
+    chunk = read_byte_range(file_path, header, start, end)
     
-    if not is_valid:
-        print(f"Validation Error: {message}")
-        return None, message
+    if chunk.empty:
+        return 0, chunk
     
-    # Step 2: Read the CSV file
-    data = pd.read_csv(file_path)
+    # Row numbers are not known inside the worker, the caller rebuilds the message
+    if check_chunk(chunk, 2):
+        return len(chunk), None
     
-    # Step 3: Calculate resources
-    processed_data = calculate_resources(data)
+    if calculate:
+        chunk = calculate_resources(chunk)
     
-    print("CSV processed successfully!")
-    return processed_data, "Success"
+    return len(chunk), chunk
+
+
+# Function to process a big CSV on several cores
+def process_csv_parallel(file_path, workers=None, calculate=True, progress=None):
+    """Validate and calculate a CSV across a process pool, keeping the original row order
+
+    The file is cut into byte ranges (see split_byte_ranges), each worker parses,
+    checks and calculates its ranges, and the results are joined in file order.
+    Returns (data, message) like process_csv.
+    """
+    try:
+        if not os.path.exists(file_path):
+            return None, "File does not exist"
+        
+        workers = workers or os.cpu_count() or 1
+        header, ranges = split_byte_ranges(file_path, workers)
+        
+        if not header.strip():
+            return None, "CSV file is empty or corrupted"
+        
+        processed_chunks = []
+        first_row = 2  # row 1 is the header
+        
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(
+                process_byte_range,
+                repeat(file_path), repeat(header),
+                [start for start, end in ranges], [end for start, end in ranges],
+                repeat(calculate)
+            )
+            
+            # map() hands results back in file order
+            for (start, end), (rows, chunk) in zip(ranges, results):
+                if chunk is None:
+                    # Re-check the bad range here, now that its first row number is known
+                    chunk = read_byte_range(file_path, header, start, end)
+                    return None, check_chunk(chunk, first_row)
+                
+                first_row += rows
+                if rows:
+                    processed_chunks.append(chunk)
+                if progress:
+                    progress(first_row - 2)
+        
+        if first_row == 2:
+            return None, "CSV file is empty"
+        
+        return join_chunks(processed_chunks), "Success"
+    
+    except pd.errors.EmptyDataError:
+        return None, "CSV file is empty or corrupted"
+    except pd.errors.ParserError:
+        return None, "Error parsing CSV file. Please check the file format"
+    except Exception as e:
+        return None, f"Error reading file: {str(e)}"
+
+
+# Main function to process the CSV file
+def process_csv(source, calculate=True, chunksize=CHUNK_SIZE, progress=None, timer=None, workers=1):
+    """Read CSV data, validate it, and calculate resources in a single pass
+
+    source can be a file path, a file-like object or a DataFrame. With workers > 1
+    a file path is processed by process_csv_parallel.
+    Returns (data, message) where data is None on failure.
+    """
+    if workers > 1 and is_path(source):
+        with (timer or (lambda phase: nullcontext()))("parallel_process"):
+            return process_csv_parallel(source, workers=workers, calculate=calculate, progress=progress)
+    
+    return stream_csv(source, calculate=calculate, chunksize=chunksize, progress=progress, timer=timer)
 
 
 # Function to get summary statistics
@@ -165,29 +450,51 @@ def save_processed_data(data, output_path):
         return False, f"Error saving file: {str(e)}"
 
 
-# Example usage
+# Command line use, runs exactly what the web app runs on an upload
 if __name__ == "__main__":
-    # Test the processor
-    test_file = "sample_flood_data.csv"
+    import argparse
+    import time
+    from collections import defaultdict
+    from contextlib import contextmanager
     
-    if os.path.exists(test_file):
-        result, message = process_csv(test_file)
-        
-        if result is not None:
-            print("\n=== Processed Data ===")
-            print(result)
-            
-            print("\n=== Summary Statistics ===")
-            summary = get_summary(result)
-            for key, value in summary.items():
-                print(f"{key}: {value:,}")
-            
-            # Save processed data
-            output_file = "processed_flood_data.csv"
-            success, msg = save_processed_data(result, output_file)
-            print(f"\n{msg}")
-        else:
-            print(f"Processing failed: {message}")
-    else:
-        print(f"Test file '{test_file}' not found")
-
+    parser = argparse.ArgumentParser(description="Validate a flood CSV and calculate the resources it needs")
+    parser.add_argument("file", nargs="?", default="sample_flood_data.csv")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--output", help="save the processed data to this CSV file")
+    args = parser.parse_args()
+    
+    # Total time per phase, printed at the end
+    phase_times = defaultdict(float)
+    
+    @contextmanager
+    def timer(phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            phase_times[phase] += time.perf_counter() - start
+    
+    start = time.perf_counter()
+    result, message = process_csv(args.file, workers=args.workers, timer=timer)
+    elapsed = time.perf_counter() - start
+    
+    if result is None:
+        print(f"Validation Error: {message}")
+        raise SystemExit(1)
+    
+    print("CSV processed successfully!")
+    print(result)
+    
+    print("\n=== Summary Statistics ===")
+    summary = get_summary(result)
+    for key, value in summary.items():
+        print(f"{key}: {value:,}")
+    
+    print("\n=== Timing ===")
+    for phase, seconds in phase_times.items():
+        print(f"{phase}: {seconds:.3f}s")
+    print(f"total: {elapsed:.3f}s ({len(result) / elapsed:,.0f} rows/s)")
+    
+    if args.output:
+        success, msg = save_processed_data(result, args.output)
+        print(f"\n{msg}")
@@ -0,0 +1,171 @@
+"""Dashboard rollups computed once per dataset load
+
+Holds the top districts for every ranked field plus counts and totals per
+severity level and per province, so the dashboard and /api/rollups only read
+precomputed values.
+"""
+import numpy as np
+
+from processing.store import RELIEF_PER_HOUSE, SEVERITY_LEVELS, TOTAL_FIELDS, District
+
+# Fields with a top-N list, and the store column that ranks them
+RANKED_FIELDS = {
+    'population': 'population',
+    'families': 'families',
+    'relief': 'houses',
+    'food_packs': 'food_packs',
+    'tents': 'tents',
+    'medical_supplies': 'medical_supplies',
+    'water_bottles': 'water_bottles',
+    'blankets': 'blankets'
+}
+
+# Districts kept per top-N list
+TOP_N = 10
+
+
+def top_positions(values, ids, n):
+    """Positions of the n largest values, largest first (ties go to the lower id)"""
+    if n >= len(values):
+        candidates = np.arange(len(values))
+    else:
+        # Everything tied with the n-th value is a candidate, then order them exactly
+        threshold = np.partition(values, len(values) - n)[len(values) - n]
+        candidates = np.flatnonzero(values >= threshold)
+
+    order = np.lexsort((ids[candidates], -values[candidates]))
+    return candidates[order[:n]]
+
+
+def updated_top(top, old_store, store, column, changed, n):
+    """Top-n positions of store from the old list and the changed rows, or None
+
+    Rows outside the old list that did not change still rank below its last
+    entry, so the answer is exact when the new n-th row ranks at or above that
+    entry. Otherwise (a listed row dropped) None says to rank every row again.
+    """
+    if not len(top):
+        return top_positions(store.column(column), store.column('id'), n)
+
+    candidates = np.union1d(top[~np.isin(top, changed)], changed)
+    values, ids = store.column(column)[candidates], store.column('id')[candidates]
+    best = candidates[top_positions(values, ids, n)]
+    if len(top) < n:
+        # The old list held every row
+        return best
+
+    last = top[-1]
+    value, district_id = old_store.column(column)[last], old_store.column('id')[last]
+    if len(best) == n:
+        new_value, new_id = store.column(column)[best[-1]], store.column('id')[best[-1]]
+        if new_value > value or (new_value == value and new_id <= district_id):
+            return best
+    return None
+
+
+def group_totals(store, field, positions=None):
+    """{category: {'count': ..., <total field>: ...}} for a category field of the store
+
+    Only the rows at positions are counted when positions are given.
+    """
+    codes, categories = store.codes(field)
+    size = len(categories)
+    columns = {name: store.column(name) for name in TOTAL_FIELDS}
+    if positions is not None:
+        codes = codes[positions]
+        columns = {name: values[positions] for name, values in columns.items()}
+
+    counts = np.bincount(codes, minlength=size)
+    sums = {
+        name: np.bincount(codes, weights=columns[name], minlength=size)
+        for name in TOTAL_FIELDS
+    }
+
+    groups = {}
+    for code, category in enumerate(categories):
+        if not counts[code]:
+            continue
+        group = {'count': int(counts[code])}
+        for name in TOTAL_FIELDS:
+            group[name] = int(sums[name][code])
+        group['relief'] = group['houses'] * RELIEF_PER_HOUSE
+        groups[category] = group
+
+    return groups
+
+
+class Rollups:
+    """Top-N lists and per-severity / per-province rollups for one store"""
+
+    def __init__(self, store, top_n=TOP_N):
+        self.store = store
+        self.top_n = top_n
+        self.totals = store.totals()
+
+        ids = store.column('id')
+        self._top = {
+            field: top_positions(store.column(column), ids, top_n)
+            for field, column in RANKED_FIELDS.items()
+        }
+
+        severity = group_totals(store, 'severity')
+        self.by_severity = {level: severity[level] for level in SEVERITY_LEVELS if level in severity}
+        self.by_province = group_totals(store, 'province')
+
+    def successor(self, store, changed):
+        """Rollups of store, which differs from this one's store only at the row positions changed
+
+        The group rollups move by the old and new values of the changed rows and
+        each top-N list is ranked from its old entries plus those rows, so the
+        cost follows the number of changed rows rather than the store size.
+        """
+        old = self.store
+        changed = np.asarray(changed, dtype=np.int64)
+        updated = changed[changed < len(old)]
+
+        rollups = Rollups.__new__(Rollups)
+        rollups.store = store
+        rollups.top_n = self.top_n
+        rollups.totals = store.totals()
+
+        rollups._top = {}
+        for field, column in RANKED_FIELDS.items():
+            top = updated_top(self._top[field], old, store, column, changed, self.top_n)
+            if top is None:
+                top = top_positions(store.column(column), store.column('id'), self.top_n)
+            rollups._top[field] = top
+
+        groups = {}
+        for field, current in [('severity', self.by_severity), ('province', self.by_province)]:
+            totals = {category: dict(group) for category, group in current.items()}
+            for source, positions, sign in [(old, updated, -1), (store, changed, 1)]:
+                for category, change in group_totals(source, field, positions).items():
+                    group = totals.setdefault(category, dict.fromkeys(change, 0))
+                    for name, value in change.items():
+                        group[name] += sign * value
+
+            # Same order as a full build, without the groups that emptied
+            categories = store.codes(field)[1]
+            groups[field] = {category: totals[category] for category in categories
+                             if totals.get(category, {}).get('count')}
+
+        rollups.by_severity = {level: groups['severity'][level] for level in SEVERITY_LEVELS
+                               if level in groups['severity']}
+        rollups.by_province = groups['province']
+        return rollups
+
+    def top(self, field, n=None):
+        """The n (default top_n) districts with the largest value of field"""
+        positions = self._top[field][:n]
+        return [District(self.store, int(pos)) for pos in positions]
+
+    def severity_count(self, level):
+        return self.by_severity.get(level, {}).get('count', 0)
+
+    def to_dict(self):
+        return {
+            'totals': self.totals,
+            'top': {field: self.top(field) for field in RANKED_FIELDS},
+            'by_severity': self.by_severity,
+            'by_province': self.by_province
+        }
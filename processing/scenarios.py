@@ -0,0 +1,169 @@
+"""Resource model and batched what-if scenarios
+
+A ResourceModel holds the per-person/per-family ratios and the severity
+multipliers used to turn affected population and displaced families into
+resource requirements. The default model is what every upload is calculated
+with. evaluate_scenarios() runs many models against a DistrictStore at once as
+one broadcast over districts x scenarios x resources.
+"""
+import numpy as np
+import pandas as pd
+
+# Severity multipliers applied to every resource
+SEVERITY_MULTIPLIERS = {
+    'Low': 1.0,
+    'Medium': 1.5,
+    'High': 2.0,
+    'Critical': 2.5
+}
+
+# (resource column, column it is based on, amount per person/family)
+RESOURCE_RATIOS = [
+    ('Food_Packs', 'Affected_Population', 3),  # 3 meals per person per day
+    ('Tents', 'Displaced_Families', 1),  # 1 tent per family
+    ('Medical_Supplies', 'Affected_Population', 0.15),  # 15% need medical help
+    ('Water_Bottles', 'Affected_Population', 5),  # 5 bottles per person per day
+    ('Blankets', 'Affected_Population', 1.5),  # 1.5 blankets per person
+]
+
+# CSV column -> DistrictStore field
+STORE_FIELDS = {
+    'Affected_Population': 'population',
+    'Displaced_Families': 'families',
+    'Food_Packs': 'food_packs',
+    'Tents': 'tents',
+    'Medical_Supplies': 'medical_supplies',
+    'Water_Bottles': 'water_bottles',
+    'Blankets': 'blankets'
+}
+
+# Scenarios accepted in one request
+MAX_SCENARIOS = 100
+
+# Districts per block when evaluating, keeps the districts x scenarios x resources
+# array around this many values (2 MB, small enough to stay in cache)
+BLOCK_VALUES = 256 * 1024
+
+
+def severity_values(severity, values, default):
+    """Per-row float array of a {severity level: value} dict, unknown levels get default
+
+    A categorical Series is looked up once per category and then by code.
+    """
+    if isinstance(severity.dtype, pd.CategoricalDtype):
+        # Code -1 (a missing value) picks the trailing default
+        table = [values.get(level, default) for level in severity.cat.categories] + [default]
+        return np.array(table, dtype=float)[severity.cat.codes.to_numpy()]
+
+    return severity.map(values).fillna(default).to_numpy(dtype=float)
+
+
+class ResourceModel:
+    """Resource ratios and severity multipliers for one planning scenario"""
+
+    def __init__(self, ratios=RESOURCE_RATIOS, multipliers=SEVERITY_MULTIPLIERS, name='default'):
+        self.name = name
+        self.ratios = list(ratios)
+        self.multipliers = dict(multipliers)
+
+    @property
+    def resources(self):
+        return [STORE_FIELDS[column] for column, _, _ in self.ratios]
+
+    def multiplier(self, severity):
+        """Multiplier for each severity in an array-like, unknown levels count as 1.0"""
+        return np.array([self.multipliers.get(level, 1.0) for level in severity], dtype=float)
+
+    def apply(self, data):
+        """Add a column per resource to a DataFrame with population/families/severity"""
+        # Look up the multiplier for every row at once, unknown levels count as Low
+        multiplier = severity_values(data['Severity_Level'], self.multipliers, 1.0)
+
+        # (basis * ratio first, then the multiplier, then truncate - same order as per row).
+        # Floats keep int32 counts from overflowing and are exact for whole numbers below 2**53.
+        for column, basis, ratio in self.ratios:
+            data[column] = (data[basis].to_numpy(dtype=float) * ratio * multiplier).astype(int)
+
+        return data
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'ratios': {STORE_FIELDS[column]: ratio for column, _, ratio in self.ratios},
+            'multipliers': self.multipliers
+        }
+
+
+DEFAULT_MODEL = ResourceModel()
+
+
+def parse_model(spec, name):
+    """Build a ResourceModel from a scenario dict, returns (model, message)
+
+    The dict may hold 'name', 'ratios' ({resource: amount}) and 'multipliers'
+    ({severity: factor}). Anything left out keeps its default value.
+    """
+    if not isinstance(spec, dict):
+        return None, f"{name} must be an object"
+
+    ratios = spec.get('ratios', {})
+    multipliers = spec.get('multipliers', {})
+    if not isinstance(ratios, dict) or not isinstance(multipliers, dict):
+        return None, f"{name}: ratios and multipliers must be objects"
+
+    resources = DEFAULT_MODEL.resources
+    unknown = [key for key in ratios if key not in resources]
+    if unknown:
+        return None, f"{name}: unknown resources {', '.join(unknown)}"
+
+    unknown = [key for key in multipliers if key not in SEVERITY_MULTIPLIERS]
+    if unknown:
+        return None, f"{name}: unknown severity levels {', '.join(unknown)}"
+
+    for key, value in list(ratios.items()) + list(multipliers.items()):
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 <= value <= 1000:
+            return None, f"{name}: {key} must be a number between 0 and 1000"
+
+    model_ratios = [
+        (column, basis, ratios.get(STORE_FIELDS[column], ratio))
+        for column, basis, ratio in DEFAULT_MODEL.ratios
+    ]
+    model_multipliers = dict(DEFAULT_MODEL.multipliers, **multipliers)
+
+    return ResourceModel(model_ratios, model_multipliers, str(spec.get('name', name))), "Success"
+
+
+def evaluate_scenarios(store, models):
+    """Total resources for each model over every district in the store
+
+    All models must list the same resources in the same order (parse_model
+    guarantees this). Every district is truncated to whole units per scenario,
+    exactly as calculate_resources does, before summing. Returns an int64 array
+    of shape (scenarios, resources).
+    """
+    columns = [column for column, _, _ in models[0].ratios]
+    bases = [STORE_FIELDS[basis] for _, basis, _ in models[0].ratios]
+
+    # scenarios x resources ratios and scenarios x severity-category multipliers
+    ratios = np.array([[ratio for _, _, ratio in model.ratios] for model in models], dtype=float)
+    codes, categories = store.codes('severity')
+    multipliers = np.array([model.multiplier(categories) for model in models], dtype=float)
+
+    # Each basis column once, as districts x resources
+    basis_columns = {name: store.column(name) for name in set(bases)}
+
+    totals = np.zeros((len(models), len(columns)), dtype=np.int64)
+    block = max(1, BLOCK_VALUES // (len(models) * len(columns)))
+
+    for start in range(0, len(store), block):
+        basis = np.stack([basis_columns[name][start:start + block] for name in bases], axis=1)
+
+        # districts x scenarios x resources, same operation order as calculate_resources
+        values = basis[:, None, :] * ratios[None, :, :]
+        values *= multipliers[:, codes[start:start + block]].T[:, :, None]
+
+        # Truncate in place like astype(int) does; sums of whole numbers stay exact
+        np.trunc(values, out=values)
+        totals += values.sum(axis=0).astype(np.int64)
+
+    return totals
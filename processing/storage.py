@@ -0,0 +1,114 @@
+"""Columnar binary storage for processed datasets
+
+Processed data is written as Parquet when pyarrow is installed. Otherwise it
+goes into a folder with one .npy file per column plus a meta.json. Numeric
+columns are memory-mapped on load and text columns are stored as integer codes
+into a list of values.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow.parquet  # noqa: F401
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+PARQUET_SUFFIX = '.parquet'
+COLUMNS_SUFFIX = '.columns'
+META_FILE = 'meta.json'
+
+
+def save_columns(data, folder):
+    """Write a DataFrame as a folder of .npy columns"""
+    os.makedirs(folder, exist_ok=True)
+    meta = {'rows': len(data), 'columns': []}
+
+    for i, column in enumerate(data.columns):
+        values = data[column]
+        entry = {'name': column, 'file': f'{i}.npy'}
+
+        if pd.api.types.is_numeric_dtype(values) and not isinstance(values.dtype, pd.CategoricalDtype):
+            array = values.to_numpy()
+        else:
+            # Text is stored as codes, -1 marks a missing value
+            codes, categories = pd.factorize(values)
+            array = codes.astype(np.int32)
+            entry['categories'] = [str(value) for value in categories]
+
+        np.save(os.path.join(folder, entry['file']), array)
+        meta['columns'].append(entry)
+
+    # meta.json goes last, a folder without it is an unfinished write
+    with open(os.path.join(folder, META_FILE), 'w') as f:
+        json.dump(meta, f)
+
+
+def load_columns(folder, mmap=True):
+    """Read a folder written by save_columns, memory-mapping the numeric columns"""
+    with open(os.path.join(folder, META_FILE)) as f:
+        meta = json.load(f)
+
+    columns = {}
+    for entry in meta['columns']:
+        array = np.load(os.path.join(folder, entry['file']), mmap_mode='r' if mmap else None)
+
+        if 'categories' in entry:
+            categories = np.array(entry['categories'] + [np.nan], dtype=object)
+            array = categories[array]  # code -1 picks the trailing NaN
+
+        columns[entry['name']] = array
+
+    return pd.DataFrame(columns, copy=False)
+
+
+def save_processed(data, path_base):
+    """Save processed data next to path_base in the best available format, returns the path"""
+    if HAS_PYARROW:
+        path = path_base + PARQUET_SUFFIX
+        data.to_parquet(path, index=False)
+    else:
+        path = path_base + COLUMNS_SUFFIX
+        save_columns(data, path)
+
+    return path
+
+
+def load_processed(path):
+    """Load a processed dataset saved by save_processed (or an old CSV)
+
+    Returns (data, message) where data is None on failure.
+    """
+    try:
+        if not os.path.exists(path):
+            return None, "File does not exist"
+
+        if path.endswith(PARQUET_SUFFIX):
+            data = pd.read_parquet(path, memory_map=True)
+        elif path.endswith(COLUMNS_SUFFIX):
+            data = load_columns(path)
+        else:
+            data = pd.read_csv(path)
+
+        return data, "Success"
+
+    except Exception as e:
+        return None, f"Error loading processed data: {str(e)}"
+
+
+def latest_processed(folder):
+    """Path of the newest processed dataset in a folder, or None"""
+    paths = [
+        os.path.join(folder, name) for name in os.listdir(folder)
+        if name.startswith('processed_') and (
+            name.endswith(PARQUET_SUFFIX)
+            or (name.endswith(COLUMNS_SUFFIX) and os.path.exists(os.path.join(folder, name, META_FILE)))
+        )
+    ]
+
+    if not paths:
+        return None
+    return max(paths, key=os.path.getmtime)
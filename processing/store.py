@@ -0,0 +1,641 @@
+"""In-memory district store with lookup indexes and running totals
+
+Districts are kept column by column: NumPy arrays for the numbers and small
+integer codes for repeated text (severity, province, date). The optional
+location is a pair of float arrays, NaN for districts without one. Reads hand out
+District row views instead of dicts, so nothing is copied per request.
+"""
+import json
+import os
+from bisect import bisect_right
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Relief amount (PKR) needed per damaged house
+RELIEF_PER_HOUSE = 50000
+
+# Numeric fields, each stored as an int64 array and kept as a running total
+TOTAL_FIELDS = [
+    'population', 'houses', 'casualties', 'families',
+    'food_packs', 'tents', 'medical_supplies', 'water_bottles', 'blankets'
+]
+
+# Text fields with few distinct values, stored as codes into a category list
+CATEGORY_FIELDS = ['severity', 'province', 'date']
+
+# Optional coordinates in degrees, stored as float64 arrays with NaN for no location
+LOCATION_FIELDS = ['latitude', 'longitude']
+
+# Field order used for JSON output
+FIELDS = ['id', 'name', 'province', 'population', 'houses', 'casualties', 'date',
+          'severity'] + TOTAL_FIELDS[3:] + LOCATION_FIELDS
+
+# Severity codes are fixed so they mean the same thing in every store
+SEVERITY_LEVELS = ['Low', 'Medium', 'High', 'Critical', 'N/A']
+
+MISSING = 'N/A'
+
+# Fields the district list can be sorted on, and the column that orders them
+# (relief is houses * RELIEF_PER_HOUSE, so houses gives the same order)
+SORT_COLUMNS = {
+    'id': 'id',
+    'population': 'population',
+    'families': 'families',
+    'relief': 'houses'
+}
+
+# Filtered/sorted row orders kept per store, each one costs 4 bytes per row
+MAX_CACHED_ORDERS = 16
+
+
+class District:
+    """Read-only view of one row in a DistrictStore"""
+
+    __slots__ = ('_store', '_pos')
+
+    def __init__(self, store, pos):
+        self._store = store
+        self._pos = pos
+
+    def __getattr__(self, field):
+        return self._store._value(self._pos, field)
+
+    def __getitem__(self, field):
+        try:
+            return self._store._value(self._pos, field)
+        except AttributeError:
+            raise KeyError(field)
+
+    def __repr__(self):
+        return f"District(id={self.id}, name={self.name!r})"
+
+    def to_dict(self):
+        """Plain dict of the row for JSON, including relief"""
+        record = {field: self._store._value(self._pos, field) for field in FIELDS}
+        record['relief'] = record['houses'] * RELIEF_PER_HOUSE
+        return record
+
+
+class DistrictStore:
+    """Holds district records with an id index, severity/province indexes and totals"""
+
+    def __init__(self, records=(), capacity=16):
+        self._size = 0
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._names = []
+        self._columns = {field: np.zeros(capacity, dtype=np.int64) for field in TOTAL_FIELDS}
+        self._locations = {field: np.full(capacity, np.nan) for field in LOCATION_FIELDS}
+        self._codes = {field: np.zeros(capacity, dtype=np.int32) for field in CATEGORY_FIELDS}
+        self._categories = {field: [] for field in CATEGORY_FIELDS}
+        self._category_lookup = {field: {} for field in CATEGORY_FIELDS}
+        for level in SEVERITY_LEVELS:
+            self._category_code('severity', level)
+
+        # id -> row position, as an array offset by the smallest id (-1 = no row)
+        self._id_base = 0
+        self._positions = np.full(0, -1, dtype=np.int64)
+
+        # name -> row position (a tuple when several provinces share the name).
+        # Only built the first time lookup() is used.
+        self._name_index = None
+
+        # Arrays, names and name index still shared with the store this one was
+        # copied from, copied on the first write (see copy())
+        self._shared = set()
+
+        # (sort, filters) -> row positions in that order, see page()
+        self._orders = OrderedDict()
+
+        # Secondary indexes: number of rows per category code
+        self._counts = {field: np.zeros(0, dtype=np.int64) for field in CATEGORY_FIELDS}
+        self._totals = {field: 0 for field in TOTAL_FIELDS}
+
+        for record in records:
+            self.insert(record)
+
+    @classmethod
+    def from_frame(cls, frame):
+        """Build a store in one go from a DataFrame whose columns are the store's fields"""
+        store = cls(capacity=max(len(frame), 1))
+        size = len(frame)
+
+        store._size = size
+        store._ids[:size] = frame['id'].to_numpy(dtype=np.int64)
+        store._names = frame['name'].astype(str).tolist()
+
+        for field in TOTAL_FIELDS:
+            store._columns[field][:size] = frame[field].to_numpy(dtype=np.int64)
+            store._totals[field] = int(store._columns[field][:size].sum())
+
+        for field in LOCATION_FIELDS:
+            if field in frame.columns:
+                store._locations[field][:size] = frame[field].to_numpy(dtype=float)
+
+        for field in CATEGORY_FIELDS:
+            store._codes[field][:size] = store._frame_codes(field, frame[field])
+            store._counts[field] = np.bincount(
+                store._codes[field][:size], minlength=len(store._categories[field])
+            )
+
+        if size:
+            store._index_ids(np.arange(size))
+
+        return store
+
+    def save(self, folder):
+        """Write the store as .npy arrays plus meta.json, so load() can memory-map it"""
+        os.makedirs(folder, exist_ok=True)
+        size = self._size
+
+        arrays = {'ids': self._ids[:size], 'positions': self._positions,
+                  'names': np.array(self._names, dtype=str)}
+        for field in TOTAL_FIELDS:
+            arrays[field] = self._columns[field][:size]
+        for field in LOCATION_FIELDS:
+            arrays[field] = self._locations[field][:size]
+        for field in CATEGORY_FIELDS:
+            arrays[f'{field}_codes'] = self._codes[field][:size]
+            arrays[f'{field}_counts'] = self._counts[field]
+
+        for name, values in arrays.items():
+            np.save(os.path.join(folder, f'{name}.npy'), values)
+
+        meta = {
+            'size': size,
+            'id_base': self._id_base,
+            'categories': self._categories,
+            'totals': self._totals
+        }
+        # meta.json goes last, a folder without it is an unfinished write
+        with open(os.path.join(folder, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def load(cls, folder):
+        """Open a store written by save() without reading the arrays into memory
+
+        Arrays are mapped copy-on-write, so later inserts stay private to this process.
+        """
+        with open(os.path.join(folder, 'meta.json')) as f:
+            meta = json.load(f)
+
+        def array(name):
+            return np.load(os.path.join(folder, f'{name}.npy'), mmap_mode='c')
+
+        def location(name):
+            # Snapshots saved before locations existed have none
+            if not os.path.exists(os.path.join(folder, f'{name}.npy')):
+                return np.full(meta['size'], np.nan)
+            return array(name)
+
+        store = cls.__new__(cls)
+        store._size = meta['size']
+        store._ids = array('ids')
+        store._names = array('names')  # becomes a list on the first insert
+        store._columns = {field: array(field) for field in TOTAL_FIELDS}
+        store._locations = {field: location(field) for field in LOCATION_FIELDS}
+        store._codes = {field: array(f'{field}_codes') for field in CATEGORY_FIELDS}
+        store._categories = meta['categories']
+        store._category_lookup = {
+            field: {value: code for code, value in enumerate(values)}
+            for field, values in meta['categories'].items()
+        }
+        store._id_base = meta['id_base']
+        store._positions = array('positions')
+        store._name_index = None
+        store._shared = set()
+        store._orders = OrderedDict()
+        store._counts = {field: np.array(array(f'{field}_counts')) for field in CATEGORY_FIELDS}
+        store._totals = meta['totals']
+        return store
+
+    def copy(self):
+        """Independent copy, for building a new version off to the side
+
+        The copy shares the row arrays, names and name index with this store and
+        copies each one only when it first writes to it, so a merge that touches
+        a few columns does not copy the others. Both stores stop writing in place.
+        """
+        other = DistrictStore.__new__(DistrictStore)
+        other._size = self._size
+        other._ids = self._ids
+        other._names = self._names
+        other._columns = dict(self._columns)
+        other._locations = dict(self._locations)
+        other._codes = dict(self._codes)
+        other._categories = {field: list(values) for field, values in self._categories.items()}
+        other._category_lookup = {field: dict(lookup) for field, lookup in self._category_lookup.items()}
+        other._id_base = self._id_base
+        other._positions = self._positions
+        other._name_index = self._name_index
+        other._orders = OrderedDict()
+        other._counts = {field: counts.copy() for field, counts in self._counts.items()}
+        other._totals = dict(self._totals)
+
+        shared = {'ids', 'names', 'positions', 'name_index'}
+        shared.update(self._columns, self._locations, self._codes)
+        self._shared = set(shared)
+        other._shared = shared
+        return other
+
+    def _own(self, part):
+        """Copy a part still shared with another store before writing to it"""
+        if part not in self._shared:
+            return
+        self._shared.discard(part)
+
+        if part in self._columns:
+            self._columns[part] = self._columns[part].copy()
+        elif part in self._locations:
+            self._locations[part] = self._locations[part].copy()
+        elif part in self._codes:
+            self._codes[part] = self._codes[part].copy()
+        elif part == 'ids':
+            self._ids = self._ids.copy()
+        elif part == 'positions':
+            self._positions = self._positions.copy()
+        elif part == 'names':
+            self._names = self._names.tolist() if isinstance(self._names, np.ndarray) else list(self._names)
+        elif part == 'name_index' and self._name_index is not None:
+            self._name_index = dict(self._name_index)
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        for pos in range(self._size):
+            yield District(self, pos)
+
+    def __contains__(self, district_id):
+        return self._position(district_id) >= 0
+
+    # ---------------- WRITES ----------------
+
+    def insert(self, record):
+        """Add a record dict, or replace the row with the same id"""
+        pos = self._position(record['id'])
+
+        self._own('names')
+        if not isinstance(self._names, list):
+            self._names = self._names.tolist()
+        self._orders.clear()
+
+        added = pos < 0
+        if added:
+            pos = self._size
+            self._grow(pos + 1)
+            self._size += 1
+            self._own('names')
+            self._names.append(None)
+            self._own('ids')
+            self._ids[pos] = record['id']
+            self._index_ids(np.array([pos]))
+        else:
+            self._unaccount(pos)
+
+        # Only write values that changed, so unchanged columns stay shared
+        name = str(record['name'])
+        if added or self._names[pos] != name:
+            if self._name_index is not None:
+                self._own('name_index')
+                if not added:
+                    self._unindex_name(pos)
+            self._own('names')
+            self._names[pos] = name
+            if self._name_index is not None:
+                self._index_name(pos)
+        for field, value in self._field_values(record):
+            self._set(self._columns, field, pos, value, added)
+        for field in LOCATION_FIELDS:
+            value = record.get(field)
+            self._set(self._locations, field, pos, np.nan if value is None else value, added)
+        for field in CATEGORY_FIELDS:
+            self._set(self._codes, field, pos, self._category_code(field, record.get(field, MISSING)), added)
+
+        self._account(pos)
+
+    def _set(self, arrays, field, pos, value, added):
+        old = arrays[field][pos]
+        if added or not (old == value or (old != old and value != value)):
+            self._own(field)
+            arrays[field][pos] = value
+
+    def _grow(self, size):
+        capacity = len(self._ids)
+        if size <= capacity:
+            return
+
+        capacity = max(size, capacity * 2)
+        self._ids = np.resize(self._ids, capacity)
+        for field in TOTAL_FIELDS:
+            self._columns[field] = np.resize(self._columns[field], capacity)
+        for field in LOCATION_FIELDS:
+            self._locations[field] = np.resize(self._locations[field], capacity)
+        for field in CATEGORY_FIELDS:
+            self._codes[field] = np.resize(self._codes[field], capacity)
+        # Resized arrays are new, nothing is shared any more
+        self._shared.difference_update(['ids', *TOTAL_FIELDS, *LOCATION_FIELDS, *CATEGORY_FIELDS])
+
+    def _index_ids(self, positions):
+        ids = self._ids[positions]
+        low, high = int(ids.min()), int(ids.max())
+
+        if not len(self._positions):
+            self._id_base = low
+        if low < self._id_base:
+            shift = self._id_base - low
+            self._positions = np.concatenate([np.full(shift, -1, dtype=np.int64), self._positions])
+            self._shared.discard('positions')
+            self._id_base = low
+        if high - self._id_base >= len(self._positions):
+            # Leave room to grow so appending one id at a time stays cheap
+            extra = max(high - self._id_base + 1 - len(self._positions), len(self._positions))
+            self._positions = np.concatenate([self._positions, np.full(extra, -1, dtype=np.int64)])
+            self._shared.discard('positions')
+
+        self._own('positions')
+        self._positions[ids - self._id_base] = positions
+
+    def _index_name(self, pos):
+        name = self._names[pos]
+        found = self._name_index.get(name)
+        if found is None:
+            self._name_index[name] = pos
+        elif isinstance(found, tuple):
+            self._name_index[name] = found + (pos,)
+        else:
+            self._name_index[name] = (found, pos)
+
+    def _unindex_name(self, pos):
+        name = self._names[pos]
+        found = self._name_index.get(name)
+        if isinstance(found, tuple):
+            rest = tuple(other for other in found if other != pos)
+            self._name_index[name] = rest[0] if len(rest) == 1 else rest
+        elif found == pos:
+            del self._name_index[name]
+
+    def _frame_codes(self, field, values):
+        """Codes of a column of category values, registering new ones in order of appearance"""
+        if not isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.fillna(MISSING).astype(str)
+            return values.map(lambda value: self._category_code(field, value)).to_numpy(dtype=np.int32)
+
+        # One lookup per category that occurs, code -1 (an empty cell) is MISSING
+        frame_codes = values.cat.codes.to_numpy()
+        categories = values.cat.categories
+        table = np.zeros(len(categories) + 1, dtype=np.int32)
+        for code in pd.unique(frame_codes):
+            table[code] = self._category_code(field, MISSING if code < 0 else str(categories[code]))
+        return table[frame_codes]
+
+    def _category_code(self, field, value):
+        if value is None or value != value:  # NaN from an empty CSV cell
+            value = MISSING
+
+        lookup = self._category_lookup[field]
+        if value not in lookup:
+            lookup[value] = len(self._categories[field])
+            self._categories[field].append(value)
+        return lookup[value]
+
+    def _account(self, pos):
+        for field in TOTAL_FIELDS:
+            self._totals[field] += int(self._columns[field][pos])
+        for field in CATEGORY_FIELDS:
+            code = self._codes[field][pos]
+            if code >= len(self._counts[field]):
+                self._counts[field] = np.resize(self._counts[field], len(self._categories[field]))
+                self._counts[field][code:] = 0
+            self._counts[field][code] += 1
+
+    def _unaccount(self, pos):
+        for field in TOTAL_FIELDS:
+            self._totals[field] -= int(self._columns[field][pos])
+        for field in CATEGORY_FIELDS:
+            self._counts[field][self._codes[field][pos]] -= 1
+
+    @staticmethod
+    def _field_values(record):
+        # Sample records have no resource columns, and families falls back to houses
+        for field in TOTAL_FIELDS:
+            if field == 'families':
+                yield field, record.get('families', record['houses'])
+            else:
+                yield field, record.get(field, 0)
+
+    # ---------------- READS ----------------
+
+    def _position(self, district_id):
+        offset = district_id - self._id_base
+        if offset < 0 or offset >= len(self._positions):
+            return -1
+        return int(self._positions[offset])
+
+    def _value(self, pos, field):
+        if field in self._columns:
+            return int(self._columns[field][pos])
+        if field in self._codes:
+            return self._categories[field][self._codes[field][pos]]
+        if field in self._locations:
+            value = float(self._locations[field][pos])
+            return None if value != value else value
+        if field == 'id':
+            return int(self._ids[pos])
+        if field == 'name':
+            return str(self._names[pos])
+        if field == 'relief':
+            return int(self._columns['houses'][pos]) * RELIEF_PER_HOUSE
+        raise AttributeError(field)
+
+    def position(self, district_id):
+        """Row position of the district with this id, -1 when it isn't in the store"""
+        return self._position(district_id)
+
+    def get(self, district_id):
+        """Return the District with this id, or None"""
+        pos = self._position(district_id)
+        if pos < 0:
+            return None
+        return District(self, pos)
+
+    def all(self):
+        """Return all districts in the order they were loaded"""
+        return list(self)
+
+    def column(self, field):
+        """Read-only array of a numeric or location field (or ids) for all rows"""
+        if field == 'id':
+            values = self._ids
+        elif field in self._locations:
+            values = self._locations[field]
+        else:
+            values = self._columns[field]
+        view = values[:self._size]
+        view.flags.writeable = False
+        return view
+
+    def names(self):
+        """District names of all rows, in row order"""
+        return list(self._names[:self._size])
+
+    def codes(self, field):
+        """Read-only category codes of a severity/province/date field, and the categories"""
+        view = self._codes[field][:self._size]
+        view.flags.writeable = False
+        return view, list(self._categories[field])
+
+    def take(self, field, positions):
+        """Values of a field for the given row positions, as an array"""
+        positions = np.asarray(positions, dtype=np.int64)
+        if field in self._codes:
+            categories = np.array(self._categories[field], dtype=object)
+            return categories[self._codes[field][positions]]
+        if field == 'name':
+            return np.array([self._names[pos] for pos in positions], dtype=object)
+        return self.column(field)[positions]
+
+    def lookup(self, names, provinces=None):
+        """Row positions for districts matched by name (and province when given)
+
+        Returns an array with -1 for districts that are not in the store and -2
+        for names that match rows in several provinces when no province is given.
+        """
+        if self._name_index is None:
+            self._build_name_index()
+
+        if provinces is None:
+            provinces = [None] * len(names)
+
+        positions = np.full(len(names), -1, dtype=np.int64)
+        for i, (name, province) in enumerate(zip(names, provinces)):
+            found = self._name_index.get(str(name), -1)
+
+            if isinstance(found, tuple):
+                if province is None:
+                    found = -2
+                else:
+                    matches = [pos for pos in found if self._value(pos, 'province') == province]
+                    found = matches[0] if matches else -1
+            elif found >= 0 and province is not None and self._value(found, 'province') != province:
+                found = -1
+
+            positions[i] = found
+
+        return positions
+
+    def _build_name_index(self):
+        names = pd.Series(self._names[:self._size], dtype=object).astype(str)
+        index = dict(zip(names, range(self._size)))
+
+        # Names in several provinces map to all their positions, in row order
+        repeated = names[names.duplicated(keep=False)]
+        for name, positions in repeated.groupby(repeated, sort=False).groups.items():
+            index[name] = tuple(int(pos) for pos in positions)
+
+        self._name_index = index
+        self._shared.discard('name_index')
+
+    def _sort_key(self, sort, descending):
+        values = self.column(SORT_COLUMNS[sort])
+        ids = self.column('id')
+        if descending:
+            return lambda pos: (-values[pos], -ids[pos])
+        return lambda pos: (values[pos], ids[pos])
+
+    def _order(self, sort, descending, filters):
+        """Row positions matching the filters, sorted by (sort value, id)"""
+        key = (sort, descending, filters)
+        # A published store is read by many threads at once, so the cache
+        # entry may be evicted between these steps
+        order = self._orders.get(key)
+        if order is not None:
+            try:
+                self._orders.move_to_end(key)
+            except KeyError:
+                pass
+            return order
+
+        severities, provinces, date_from, date_to = filters
+        mask = np.ones(self._size, dtype=bool)
+
+        for field, wanted in [('severity', severities), ('province', provinces)]:
+            if wanted:
+                codes = [self._category_lookup[field][value] for value in wanted
+                         if value in self._category_lookup[field]]
+                mask &= np.isin(self._codes[field][:self._size], codes)
+
+        if date_from or date_to:
+            codes = [code for code, date in enumerate(self._categories['date'])
+                     if (not date_from or date >= date_from) and (not date_to or date <= date_to)]
+            mask &= np.isin(self._codes['date'][:self._size], codes)
+
+        values = self.column(SORT_COLUMNS[sort])[mask]
+        ids = self.column('id')[mask]
+        if descending:
+            values, ids = -values, -ids
+
+        order = np.flatnonzero(mask)[np.lexsort((ids, values))].astype(np.int32)
+
+        self._orders[key] = order
+        while len(self._orders) > MAX_CACHED_ORDERS:
+            try:
+                self._orders.popitem(last=False)
+            except KeyError:
+                break
+        return order
+
+    def page(self, sort='id', descending=False, severities=(), provinces=(),
+             date_from=None, date_to=None, after=None, limit=50):
+        """One page of districts for keyset pagination
+
+        Rows are ordered by (sort value, id). `after` is the (value, id) keyset of the
+        last row of the previous page. The sorted, filtered order is built once and
+        cached, so each page costs O(log n + limit).
+        Returns (districts, number of matching rows, keyset for the next page or None).
+        """
+        filters = (tuple(severities), tuple(provinces), date_from, date_to)
+        order = self._order(sort, descending, filters)
+        sort_key = self._sort_key(sort, descending)
+
+        start = 0
+        if after is not None:
+            value, district_id = after
+            target = (-value, -district_id) if descending else (value, district_id)
+            start = bisect_right(order, target, key=sort_key)
+
+        chosen = order[start:start + limit]
+        districts = [District(self, int(pos)) for pos in chosen]
+
+        next_after = None
+        if start + limit < len(order):
+            last = int(chosen[-1])
+            next_after = (int(self.column(SORT_COLUMNS[sort])[last]), int(self._ids[last]))
+
+        return districts, len(order), next_after
+
+    def _count(self, field, value):
+        code = self._category_lookup[field].get(value)
+        if code is None or code >= len(self._counts[field]):
+            return 0
+        return int(self._counts[field][code])
+
+    def count_by_severity(self, severity):
+        return self._count('severity', severity)
+
+    def count_by_province(self, province):
+        return self._count('province', province)
+
+    def severities(self):
+        return [level for level in self._categories['severity'] if self.count_by_severity(level)]
+
+    def provinces(self):
+        return [name for name in self._categories['province'] if self.count_by_province(name)]
+
+    def totals(self):
+        """Running totals for every numeric field, plus relief"""
+        totals = dict(self._totals)
+        totals['relief'] = totals['houses'] * RELIEF_PER_HOUSE
+        return totals
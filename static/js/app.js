@@ -20,6 +20,15 @@ document.addEventListener('DOMContentLoaded', function () {
 
     // Initialize Number Animations
     initNumberAnimations();
+
+    // Initialize Upload Progress
+    initJobProgress();
+
+    // Initialize District List Paging
+    initLoadMoreDistricts();
+
+    // Initialize Live Dashboard Updates
+    initLiveDashboard();
 });
 
 // ===============================
@@ -220,6 +229,332 @@ function initNumberAnimations() {
     });
 }
 
+// ===============================
+// Upload Progress
+// ===============================
+function initJobProgress() {
+    const panel = document.getElementById('jobProgress');
+    if (!panel) return;
+
+    const phase = document.getElementById('jobPhase');
+    const rows = document.getElementById('jobRows');
+    const message = document.getElementById('jobMessage');
+    const sources = document.getElementById('jobSources');
+
+    // One line per file or sheet of a batch upload
+    function showSources(reports) {
+        sources.innerHTML = '';
+        reports.forEach(report => {
+            const item = document.createElement('li');
+            const label = document.createElement('strong');
+            label.textContent = report.source;
+            item.appendChild(label);
+            item.appendChild(document.createTextNode(
+                report.error ? `: ${report.error}` : `: ${report.rows.toLocaleString()} rows`
+            ));
+            sources.appendChild(item);
+        });
+    }
+
+    // Poll the job status until the background upload finishes
+    function poll() {
+        fetch(panel.dataset.statusUrl)
+            .then(response => response.json())
+            .then(job => {
+                if (job.error) {
+                    phase.textContent = job.error;
+                    return;
+                }
+
+                phase.textContent = job.phase.charAt(0).toUpperCase() + job.phase.slice(1);
+                rows.textContent = job.rows_processed.toLocaleString();
+                message.textContent = job.message;
+
+                const reports = (job.result && job.result.sources) || [];
+                showSources(reports);
+
+                if (job.status === 'done' && reports.some(report => report.error)) {
+                    // Stay on the page so the skipped files can be read
+                    message.className = 'alert alert--warning';
+                } else if (job.status === 'done') {
+                    showNotification(job.message, 'success');
+                    setTimeout(() => { window.location.href = panel.dataset.doneUrl; }, 1500);
+                } else if (job.status === 'failed') {
+                    message.className = 'alert alert--error';
+                } else {
+                    setTimeout(poll, 1000);
+                }
+            })
+            .catch(() => setTimeout(poll, 3000));
+    }
+
+    poll();
+}
+
+// ===============================
+// District List Paging
+// ===============================
+function initLoadMoreDistricts() {
+    const button = document.getElementById('loadMoreDistricts');
+    const tbody = document.getElementById('districtRows');
+    if (!button || !tbody) return;
+
+    // Same filters and sort as the page, next page picked by the cursor
+    button.addEventListener('click', function () {
+        const url = new URL(button.dataset.apiUrl, window.location.origin);
+        url.searchParams.set('cursor', button.dataset.nextCursor);
+
+        button.disabled = true;
+        fetch(url)
+            .then(response => response.json())
+            .then(page => {
+                if (page.error) {
+                    showNotification(page.error, 'error');
+                    return;
+                }
+
+                page.districts.forEach(d => tbody.appendChild(districtRow(d, button.dataset.detailUrl)));
+
+                if (page.next_cursor) {
+                    button.dataset.nextCursor = page.next_cursor;
+                    button.disabled = false;
+                } else {
+                    button.remove();
+                }
+            })
+            .catch(() => {
+                showNotification('Could not load more districts', 'error');
+                button.disabled = false;
+            });
+    });
+}
+
+function districtRow(d, detailUrl) {
+    const row = document.createElement('tr');
+    row.dataset.districtId = d.id;
+
+    const cells = [
+        d.name,
+        formatNumber(d.population),
+        formatNumber(d.houses),
+        d.casualties,
+        formatCurrency(d.relief),
+        d.date
+    ];
+    cells.forEach((value, i) => {
+        const cell = document.createElement('td');
+        if (i === 0) {
+            const strong = document.createElement('strong');
+            strong.textContent = value;
+            cell.appendChild(strong);
+        } else {
+            cell.textContent = value;
+        }
+        row.appendChild(cell);
+    });
+
+    const action = document.createElement('td');
+    const link = document.createElement('a');
+    link.href = detailUrl.replace(/0$/, d.id);
+    link.className = 'btn btn--sm btn--secondary';
+    link.textContent = 'View Details';
+    action.appendChild(link);
+    row.appendChild(action);
+
+    return row;
+}
+
+// ===============================
+// Live Dashboard Updates
+// ===============================
+function initLiveDashboard() {
+    const source = document.getElementById('dashboardData');
+    if (!source) return;
+
+    // Rows of the top-district lists by id, as of the version shown
+    const view = JSON.parse(source.textContent);
+    const rows = view.rows;
+    let lastEventId = source.dataset.eventId;
+
+    function apply(delta) {
+        lastEventId = delta.version;
+
+        if (delta.full) {
+            Object.keys(rows).forEach(id => delete rows[id]);
+        }
+        delta.rows.forEach(row => { rows[row.id] = row; });
+
+        // Forget rows no list shows any more
+        const shown = new Set([...delta.order.relief, ...delta.order.population].map(String));
+        Object.keys(rows).forEach(id => {
+            if (!shown.has(id)) delete rows[id];
+        });
+
+        updateSummary(delta.summary);
+        updateSeverity(delta.by_severity);
+        updateTopDistricts(delta.order.relief.map(id => rows[id]));
+        updateCharts(delta.order.relief.map(id => rows[id]), delta.order.population.map(id => rows[id]));
+    }
+
+    // Without a stream (the server has too many open) ask for changes every 15s
+    function poll() {
+        const url = new URL(source.dataset.eventsUrl, window.location.origin);
+        url.searchParams.set('since', lastEventId);
+        url.searchParams.set('poll', '1');
+
+        fetch(url)
+            .then(response => (response.status === 200 ? response.json() : null))
+            .then(delta => { if (delta) apply(delta); })
+            .catch(() => {})
+            .finally(() => setTimeout(poll, 15000));
+    }
+
+    if (!window.EventSource) {
+        setTimeout(poll, 15000);
+        return;
+    }
+
+    const url = new URL(source.dataset.eventsUrl, window.location.origin);
+    url.searchParams.set('since', lastEventId);
+
+    // The browser reconnects on its own and sends the last event id it got,
+    // except after an error response such as 503, which closes the stream
+    const events = new EventSource(url);
+    events.addEventListener('dataset', e => apply(JSON.parse(e.data)));
+    events.addEventListener('error', () => {
+        if (events.readyState === EventSource.CLOSED) {
+            setTimeout(poll, 15000);
+        }
+    });
+}
+
+function updateSummary(summary) {
+    document.querySelectorAll('[data-metric]').forEach(metric => {
+        const value = summary[metric.dataset.metric];
+        if (value === undefined) return;
+
+        const text = metric.dataset.prefix ? `${metric.dataset.prefix} ${formatNumber(value)}` : formatNumber(value);
+        if (metric.textContent.trim() !== text) {
+            metric.textContent = text;
+        }
+    });
+}
+
+function updateSeverity(bySeverity) {
+    const section = document.getElementById('severityBreakdown');
+    const grid = document.getElementById('severityMetrics');
+    if (!section || !grid) return;
+
+    grid.innerHTML = '';
+    Object.entries(bySeverity).forEach(([level, group]) => {
+        const metric = document.createElement('div');
+        metric.className = 'metric';
+
+        const label = document.createElement('p');
+        label.className = 'metric__label';
+        label.textContent = `${level} Severity`;
+
+        const value = document.createElement('h3');
+        value.className = 'metric__value';
+        value.textContent = formatNumber(group.count);
+
+        const people = document.createElement('p');
+        people.className = 'metric__label';
+        people.textContent = `${formatNumber(group.population)} people affected`;
+
+        metric.append(label, value, people);
+        grid.appendChild(metric);
+    });
+    section.hidden = grid.children.length === 0;
+}
+
+function updateTopDistricts(districts) {
+    const tbody = document.getElementById('topDistrictRows');
+    if (!tbody) return;
+
+    // Reuse the rows that did not change, so only new numbers are redrawn
+    const existing = new Map();
+    tbody.querySelectorAll('tr[data-district-id]').forEach(row => existing.set(row.dataset.districtId, row));
+
+    const fragment = document.createDocumentFragment();
+    districts.forEach(d => {
+        const key = topDistrictKey(d);
+        let row = existing.get(String(d.id));
+        if (!row || row.dataset.key !== key) {
+            row = topDistrictRow(d, tbody.dataset.detailUrl);
+            row.dataset.key = key;
+        }
+        fragment.appendChild(row);
+    });
+
+    if (!districts.length) {
+        const row = document.createElement('tr');
+        const cell = document.createElement('td');
+        cell.colSpan = 6;
+        cell.style.textAlign = 'center';
+        cell.textContent = 'No data available';
+        row.appendChild(cell);
+        fragment.appendChild(row);
+    }
+
+    tbody.replaceChildren(fragment);
+}
+
+function topDistrictKey(d) {
+    return [d.name, d.population, d.houses, d.casualties, d.relief].join('|');
+}
+
+function topDistrictRow(d, detailUrl) {
+    const row = document.createElement('tr');
+    row.dataset.districtId = d.id;
+
+    const name = document.createElement('td');
+    const strong = document.createElement('strong');
+    strong.textContent = d.name;
+    name.appendChild(strong);
+    row.appendChild(name);
+
+    [formatNumber(d.population), formatNumber(d.houses), d.casualties, formatCurrency(d.relief)].forEach(value => {
+        const cell = document.createElement('td');
+        cell.textContent = value;
+        row.appendChild(cell);
+    });
+
+    const action = document.createElement('td');
+    const link = document.createElement('a');
+    link.href = detailUrl.replace(/0$/, d.id);
+    link.className = 'btn btn--sm btn--outline';
+    link.textContent = 'View';
+    action.appendChild(link);
+    row.appendChild(action);
+
+    return row;
+}
+
+function updateCharts(byRelief, byPopulation) {
+    if (!window.Chart || !Chart.getChart) return;
+
+    const charts = [
+        [Chart.getChart('reliefChart'), byRelief, d => d.relief],
+        [Chart.getChart('populationChart'), byPopulation, d => d.population]
+    ];
+    charts.forEach(([chart, districts, value]) => {
+        if (!chart) return;
+        const dataset = chart.data.datasets[0];
+        chart.data.labels = districts.map(d => d.name);
+        dataset.data = districts.map(value);
+
+        // One color per slice, cycling through the ones the chart started with
+        ['backgroundColor', 'borderColor'].forEach(option => {
+            const colors = dataset[option];
+            if (Array.isArray(colors) && colors.length && colors.length < districts.length) {
+                dataset[option] = districts.map((_, i) => colors[i % colors.length]);
+            }
+        });
+        chart.update();
+    });
+}
+
 // ===============================
 // Utility Functions
 // ===============================
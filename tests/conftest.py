@@ -0,0 +1,26 @@
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+# Tests import the app and its packages from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def flood_app():
+    """The app module, persisting uploads and datasets to a scratch folder"""
+    scratch = tempfile.mkdtemp()
+    os.environ['DATA_FOLDER'] = os.path.join(scratch, 'data')
+
+    import app as flood_app
+    for name in ('uploads', 'processed'):
+        os.makedirs(os.path.join(scratch, name))
+    flood_app.app.config['UPLOAD_FOLDER'] = os.path.join(scratch, 'uploads')
+    flood_app.app.config['PROCESSED_FOLDER'] = os.path.join(scratch, 'processed')
+    flood_app.app.config['UPLOAD_ARCHIVE'] = 'off'
+
+    yield flood_app
+    shutil.rmtree(scratch, ignore_errors=True)
@@ -0,0 +1,61 @@
+"""ACTIVE_DATASET publishes a processed file once, not on every worker start"""
+import json
+import os
+import time
+
+from benchmarks.synthetic import make_flood_frame
+from processing.processor import stream_csv
+from processing.storage import save_processed
+
+
+def uploads(flood_app):
+    with open(flood_app.dataset_log.uploads_path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_activation_is_recorded_once(flood_app):
+    data, _ = stream_csv(make_flood_frame(80, seed=7), calculate=True)
+    path = save_processed(data, os.path.join(flood_app.app.config['PROCESSED_FOLDER'], 'processed_activation'))
+
+    loaded, message = flood_app.activate_processed(path)
+    assert loaded, message
+    first = flood_app.active_dataset
+    logged, versions = len(uploads(flood_app)), len(flood_app.dataset_history)
+    assert uploads(flood_app)[-1]['source'] == os.path.basename(path)
+
+    # Later worker starts load the saved dataset instead of publishing the file again
+    for _ in range(2):
+        flood_app.dataset_log._loaded = (None, 0)
+        loaded, message = flood_app.activate_processed(path)
+        assert loaded, message
+        assert flood_app.active_dataset is not first
+    assert len(uploads(flood_app)) == logged
+    assert len(flood_app.dataset_history) == versions
+    assert flood_app.active_dataset.next_id == first.next_id
+
+    # A merge into the dataset loaded from the snapshot is saved and survives a restart
+    correction, _ = stream_csv(make_flood_frame(80, seed=7).head(3).assign(Affected_Population=1),
+                               calculate=False)
+    added, updated = flood_app.merge_districts_from_csv(correction, source='correction.csv')
+    assert (added, updated) == (0, 3), updated
+    merged = flood_app.active_dataset
+
+    flood_app.dataset_log._loaded = (None, 0)
+    loaded, message = flood_app.activate_processed('latest')
+    assert loaded, message
+    assert len(uploads(flood_app)) == logged + 1
+    assert flood_app.active_dataset.store.get(int(merged.store.column('id')[0])).population == 1
+
+    # And the next merge goes into the store replayed from the snapshot and its merges
+    added, updated = flood_app.merge_districts_from_csv(correction.assign(Affected_Population=2), source='again.csv')
+    assert (added, updated) == (0, 3), updated
+    merged = flood_app.active_dataset
+
+    # A newer processed file is published
+    time.sleep(1.1)
+    path = save_processed(data.head(40), os.path.join(flood_app.app.config['PROCESSED_FOLDER'],
+                                                      'processed_newer'))
+    loaded, message = flood_app.activate_processed('latest')
+    assert loaded, message
+    assert len(flood_app.active_dataset.store) == 40
+    assert flood_app.active_dataset.next_id > merged.next_id
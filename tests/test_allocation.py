@@ -0,0 +1,71 @@
+"""Properties of the weighted water-filling stock allocation
+
+For random needs, weights and stock levels no district gets more than its need,
+the total never exceeds the stock, all stock is used when needs allow, and the
+result matches a slow bisection on the fill level.
+"""
+import numpy as np
+import pytest
+
+from processing.allocation import water_fill
+
+
+def bisect_level(need, weights, stock, steps=200):
+    """Reference fill level found by bisection, slow but obviously right"""
+    low, high = 0.0, float(max(need / np.where(weights > 0, weights, np.inf)))
+    for _ in range(steps):
+        mid = (low + high) / 2
+        if np.minimum(need, weights * mid).sum() < stock:
+            low = mid
+        else:
+            high = mid
+    return high
+
+
+def check(need, weights, stock):
+    allocation = water_fill(need, weights, stock)
+    eligible = (need > 0) & (weights > 0)
+
+    assert allocation.dtype == np.int64
+    assert (allocation >= 0).all(), "negative allocation"
+    assert (allocation <= need).all(), "allocation above need"
+    assert allocation.sum() <= stock, "allocation above stock"
+    assert (allocation[~eligible] == 0).all(), "allocation to a district with no need or weight"
+    assert allocation.sum() == min(stock, need[eligible].sum()), "stock left over"
+
+    # Away from rounding, each district gets min(need, weight * level)
+    if stock < need[eligible].sum():
+        level = bisect_level(need[eligible], weights[eligible], stock)
+        exact = np.minimum(need[eligible], weights[eligible] * level)
+        assert np.abs(allocation[eligible] - exact).max() <= 1 + 1e-6 * exact.max(), "not water-filled"
+
+
+def random_case(rng, rows):
+    need = rng.integers(0, 10000, rows)
+    need[rng.random(rows) < 0.1] = 0
+    weights = rng.choice([0.0, 1.0, 1.5, 2.0, 2.5], rows, p=[0.05, 0.35, 0.3, 0.2, 0.1])
+    if rng.random() < 0.5:
+        weights = weights * need  # proportional strategy
+    stock = int(rng.integers(0, int(need.sum() * 1.2) + 2))
+    return need, weights, stock
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_random_cases(seed):
+    rng = np.random.default_rng(seed)
+    for _ in range(50):
+        check(*random_case(rng, int(rng.integers(1, 200))))
+
+
+@pytest.mark.parametrize('need, stock', [([5, 5, 5], 0), ([1, 1, 1], 2), ([0, 0], 10)])
+def test_edge_cases(need, stock):
+    need = np.array(need)
+    check(need, np.ones(len(need)), stock)
+
+
+def test_large_case_uses_all_stock():
+    rng = np.random.default_rng(0)
+    need = rng.integers(0, 100000, 200000)
+    weights = rng.choice([1.0, 1.5, 2.0, 2.5], len(need))
+    for district_weights in (weights, weights * need):
+        check(need, district_weights, int(need.sum() // 3))
@@ -0,0 +1,22 @@
+"""Cached responses carry one ETag per encoding, and 304 only for the variant asked for"""
+import gzip
+import json
+
+
+def test_gzip_and_identity_have_their_own_etags(flood_app):
+    client = flood_app.app.test_client()
+
+    plain = client.get('/api/summary', headers={'Accept-Encoding': 'identity'})
+    packed = client.get('/api/summary', headers={'Accept-Encoding': 'gzip'})
+    assert packed.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Encoding' not in plain.headers
+    assert json.loads(gzip.decompress(packed.get_data())) == plain.json
+
+    plain_tag, packed_tag = plain.get_etag()[0], packed.get_etag()[0]
+    assert plain_tag != packed_tag
+
+    for encoding, tag, status in [('gzip', packed_tag, 304), ('identity', plain_tag, 304),
+                                  ('gzip', plain_tag, 200), ('identity', packed_tag, 200)]:
+        response = client.get('/api/summary', headers={'Accept-Encoding': encoding, 'If-None-Match': f'"{tag}"'})
+        assert response.status_code == status, (encoding, tag)
+        assert response.get_etag()[0] == (packed_tag if encoding == 'gzip' else plain_tag)
@@ -0,0 +1,104 @@
+"""Dataset.successor updates rollups and the grid index from the changed rows only
+
+Every incremental version must match a Dataset built from scratch over the
+same store, and the store it was copied from must stay as it was.
+"""
+import numpy as np
+import pytest
+
+from benchmarks.bench_geo import make_ring, make_store
+from benchmarks.synthetic import make_flood_frame
+from processing.dataset import Dataset
+from processing.processor import calculate_resources
+from processing.rollups import RANKED_FIELDS
+from processing.store import FIELDS, SEVERITY_LEVELS
+
+
+def snapshot(store):
+    return [district.to_dict() for district in store]
+
+
+def assert_same(dataset, rng):
+    full = Dataset(dataset.store)
+
+    assert dataset.rollups.totals == full.rollups.totals
+    assert dataset.rollups.by_severity == full.rollups.by_severity
+    assert dataset.rollups.by_province == full.rollups.by_province
+    assert list(dataset.rollups.by_province) == list(full.rollups.by_province)
+    for field in RANKED_FIELDS:
+        assert dataset.rollups._top[field].tolist() == full.rollups._top[field].tolist(), field
+
+    assert dataset.geo.size == full.geo.size
+    for _ in range(20):
+        lat, lon = rng.uniform([23, 60], [38, 78])
+        positions, distances = dataset.geo.nearest(lat, lon, 10)
+        expected, expected_distances = full.geo.nearest(lat, lon, 10)
+        assert positions.tolist() == expected.tolist()
+        assert np.allclose(distances, expected_distances)
+
+        box = (lat - 1.5, lon - 1.5, lat + 1.5, lon + 1.5)
+        assert dataset.geo.bbox(*box).tolist() == full.geo.bbox(*box).tolist()
+
+        ring = make_ring(rng, 50)
+        assert dataset.geo.polygon([ring]).tolist() == full.geo.polygon([ring]).tolist()
+
+
+def corrected(record, rng, move):
+    record = {field: record[field] for field in FIELDS}
+    record['population'] = int(rng.integers(0, 2_000_000))
+    record['food_packs'] = int(rng.integers(0, 500_000))
+    record['severity'] = SEVERITY_LEVELS[int(rng.integers(0, 4))]
+    if move == 'away':
+        record['latitude'] = record['longitude'] = None
+    elif move == 'nearby':
+        record['latitude'] = float(rng.uniform(25, 36))
+        record['longitude'] = float(rng.uniform(62, 76))
+    return record
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_successor_matches_full_build(seed):
+    rng = np.random.default_rng(seed)
+    data = make_flood_frame(3000, seed=seed, locations=True)
+    data.loc[data.index[::50], ['Latitude', 'Longitude']] = np.nan
+    dataset = Dataset(make_store(calculate_resources(data)), next_id=3001)
+
+    for round in range(8):
+        old = dataset.store
+        before = snapshot(old)
+        store = old.copy()
+        changed = []
+
+        # Corrections, including rows at the top of the lists that drop out of them
+        picks = rng.choice(len(old), size=int(rng.integers(1, 40)), replace=False)
+        picks = np.union1d(picks, dataset.rollups._top['population'][:3])
+        for pos in picks:
+            move = rng.choice(['stay', 'away', 'nearby'])
+            store.insert(corrected(old.get(int(old.column('id')[pos])).to_dict(), rng, move))
+            changed.append(int(pos))
+
+        # New districts, one in a new province
+        for i in range(int(rng.integers(0, 10))):
+            record = corrected(dict.fromkeys(FIELDS, 0), rng, 'nearby')
+            record.update(id=dataset.next_id + i, name=f'New {round}.{i}', province=f'Province {round}',
+                          houses=int(rng.integers(0, 1000)), casualties=0, date='N/A')
+            store.insert(record)
+            changed.append(store.position(record['id']))
+
+        dataset = dataset.successor(store, dataset.next_id + 10, changed)
+        assert_same(dataset, rng)
+        assert snapshot(old) == before
+
+
+def test_successor_rebuilds_grid_outside_its_bounds():
+    rng = np.random.default_rng(3)
+    dataset = Dataset(make_store(calculate_resources(make_flood_frame(500, seed=3, locations=True))))
+
+    store = dataset.store.copy()
+    record = corrected(store.get(1).to_dict(), rng, 'stay')
+    record['latitude'], record['longitude'] = 60.0, 100.0
+    store.insert(record)
+
+    dataset = dataset.successor(store, changed=[store.position(1)])
+    assert dataset.geo.north == 60.0 and dataset.geo.east == 100.0
+    assert_same(dataset, rng)
@@ -0,0 +1,137 @@
+"""Concurrent readers never see a torn view while uploads swap the dataset
+
+Reader threads hit the summary, rollups, districts and index endpoints through
+the Flask test client while writer threads post replace and merge uploads to
+/api/upload/stream. Every published dataset is noted as (districts, total
+population) when it is swapped in, and every response must match exactly one
+of them, with its parts agreeing with each other. A response built from the
+rollups of one upload and the districts of another fails the test.
+"""
+import threading
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import make_flood_frame
+
+READERS = 3
+WRITERS = 2
+UPLOADS = 6
+ROWS = 300
+
+
+def signature(dataset):
+    return len(dataset.store), int(dataset.rollups.totals['population'])
+
+
+def read_summary(client):
+    data = client.get('/api/summary').json
+    return [(data['districts_count'], data['total_population'])]
+
+
+def read_rollups(client):
+    data = client.get('/api/rollups').json
+    population = data['totals']['population']
+    severity = data['by_severity'].values()
+    province = data['by_province'].values()
+    count = sum(group['count'] for group in severity)
+
+    # The groups must add up to the totals they were served with
+    assert sum(group['population'] for group in severity) == population, 'severity rollup'
+    assert sum(group['count'] for group in province) == count, 'province rollup'
+    assert sum(group['population'] for group in province) == population, 'province rollup'
+    return [(count, population)]
+
+
+def read_districts(client):
+    rows = client.get('/api/districts').json
+    ids = [row['id'] for row in rows]
+    assert len(set(ids)) == len(ids), 'duplicate district ids'
+    return [(len(rows), sum(row['population'] for row in rows))]
+
+
+def read_index(client):
+    response = client.get('/')
+    assert response.status_code == 200, response.status_code
+    return []
+
+
+READS = [read_summary, read_rollups, read_districts, read_index]
+
+
+def reader(client, stop, seen, failures):
+    i = 0
+    while not stop.is_set():
+        read = READS[i % len(READS)]
+        i += 1
+        try:
+            seen.extend((read.__name__, view) for view in read(client))
+        except Exception as e:
+            failures.append(f"{read.__name__}: {e!r}")
+
+
+def writer(client, number, failures):
+    rng = np.random.default_rng(number)
+
+    for i in range(UPLOADS):
+        data = make_flood_frame(int(rng.integers(ROWS // 2, ROWS)), seed=number * 1000 + i)
+        merge = i % 3 == 2
+        if merge:
+            # Corrections to some known districts plus a few new ones
+            data = data.head(50).copy()
+            data.loc[data.index[-5:], 'District'] = [f'Writer {number} extra {i}.{k}' for k in range(5)]
+
+        name = f"writer{number}_{i}.csv"
+        response = client.post(f"/api/upload/stream?name={name}{'&mode=merge' if merge else ''}",
+                               data=data.to_csv(index=False).encode(), content_type='text/csv')
+        if response.status_code != 200:
+            failures.append(f"upload {name}: {response.json}")
+
+
+@pytest.mark.parametrize('cache', [False, True])
+def test_readers_see_whole_datasets(flood_app, monkeypatch, cache):
+    if not cache:
+        # Build every response from the dataset instead of serving most from the cache
+        monkeypatch.setattr(flood_app.api_cache, 'max_bytes', 0)
+        monkeypatch.setattr(flood_app.page_cache, 'max_bytes', 0)
+
+    # version -> (districts, total population) of every dataset that was published
+    published = {flood_app.active_dataset.version: signature(flood_app.active_dataset)}
+    set_active_store = flood_app.set_active_store
+
+    def note_published(store, next_id=None, changed=None):
+        with flood_app.publish_lock:
+            set_active_store(store, next_id, changed)
+            dataset = flood_app.active_dataset
+            published[dataset.version] = signature(dataset)
+
+    monkeypatch.setattr(flood_app, 'set_active_store', note_published)
+
+    stop = threading.Event()
+    seen = []
+    failures = []
+    readers = [threading.Thread(target=reader, args=(flood_app.app.test_client(), stop, seen, failures))
+               for _ in range(READERS)]
+    writers = [threading.Thread(target=writer, args=(flood_app.app.test_client(), n, failures))
+               for n in range(WRITERS)]
+
+    for thread in readers + writers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    stop.set()
+    for thread in readers:
+        thread.join()
+
+    assert not failures, failures[:10]
+    assert len(published) > WRITERS * UPLOADS
+
+    # Every view a reader got must be one dataset that was actually published
+    views = set(published.values())
+    torn = [(name, view) for name, view in seen if view not in views]
+    assert not torn, torn[:10]
+
+    final = flood_app.active_dataset
+    ids = final.store.column('id')
+    assert len(np.unique(ids)) == len(ids)
+    assert ids.max() < final.next_id
@@ -0,0 +1,15 @@
+"""The districts page lists entries in the order picked in its form"""
+import re
+
+import pytest
+
+
+@pytest.mark.parametrize('order', ['desc', 'asc'])
+def test_entry_order(flood_app, order):
+    client = flood_app.app.test_client()
+    ids = sorted(flood_app.active_dataset.store.column('id').tolist(), reverse=order == 'desc')
+
+    page = client.get(f'/districts?sort=id&order={order}').get_data(as_text=True)
+    assert f'<option value="{order}" selected>' in page
+    shown = [int(district_id) for district_id in re.findall(r'href="/district/(\d+)"', page)]
+    assert shown == ids[:len(shown)] and shown
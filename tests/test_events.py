@@ -0,0 +1,54 @@
+"""/api/events holds a limited number of streams, ends them in time and answers polls"""
+import pytest
+
+
+@pytest.fixture
+def events_config(flood_app):
+    config = flood_app.app.config
+    saved = {name: config[name] for name in ('EVENTS_MAX_STREAMS', 'EVENTS_MAX_SECONDS', 'EVENTS_HEARTBEAT_SECONDS')}
+    config.update(EVENTS_MAX_STREAMS=1, EVENTS_MAX_SECONDS=0.3, EVENTS_HEARTBEAT_SECONDS=0.05)
+    yield config
+    config.update(saved)
+
+
+def test_streams_over_the_limit_get_503(flood_app, events_config):
+    client = flood_app.app.test_client()
+
+    first = client.get('/api/events', buffered=False)
+    assert first.status_code == 200
+    assert next(first.response).startswith(b'retry:')
+    assert flood_app.dashboard_feed.listeners == 1
+
+    second = client.get('/api/events')
+    assert second.status_code == 503
+    assert second.headers['Retry-After'] == '1'
+
+    # Closing the stream gives its slot back
+    first.close()
+    assert flood_app.dashboard_feed.listeners == 0
+    third = client.get('/api/events', buffered=False)
+    assert third.status_code == 200
+    third.close()
+
+
+def test_stream_ends_after_its_lifetime(flood_app, events_config):
+    client = flood_app.app.test_client()
+    response = client.get('/api/events')
+
+    # The full view first, then keep-alives until the stream is closed
+    text = response.get_data(as_text=True)
+    assert text.startswith('retry: 50\n\n')
+    assert 'event: dataset' in text and ': keep-alive' in text
+    response.close()
+    assert flood_app.dashboard_feed.listeners == 0
+
+
+def test_poll_returns_the_change_without_waiting(flood_app):
+    client = flood_app.app.test_client()
+    feed = flood_app.dashboard_feed
+
+    full = client.get('/api/events?poll=1')
+    assert full.status_code == 200
+    assert full.json['full'] and full.json['version'] == feed.event_id(feed.version)
+
+    assert client.get(f'/api/events?poll=1&since={full.json["version"]}').status_code == 204
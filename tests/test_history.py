@@ -0,0 +1,71 @@
+"""DatasetHistory records a merge from its changed rows the same as from the whole store"""
+import numpy as np
+
+from benchmarks.bench_geo import make_store
+from benchmarks.synthetic import make_flood_frame
+from processing.history import DatasetHistory
+from processing.processor import calculate_resources
+from processing.store import FIELDS, SEVERITY_LEVELS
+
+
+def versions(history):
+    return [
+        (version.to_dict() | {'time': None}, version.removed.tolist(),
+         {field: (keys.tolist(), values.tolist()) for field, (keys, values) in version.changes.items()})
+        for version in history.versions
+    ]
+
+
+def test_merge_from_changed_rows_matches_full_record(tmp_path):
+    rng = np.random.default_rng(5)
+    store = make_store(calculate_resources(make_flood_frame(400, seed=5)))
+    full, delta = DatasetHistory(str(tmp_path / 'full')), DatasetHistory(str(tmp_path / 'delta'))
+    full.record(store)
+    delta.record(store)
+    next_id = len(store) + 1
+
+    # Enough merges to pass a checkpoint version
+    for round in range(12):
+        store = store.copy()
+        changed = []
+        for pos in rng.choice(len(store), size=int(rng.integers(0, 30)), replace=False):
+            record = {field: store.get(int(store.column('id')[pos]))[field] for field in FIELDS}
+            record['population'] += int(rng.integers(0, 3)) * 100
+            record['severity'] = SEVERITY_LEVELS[int(rng.integers(0, 4))]
+            store.insert(record)
+            changed.append(int(pos))
+
+        # New districts, some sharing a name with a district in another province
+        for i in range(int(rng.integers(0, 5))):
+            name = store.get(1).name if i % 2 else f'New {round}.{i}'
+            store.insert(dict(store.get(1).to_dict(), id=next_id, name=name, province=f'Province {round}.{i}'))
+            changed.append(store.position(next_id))
+            next_id += 1
+
+        full.record(store, 'merge')
+        delta.record(store, 'merge', changed=changed)
+
+    assert versions(delta) == versions(full)
+    assert delta.keys(store.get(1).name) == full.keys(store.get(1).name)
+    assert delta.diff(1, len(delta)) == full.diff(1, len(full))
+
+    # Another process reading the folder sees the same versions
+    reader = DatasetHistory(str(tmp_path / 'delta'))
+    reader.refresh()
+    assert versions(reader) == versions(full)
+    assert reader.keys(store.get(1).name) == full.keys(store.get(1).name)
+
+
+def test_merge_falls_back_when_history_is_behind(tmp_path):
+    store = make_store(calculate_resources(make_flood_frame(50, seed=6)))
+    history = DatasetHistory(str(tmp_path))
+    history.record(store)
+
+    # The latest version does not hold this store, so every row is compared
+    store = store.copy()
+    store.insert(dict(store.get(1).to_dict(), id=51, name='Added'))
+    store.insert(dict(store.get(2).to_dict(), id=52, name='Not in changed'))
+    version = history.record(store, 'merge', changed=[store.position(51)])
+
+    assert version.counts['added'] == 2
+    assert history.keys('Not in changed')
@@ -0,0 +1,18 @@
+"""A job that raises is marked failed and its traceback is logged"""
+import logging
+
+from processing.jobs import JobQueue
+
+
+def broken(job):
+    raise ValueError('bad row')
+
+
+def test_failure_is_logged(caplog):
+    with caplog.at_level(logging.ERROR, logger='processing.jobs'):
+        job = JobQueue().run('broken.csv', broken)
+
+    assert job.status == 'failed'
+    assert job.message == 'Unexpected error: bad row'
+    record, = caplog.records
+    assert 'broken.csv' in record.getMessage() and record.exc_info[0] is ValueError
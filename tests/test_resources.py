@@ -0,0 +1,42 @@
+"""The vectorized calculate_resources against the original per-row loop"""
+import pandas as pd
+import pytest
+
+from benchmarks.bench_resources import legacy_calculate_resources
+from benchmarks.synthetic import make_flood_frame
+from processing.processor import calculate_resources, stream_csv
+from processing.scenarios import RESOURCE_RATIOS
+
+COLUMNS = [column for column, _, _ in RESOURCE_RATIOS]
+
+
+@pytest.mark.parametrize('rows, seed', [(1, 0), (50, 1), (2000, 2)])
+def test_matches_row_loop(rows, seed):
+    data = make_flood_frame(rows, seed=seed)
+
+    fast = calculate_resources(data.copy())
+    slow = legacy_calculate_resources(data.copy())
+
+    pd.testing.assert_frame_equal(fast[COLUMNS], slow[COLUMNS])
+
+
+def test_matches_row_loop_for_text_counts():
+    data = make_flood_frame(200, seed=3)
+    data['Affected_Population'] = data['Affected_Population'].astype(str)
+    data['Displaced_Families'] = data['Displaced_Families'].astype(str)
+
+    fast = calculate_resources(data.copy())
+    slow = legacy_calculate_resources(data.copy())
+
+    pd.testing.assert_frame_equal(fast[COLUMNS], slow[COLUMNS])
+
+
+def test_matches_row_loop_after_checked_upload():
+    # Checked chunks have int32 counts and a categorical Severity_Level
+    data = make_flood_frame(500, seed=4)
+    checked, message = stream_csv(data.copy(), calculate=True)
+    assert message == "Success"
+
+    slow = legacy_calculate_resources(data.copy())
+    for column in COLUMNS:
+        assert checked[column].tolist() == slow[column].tolist(), column
@@ -0,0 +1,143 @@
+"""DistrictStore indexes and totals stay consistent across replace and merge uploads"""
+import numpy as np
+
+from benchmarks.synthetic import make_flood_frame
+from processing.processor import stream_csv
+from processing.store import SEVERITY_LEVELS, TOTAL_FIELDS, RELIEF_PER_HOUSE, DistrictStore
+
+
+def check_indexes(store):
+    ids = store.column('id')
+    assert len(np.unique(ids)) == len(ids) == len(store)
+
+    # id index
+    for pos, district_id in enumerate(ids.tolist()):
+        assert store.position(district_id) == pos
+        assert store.get(district_id).id == district_id
+    assert store.get(int(ids.max()) + 1) is None
+    assert store.position(int(ids.min()) - 1) == -1
+
+    # severity and province indexes
+    positions = np.arange(len(store))
+    for field, count, present in [('severity', store.count_by_severity, store.severities()),
+                                  ('province', store.count_by_province, store.provinces())]:
+        values = store.take(field, positions).tolist()
+        expected = {value: values.count(value) for value in set(values)}
+        assert set(present) == set(expected), field
+        for value, n in expected.items():
+            assert count(value) == n, (field, value)
+        assert count('No such value') == 0
+
+    # running totals
+    totals = store.totals()
+    for field in TOTAL_FIELDS:
+        assert totals[field] == int(store.column(field).sum()), field
+    assert totals['relief'] == totals['houses'] * RELIEF_PER_HOUSE
+
+
+def checked(frame, calculate):
+    data, message = stream_csv(frame, calculate=calculate)
+    assert message == "Success", message
+    return data
+
+
+def test_replace_keeps_indexes_consistent(flood_app):
+    frame = make_flood_frame(300, seed=1)
+    flood_app.update_districts_from_csv(checked(frame, True))
+
+    store = flood_app.active_dataset.store
+    assert len(store) == 300
+    assert sorted(store.names()) == sorted(frame['District'])
+    check_indexes(store)
+
+    # A second replace gets fresh ids past the first ones
+    first_ids = store.column('id').copy()
+    flood_app.update_districts_from_csv(checked(make_flood_frame(120, seed=2), True))
+    store = flood_app.active_dataset.store
+    assert len(store) == 120
+    assert store.column('id').min() > first_ids.max()
+    check_indexes(store)
+
+
+def test_merge_keeps_indexes_consistent(flood_app):
+    frame = make_flood_frame(200, seed=3)
+    flood_app.update_districts_from_csv(checked(frame, True))
+    before = flood_app.active_dataset.store
+    ids_before = dict(zip(before.names(), before.column('id').tolist()))
+
+    # Change the severity and population of some districts and add new ones
+    corrections = frame.head(20).copy()
+    corrections['Severity_Level'] = [SEVERITY_LEVELS[i % 4] for i in range(20)]
+    corrections['Affected_Population'] += 1000
+    corrections.loc[corrections.index[-5:], 'District'] = [f'New district {i}' for i in range(5)]
+    corrections.loc[corrections.index[-5:], 'Province'] = 'New province'
+
+    added, updated = flood_app.merge_districts_from_csv(checked(corrections, False))
+    assert (added, updated) == (5, 15)
+
+    store = flood_app.active_dataset.store
+    assert len(store) == 205
+    check_indexes(store)
+
+    # Updated districts keep their ids and get the new values
+    positions = store.lookup(corrections['District'], corrections['Province'])
+    assert (positions >= 0).all()
+    for name, pos in zip(corrections['District'][:15], positions[:15]):
+        assert int(store.take('id', [pos])[0]) == ids_before[name]
+    assert store.take('severity', positions).tolist() == corrections['Severity_Level'].tolist()
+    assert store.take('population', positions).tolist() == corrections['Affected_Population'].tolist()
+    assert store.count_by_province('New province') == 5
+
+    # The published store before the merge is left as it was
+    check_indexes(before)
+    assert len(before) == 200
+
+
+def test_copies_do_not_share_writes():
+    store = DistrictStore.from_frame(make_flood_frame(50, seed=4).rename(columns={
+        'District': 'name', 'Province': 'province', 'Affected_Population': 'population',
+        'Displaced_Families': 'families', 'Severity_Level': 'severity'
+    }).assign(id=np.arange(1, 51), houses=0, casualties=0, date='N/A',
+              food_packs=0, tents=0, medical_supplies=0, water_bottles=0, blankets=0))
+    # Growing once leaves spare capacity, so both copies add their row to shared arrays
+    store.insert(dict(store.get(50).to_dict(), id=60, name='Spare'))
+    store.lookup(['District 1'])
+    before = [district.to_dict() for district in store]
+
+    # Two copies of one store write the same new row position and the same old row
+    first, second = store.copy(), store.copy()
+    for copy, population in [(first, 111), (second, 222)]:
+        record = store.get(1).to_dict()
+        copy.insert(dict(record, population=population))
+        copy.insert(dict(record, id=51, name=f'Added {population}', population=population))
+
+    for copy, population in [(first, 111), (second, 222)]:
+        assert copy.get(1).population == copy.get(51).population == population
+        assert copy.lookup([f'Added {population}']).tolist() == [51]
+        assert copy.lookup([f'Added {333 - population}']).tolist() == [-1]
+        check_indexes(copy)
+
+    assert [district.to_dict() for district in store] == before
+    assert store.lookup(['Added 111']).tolist() == [-1]
+    check_indexes(store)
+
+
+def test_loaded_store_takes_merges(tmp_path):
+    store = DistrictStore.from_frame(make_flood_frame(30, seed=8).rename(columns={
+        'District': 'name', 'Province': 'province', 'Affected_Population': 'population',
+        'Displaced_Families': 'families', 'Severity_Level': 'severity'
+    }).assign(id=np.arange(1, 31), houses=0, casualties=0, date='N/A',
+              food_packs=0, tents=0, medical_supplies=0, water_bottles=0, blankets=0))
+    store.save(str(tmp_path))
+    loaded = DistrictStore.load(str(tmp_path))
+
+    # A copy of a loaded store shares its names array until the first write
+    copy = loaded.copy()
+    copy.insert(dict(loaded.get(1).to_dict(), population=5))
+    copy.insert(dict(loaded.get(1).to_dict(), id=31, name='Added'))
+    assert copy.get(1).population == 5 and copy.lookup(['Added']).tolist() == [copy.position(31)]
+    check_indexes(copy)
+
+    assert loaded.get(1).population == store.get(1).population
+    assert loaded.lookup(['Added']).tolist() == [-1]
+    check_indexes(loaded)
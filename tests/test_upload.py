@@ -0,0 +1,50 @@
+"""Files sent to /upload are each saved and processed"""
+import io
+import os
+import re
+import time
+
+from benchmarks.synthetic import make_flood_frame
+
+
+def upload(client, files):
+    """Post files to /upload and wait for the job, returns the finished job"""
+    response = client.post('/upload', data={'file': files}, headers={'Accept': 'application/json'})
+    assert response.status_code == 202
+    status_url = response.json['status_url']
+
+    for _ in range(200):
+        job = client.get(status_url).json
+        if job['status'] not in ('queued', 'running'):
+            break
+        time.sleep(0.05)
+    return job
+
+
+def saved_files(flood_app, suffix):
+    return sorted(name for name in os.listdir(flood_app.app.config['UPLOAD_FOLDER']) if name.endswith(suffix))
+
+
+def test_single_file_is_saved_under_its_name(flood_app):
+    client = flood_app.app.test_client()
+    data = make_flood_frame(20, seed=10).to_csv(index=False).encode()
+
+    job = upload(client, [(io.BytesIO(data), 'one.csv')])
+    assert job['status'] == 'done', job
+
+    saved = saved_files(flood_app, 'one.csv')
+    assert len(saved) == 1 and re.fullmatch(r'\d{8}_\d{6}_one\.csv', saved[0])
+    assert len(flood_app.active_dataset.store) == 20
+
+
+def test_batch_files_with_the_same_name_are_kept_apart(flood_app):
+    client = flood_app.app.test_client()
+    frames = [make_flood_frame(30, seed=seed) for seed in (11, 12)]
+    frames[1]['District'] = [f'Second {i}' for i in range(len(frames[1]))]
+    files = [(io.BytesIO(frame.to_csv(index=False).encode()), 'districts.csv') for frame in frames]
+
+    job = upload(client, files)
+    assert job['status'] == 'done', job
+
+    assert len(saved_files(flood_app, '_districts.csv')) == 2
+    assert len(flood_app.active_dataset.store) == 60